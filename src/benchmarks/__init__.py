@@ -0,0 +1,12 @@
+"""
+Benchmarks for the simulation and the genetic algorithm
+
+Every benchmark builds its scenario from fixed seeds, so two runs on the same machine time the same work.  Run them from
+src/ with
+
+    python -m benchmarks                        # everything, compared against data/benchmark_baseline.json
+    python -m benchmarks --group micro          # only the micro-benchmarks
+    python -m benchmarks --save-baseline        # make these results the new baseline
+
+See benchmarks.harness for how things get timed and compared.
+"""
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import argparse
+
+from benchmarks import micro, macro  # noqa: F401, registers the benchmarks
+from benchmarks.harness import THRESHOLD, selectBenchmarks, runBenchmarks, compareResults, formatTime, saveResults, \
+    loadResults
+from faux_formicidae.genetic_algorithm import PATH
+
+BASELINE_FILE = os.path.join(PATH, "data", "benchmark_baseline.json")
+RESULTS_FILE = os.path.join(PATH, "data", "benchmark_results.json")
+
+
+def run():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Times the simulation and the GA")
+    parser.add_argument("--group", action="append", choices=["micro", "macro", "ga"],
+                        help="Only run this group, can be given more than once")
+    parser.add_argument("--filter", default=None, help="Only run benchmarks with this in their name")
+    parser.add_argument("--repeat", type=int, default=None, help="Repeats per benchmark, instead of its own default")
+    parser.add_argument("--output", default=RESULTS_FILE, help="Where to save the results")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Save the results as the new baseline for these benchmarks")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="Fail when a benchmark is slower than the baseline by more than this fraction")
+    parser.add_argument("--list", action="store_true", help="List the benchmarks and stop")
+    args = parser.parse_args()
+
+    benchmarks = selectBenchmarks(args.group, args.filter)
+    if args.list:
+        for bench in benchmarks:
+            print(f"{bench.group:<6} {bench.name}")
+        return 0
+
+    results = runBenchmarks(benchmarks, args.repeat)
+    saveResults(args.output, results)
+    print(f"Saved results to {args.output}")
+
+    if args.save_baseline:
+        # Benchmarks that weren't run this time keep their old baseline
+        baseline = loadResults(args.baseline) if os.path.exists(args.baseline) else {"benchmarks": {}}
+        baseline["benchmarks"].update(results["benchmarks"])
+        baseline["environment"] = results["environment"]
+        saveResults(args.baseline, baseline)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline} to compare against, --save-baseline makes one")
+        return 0
+
+    comparisons, regressions = compareResults(results, loadResults(args.baseline), args.threshold)
+    if len(comparisons) == 0:
+        print(f"None of these benchmarks are in the baseline at {args.baseline}")
+        return 0
+
+    print(f"\n{'':<45} {'baseline':>11} {'now':>11} {'change':>8}")
+    for name, old, new, change in comparisons:
+        flag = "  <- regression" if name in regressions else ""
+        print(f"{name:<45} {formatTime(old)} {formatTime(new)} {change:+8.1%}{flag}")
+
+    if len(regressions) > 0:
+        print(f"\n{len(regressions)} benchmark(s) got slower by more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())
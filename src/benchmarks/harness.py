@@ -0,0 +1,157 @@
+"""
+Registering, timing and comparing benchmarks
+
+A benchmark is a setup function registered with @benchmark.  Setup builds the scenario and returns the function to time
+(or that function and a dict it fills in with anything else worth reporting).  Setup gets run again for every repeat,
+so each repeat times the same work from the same state.
+"""
+
+import sys
+import json
+import time
+import timeit
+import platform
+import statistics
+import subprocess
+import numpy as np
+
+from typing import Callable, NamedTuple, Optional
+
+# Slower than the baseline by more than this fraction counts as a regression
+THRESHOLD = 0.10
+REPEAT = 5
+
+
+class Benchmark(NamedTuple):
+    name: str
+    group: str
+    setup: Callable
+    number: Optional[int]  # Calls per repeat, None to pick enough for about 0.2 s
+    repeat: int
+    scale: int  # Operations per call, times get reported per operation
+
+
+BENCHMARKS = {}
+
+
+def benchmark(group, name=None, number=None, repeat=REPEAT, scale=1):
+    """
+    Decorator that registers a setup function as a benchmark
+    """
+
+    def register(setup):
+        bench_name = name if name is not None else setup.__name__
+        BENCHMARKS[bench_name] = Benchmark(bench_name, group, setup, number, repeat, scale)
+        return setup
+
+    return register
+
+
+def _setUp(bench: Benchmark):
+    fixture = bench.setup()
+    if isinstance(fixture, tuple):
+        return fixture
+    return fixture, {}
+
+
+def runBenchmark(bench: Benchmark, repeat=None):
+    """
+    :returns: {"group", "median", "min", "number", "repeat", "times", ...}, times are seconds per operation
+    """
+
+    repeat = repeat if repeat is not None else bench.repeat
+    number = bench.number
+    times = []
+    info = {}
+
+    for k in range(repeat):
+        function, info = _setUp(bench)
+        if number is None:
+            # autorange runs the function too, so it gets a fresh setup afterwards
+            number = max(timeit.Timer(function).autorange()[0], 1)
+            function, info = _setUp(bench)
+
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - start) / number / bench.scale)
+
+    result = {"group": bench.group, "median": statistics.median(times), "min": min(times), "number": number,
+              "repeat": repeat, "times": times}
+    result.update(info)
+    return result
+
+
+def selectBenchmarks(groups=None, pattern=None):
+    return [bench for bench in BENCHMARKS.values()
+            if (groups is None or bench.group in groups) and (pattern is None or pattern in bench.name)]
+
+
+def runBenchmarks(benchmarks, repeat=None, verbose=True):
+    """
+    :returns: {"environment": ..., "benchmarks": {name: result}}
+    """
+
+    results = {}
+    for bench in benchmarks:
+        results[bench.name] = runBenchmark(bench, repeat)
+        if verbose:
+            print(f"{bench.name:<45} {formatTime(results[bench.name]['median'])}")
+            sys.stdout.flush()
+
+    return {"environment": environment(), "benchmarks": results}
+
+
+def environment():
+    """
+    What the results were measured on, they only compare well against results from the same machine
+    """
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+
+    return {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+            "processor": platform.processor(), "system": platform.system(), "commit": commit or None,
+            "time": time.time()}
+
+
+def compareResults(results, baseline, threshold=THRESHOLD):
+    """
+    Compares the median of every benchmark in both
+
+    :returns: List of (name, baseline median, new median, relative change) for every benchmark in both, and the list of
+              names that got slower by more than threshold
+    """
+
+    comparisons = []
+    regressions = []
+    for name, result in results["benchmarks"].items():
+        old = baseline["benchmarks"].get(name)
+        if old is None:
+            continue
+
+        change = result["median"] / old["median"] - 1
+        comparisons.append((name, old["median"], result["median"], change))
+        if change > threshold:
+            regressions.append(name)
+
+    return comparisons, regressions
+
+
+def formatTime(seconds):
+    for unit, scale in [("s", 1), ("ms", 1e-3), ("us", 1e-6)]:
+        if seconds >= scale:
+            return f"{seconds / scale:8.3f} {unit}"
+    return f"{seconds / 1e-9:8.3f} ns"
+
+
+def saveResults(path, results):
+    with open(path, "w") as file:
+        json.dump(results, file, indent=1)
+
+
+def loadResults(path):
+    with open(path) as file:
+        return json.load(file)
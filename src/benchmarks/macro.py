@@ -0,0 +1,119 @@
+"""
+Macro-benchmarks: whole simulation steps, and a whole generation of the genetic algorithm
+"""
+
+import os
+import random
+import tempfile
+import numpy as np
+
+from faux_formicidae.world import AntWorld, WorldStorage, WIDTH_SCALE, HEIGHT_SCALE
+from faux_formicidae.ant import Ant
+from faux_formicidae.simulation import Simulation
+from faux_formicidae.genetic_algorithm import GeneticAlgorithm
+
+from benchmarks.harness import benchmark
+
+SEED = 1234
+ANT_COUNTS = [10, 100, 1000]
+RESOLUTIONS = [20, 40, 80]
+# Stepping one ant at a time gets too slow to bother with past this many
+MAX_UNVECTORIZED_ANTS = 100
+# The storage types get compared at this size
+STORAGE_ANTS = 100
+STORAGE_RESOLUTION = 40
+
+WARMUP_STEPS = 20
+TIMED_STEPS = 50
+DT = 0.05
+
+GA_BATCH_SIZE = 4
+GA_WORKERS = 2
+
+
+def _simulation(num_ants, resolution, vectorized, world_options=None):
+    """
+    Simulation with a fixed number of ants (they don't die and there's no colony making more), spread out over the free
+    cells of the default world
+
+    :param world_options: Other keyword arguments for the AntWorld
+    """
+
+    rng = np.random.default_rng(SEED)
+    world = AntWorld(WIDTH_SCALE, HEIGHT_SCALE, resolution, rng=rng, **(world_options or {}))
+    sim = Simulation(world, vectorized=vectorized, rng=rng)
+
+    while sim.numAnts() < num_ants:
+        x, y = rng.uniform(0, WIDTH_SCALE), rng.uniform(0, HEIGHT_SCALE)
+        if not world.isFreePosition(x, y)[0]:
+            continue
+
+        ant = Ant(None, world, x, y, rng=rng)
+        ant.setHomePosition(WIDTH_SCALE / 2, HEIGHT_SCALE / 2)
+        ant.energy = ant.stamina = 1e9
+        sim.addAnt(ant, x, y)
+
+    for _ in range(WARMUP_STEPS):
+        sim.runOnce(DT)
+    return sim
+
+
+def _simulationSteps(num_ants, resolution, vectorized, world_options=None):
+    def setup():
+        sim = _simulation(num_ants, resolution, vectorized, world_options)
+        # How much the layers take up, which is the point of the storage types
+        return (lambda: sim.runOnce(DT)), {"world_bytes": sim.world.nbytes()}
+
+    return setup
+
+
+for _num_ants in ANT_COUNTS:
+    for _resolution in RESOLUTIONS:
+        benchmark("macro", name=f"runOnce[vectorized,{_num_ants}ants,res{_resolution}]", number=TIMED_STEPS)(
+            _simulationSteps(_num_ants, _resolution, True))
+        if _num_ants <= MAX_UNVECTORIZED_ANTS:
+            benchmark("macro", name=f"runOnce[ants,{_num_ants}ants,res{_resolution}]", number=TIMED_STEPS)(
+                _simulationSteps(_num_ants, _resolution, False))
+
+for _storage in WorldStorage:
+    for _vectorized in [False, True]:
+        _engine = "vectorized" if _vectorized else "ants"
+        benchmark("macro", name=f"runOnce[{_engine},{STORAGE_ANTS}ants,res{STORAGE_RESOLUTION},{_storage.name}]",
+                  number=TIMED_STEPS)(_simulationSteps(STORAGE_ANTS, STORAGE_RESOLUTION, _vectorized,
+                                                       {"storage": _storage}))
+
+# Lazy evaporation skips evaporating the whole grid every step but pays for it on every read, so it's compared against
+# the runOnce[...] above at every resolution and a few ant counts
+for _num_ants in ANT_COUNTS[:2]:
+    for _resolution in RESOLUTIONS:
+        for _vectorized in [False, True]:
+            _engine = "vectorized" if _vectorized else "ants"
+            benchmark("macro", name=f"runOnce[{_engine},{_num_ants}ants,res{_resolution},lazy]", number=TIMED_STEPS)(
+                _simulationSteps(_num_ants, _resolution, _vectorized, {"lazy_evaporation": True}))
+
+
+@benchmark("ga", number=1, repeat=1)
+def runBatch():
+    """
+    One whole generation, from random colonies, without the cache and with the logs out of the way
+    """
+
+    np.random.seed(SEED)
+    random.seed(SEED)
+    genetic_algorithm = GeneticAlgorithm(batch_size=GA_BATCH_SIZE, num_workers=GA_WORKERS, cache_path=False,
+                                         simulation_options={"vectorized": True})
+    genetic_algorithm.resultLogFile = os.path.join(tempfile.mkdtemp(), "results.jsonl")
+    genetic_algorithm.generateRandomColonies()
+    # Start the workers before the clock does
+    genetic_algorithm.getPool()
+
+    info = {}
+
+    def run():
+        try:
+            genetic_algorithm.runBatch()
+        finally:
+            genetic_algorithm.close()
+        info["steps"] = sum(result.steps for result in genetic_algorithm.simResults)
+
+    return run, info
@@ -0,0 +1,121 @@
+"""
+Micro-benchmarks: the calls every ant makes every step, timed on their own
+"""
+
+import math
+import numpy as np
+
+from faux_formicidae.world import AntWorld, WorldStorage, Pheromones
+from faux_formicidae.ant import Ant
+
+from benchmarks.harness import benchmark
+
+SEED = 1234
+NUM_POINTS = 1000
+NUM_ANTS = 200
+STEP_LENGTH = 0.05  # cm, about how far an ant gets in one time step
+
+
+def _randomPoints(world: AntWorld, rng, count):
+    return rng.uniform(0, world.width, count), rng.uniform(0, world.height, count)
+
+
+def _trailWorld(storage=WorldStorage.DENSE):
+    """
+    World with a tangle of random-walk trails of both pheromones, so the ants have something to sense
+    """
+
+    rng = np.random.default_rng(SEED)
+    world = AntWorld(storage=storage, rng=rng)
+    for pheromone in Pheromones:
+        x, y = _randomPoints(world, rng, 20)
+        headings = rng.uniform(0, 2 * math.pi, 20)
+        for _ in range(200):
+            headings += rng.uniform(-0.3, 0.3, 20)
+            new_x = np.clip(x + np.cos(headings) * STEP_LENGTH, 0, world.width - 0.01)
+            new_y = np.clip(y + np.sin(headings) * STEP_LENGTH, 0, world.height - 0.01)
+            world.addPheromoneLines(x, y, new_x, new_y, [pheromone] * 20)
+            x, y = new_x, new_y
+    return world
+
+
+def _ants(world: AntWorld, rng, count):
+    x, y = _randomPoints(world, rng, count)
+    ants = []
+    for k in range(count):
+        ant = Ant(None, world, x[k], y[k], rng=rng)
+        ant.setHomePosition(world.width / 2, world.height / 2)
+        ant.searchRadius = STEP_LENGTH
+        ants.append(ant)
+    return ants
+
+
+@benchmark("micro", scale=NUM_POINTS)
+def isFreePosition():
+    world = AntWorld()
+    x, y = _randomPoints(world, np.random.default_rng(SEED), NUM_POINTS)
+    points = list(zip(x.tolist(), y.tolist()))
+
+    def run():
+        for point_x, point_y in points:
+            world.isFreePosition(point_x, point_y)
+
+    return run
+
+
+@benchmark("micro", scale=NUM_POINTS)
+def addPheromoneLine():
+    world = AntWorld()
+    rng = np.random.default_rng(SEED)
+    x, y = _randomPoints(world, rng, NUM_POINTS)
+    headings = rng.uniform(0, 2 * math.pi, NUM_POINTS)
+    lines = list(zip(x.tolist(), y.tolist(), (x + np.cos(headings) * STEP_LENGTH).tolist(),
+                     (y + np.sin(headings) * STEP_LENGTH).tolist()))
+
+    def run():
+        for start_x, start_y, end_x, end_y in lines:
+            world.addPheromoneLine((start_x, start_y), (end_x, end_y), Pheromones.HOME)
+
+    return run
+
+
+@benchmark("micro", scale=NUM_ANTS)
+def getDirectionAlongPheromone():
+    world = _trailWorld()
+    ants = _ants(world, np.random.default_rng(SEED), NUM_ANTS)
+    views = []
+    for ant in ants:
+        s_i, e_i, s_j, e_j = world.sampleArea(ant.xPosition, ant.yPosition, 0.15)
+        views.append((ant, world.getLayerWindow(Pheromones.FOOD, s_i, e_i, s_j, e_j)))
+
+    def run():
+        for ant, view in views:
+            ant.currentTrail = None
+            ant.getDirectionAlongPheromone(view, Pheromones.FOOD)
+
+    return run
+
+
+@benchmark("micro", scale=NUM_ANTS)
+def getDirectionToNest():
+    world = _trailWorld()
+    ants = _ants(world, np.random.default_rng(SEED), NUM_ANTS)
+
+    def run():
+        for ant in ants:
+            ant.currentTrail = None
+            ant.getDirectionToNest()
+
+    return run
+
+
+def _evaporation(storage):
+    def setup():
+        world = _trailWorld(storage)
+        return lambda: world.evaporate(0.05)
+
+    return setup
+
+
+for _storage in WorldStorage:
+    benchmark("micro", name=f"evaporate[{_storage.name}]")(_evaporation(_storage))
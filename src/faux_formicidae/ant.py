@@ -5,13 +5,13 @@ Class to represent single ant
 """
 
 import math
-import random
 import numpy as np
 import scipy
 
 from enum import Enum
 
 from faux_formicidae.world import AntWorld, Pheromones, WorldCell
+from faux_formicidae.sensing import getSensingKernel
 
 
 class AntMode(Enum):
@@ -33,8 +33,68 @@ def angle_diff_radians(a, b):
     return diff
 
 
+def directionAlongPheromone(window: np.ndarray, pheromone, target_direction, use_gradient=True, cell_type=None,
+                            erode=False):
+    """
+    Picks a heading towards one of the non-zero cells of a pheromone (or cell type) layer in the field of view
+
+    :param window: The field of view of just the layer being followed, see AntWorld.getLayerWindow
+    :returns: direction in radians, or None if nothing in the field of view is non-zero
+    """
+
+    if pheromone != 0:
+        visible_area = window.T
+    else:
+        visible_area = window.T == int(cell_type)
+        if erode:
+            element = scipy.ndimage.generate_binary_structure(2, 2)
+            visible_area = scipy.ndimage.binary_erosion(visible_area, structure=element, iterations=2)
+
+    return getSensingKernel(visible_area.shape).direction(visible_area, target_direction, use_gradient)
+
+
+def directionToNest(world: AntWorld, x, y, home_position, search_radius, current_trail):
+    """
+    Heading back towards the nest, steered around whatever obstacles are close by
+
+    :returns: (direction or None, the new current trail)
+    """
+
+    # If the world knows the way home from here, that beats feeling around the walls
+    field = world.getNavigationField(home_position)
+    if field is not None:
+        direction = field.getDirection(x, y)
+        if direction is not None:
+            return direction, 0
+
+    x_diff = x - home_position[0]
+    y_diff = y - home_position[1]
+    angle = -1 * (math.pi - math.atan2(y_diff, x_diff))
+
+    # Completely stupid hacks to make them a little less dumb
+    scale_factor = 2.0  # np.random.uniform(1.1, 2)  # This is a weapons-grade hack, but it made stuff better at one point
+    s_i, e_i, s_j, e_j = world.sampleArea(x, y, max(search_radius * scale_factor, 0.1))
+    visible_area = world.getLayerWindow(0, s_i, e_i, s_j, e_j)
+    direction = directionAlongPheromone(visible_area, 0, angle, 0 != current_trail, cell_type=WorldCell.EMPTY, erode=True)
+    return direction, (0 if direction is not None else None)
+
+
 class Ant(object):
-    def __init__(self, give_food, world: AntWorld = None, x=0, y=0, speed=1, size=1):
+    # Lots of ants get made over a run, slots keep them small and quick to set up
+    __slots__ = ("xPosition", "yPosition", "world", "giveFood", "homePosition", "energy", "stamina", "food_carried",
+                 "carrying_capacity", "antSpeed", "antSize", "mode", "activePheromone", "currentTrail", "temper", "hope",
+                 "temperInc", "hopeInc", "searchRadius", "exploreDirection", "rng")
+
+    def __init__(self, give_food, world: AntWorld = None, x=0, y=0, speed=1, size=1, rng: np.random.Generator = None):
+        self.reset(give_food, world, x, y, speed, size, rng)
+
+    def reset(self, give_food, world: AntWorld = None, x=0, y=0, speed=1, size=1, rng: np.random.Generator = None):
+        """
+        Put the ant back into the state of a brand new one, so dead ants can be reused (see AntColony.makeAnt)
+
+        :param rng: Random number generator for wandering around, defaults to the global numpy one
+        """
+
         # speed = 1
         # size = 1
         self.xPosition = x
@@ -70,7 +130,11 @@ class Ant(object):
         self.hopeInc = 5
 
         self.searchRadius = 0
-        self.exploreDirection = random.random() * 2 * math.pi
+        self.rng = rng
+        self.exploreDirection = self._random().random() * 2 * math.pi
+
+    def _random(self):
+        return self.rng if self.rng is not None else np.random
 
     def setWorld(self, world):
         self.world = world
@@ -93,82 +157,47 @@ class Ant(object):
         return self.world.worldSpaceToPixelSpace(self.xPosition, self.yPosition)
 
     def move(self, angle, distance):
-        new_x = self.xPosition + math.cos(angle) * distance
-        new_y = self.yPosition + math.sin(angle) * distance
-        is_free, obstacle_type = self.world.isFreePosition(new_x, new_y)
+        with self.world.profiler.section("ants.move"):
+            new_x = self.xPosition + math.cos(angle) * distance
+            new_y = self.yPosition + math.sin(angle) * distance
+            is_free, obstacle_type = self.world.isFreePosition(new_x, new_y)
 
-        if is_free:
-            if self.activePheromone is not None:
-                self.world.addPheromoneLine((self.xPosition, self.yPosition), (new_x, new_y), self.activePheromone)
+            if is_free:
+                if self.activePheromone is not None:
+                    self.world.queuePheromoneLine((self.xPosition, self.yPosition), (new_x, new_y), self.activePheromone)
 
-            self.xPosition = new_x
-            self.yPosition = new_y
-        else:
-            self.exploreDirection += math.pi + np.random.uniform(-1, 1)
+                self.xPosition = new_x
+                self.yPosition = new_y
+            else:
+                self.exploreDirection += math.pi + self._random().uniform(-1, 1)
 
-        # TODO: Scale by speed
-        self.energy -= (1 + self.antSpeed ** 2 / 1000 * self.antSize)
-        if self.energy < self.stamina * (1 / 8):
-            self.mode = AntMode.GO_HOME
+            # TODO: Scale by speed
+            self.energy -= (1 + self.antSpeed ** 2 / 1000 * self.antSize)
+            if self.energy < self.stamina * (1 / 8):
+                self.mode = AntMode.GO_HOME
 
-        return obstacle_type
+            return obstacle_type
 
     def getDirectionToNest(self):
-        x_diff = self.xPosition - self.homePosition[0]
-        y_diff = self.yPosition - self.homePosition[1]
-        angle = -1 * (math.pi - math.atan2(y_diff, x_diff))
+        with self.world.profiler.section("ants.sense.nest"):
+            direction, self.currentTrail = directionToNest(self.world, self.xPosition, self.yPosition,
+                                                           self.homePosition, self.searchRadius, self.currentTrail)
+        return direction
 
-        # Completely stupid hacks to make them a little less dumb
-        scale_factor = 2.0  # np.random.uniform(1.1, 2)  # This is a weapons-grade hack, but it made stuff better at one point
-        s_i, e_i, s_j, e_j = self.world.sampleArea(self.xPosition, self.yPosition, max(self.searchRadius * scale_factor, 0.1))
-        visible_area = self.world.getLayerSection(s_i, e_i, s_j, e_j)
-        return self.getDirectionAlongPheromone(visible_area, 0, target_direction=angle, cell_type=WorldCell.EMPTY, erode=True)
+    def getDirectionAlongPheromone(self, window: np.ndarray, pheromone, target_direction=None, cell_type=None,
+                                   erode=False):
+        """
+        :param window: The field of view of just the layer being followed, see AntWorld.getLayerWindow
+        """
 
-    def getDirectionAlongPheromone(self, fov: np.ndarray, pheromone, target_direction=None, cell_type=None, erode=False):
         if target_direction is None:
             target_direction = self.exploreDirection
 
         use_gradient = pheromone != self.currentTrail
-
-        if pheromone != 0:
-            visible_area = fov[:, :, int(pheromone)].copy().T
-        else:
-            visible_area = fov[:, :, int(pheromone)].copy().T
-            visible_area = visible_area == int(cell_type)
-            if erode:
-                element = scipy.ndimage.generate_binary_structure(2, 2)
-                visible_area = scipy.ndimage.binary_erosion(visible_area, structure=element, iterations=2)
-
-        non_zero_locations = np.nonzero(visible_area)
-        non_zero_values = visible_area[non_zero_locations]
-        non_zero_locations = np.asarray(non_zero_locations)
-
-        ant_location = np.asarray(visible_area.shape) / 2.0
-
-        if min(non_zero_locations.shape) > 0:
-            r = np.linalg.norm(non_zero_locations, axis=0)
-            r = r * math.pi / ant_location[0]
-
-            v = (ant_location - non_zero_locations.T).T
-            theta = np.arctan2(v[0, :], v[1, :]) - np.pi
-            diff = abs(angle_diff_radians(theta, target_direction - math.pi))
-
-            # Trying to detect bends in the trail
-            # max_diff = np.max(diff)
-            # use_gradient = use_gradient or max_diff < 2.5
-
-            if use_gradient:
-                weights = 1.0 / non_zero_values
-            else:
-                weights = diff * (1.0 / non_zero_values)
-
-            i = np.argmax(weights)
-            direction = theta[i]
-            self.currentTrail = pheromone
-            return direction
-        else:
-            self.currentTrail = None
-            return None
+        with self.world.profiler.section("ants.sense.pheromone"):
+            direction = directionAlongPheromone(window, pheromone, target_direction, use_gradient, cell_type, erode)
+        self.currentTrail = pheromone if direction is not None else None
+        return direction
 
     def worldObjectVisible(self, fov: np.ndarray, object_type):
         visible_area = fov[:, :, 0].copy()
@@ -194,15 +223,15 @@ class Ant(object):
         """
         DROPOFF_DISTANCE = .5
         s_i, e_i, s_j, e_j = self.world.sampleArea(self.xPosition, self.yPosition, 0.15)
-        visible_area = self.world.getLayerSection(s_i, e_i, s_j, e_j)
-        # world_layer = visible_area[:, :, 0]
 
         # Used for some pathfinding
         self.searchRadius = self.antSpeed * delta_t
 
         # Finding food, remember means we are placing down home pheromones
         if self.mode == AntMode.EXPLORE:
-            direction = self.getDirectionAlongPheromone(visible_area, Pheromones.FOOD)
+            # Only the layer being followed gets read, the other storage types would have to decode all of them
+            food_trail = self.world.getLayerWindow(Pheromones.FOOD, s_i, e_i, s_j, e_j)
+            direction = self.getDirectionAlongPheromone(food_trail, Pheromones.FOOD)
             # TODO: This can be abstracted for the returning / exploring cases
             direction_to_home = self.getDirectionToNest()
             if not (direction is None or direction_to_home is None):
@@ -212,8 +241,7 @@ class Ant(object):
                 is_within_range = difference <= math.pi / 4
                 if is_within_range:
                     direction = None
-            food_cells = self.worldObjectVisible(visible_area, WorldCell.FOOD)
-            can_see_food = food_cells is not None and len(food_cells) > 0
+            can_see_food = self.world.countCells(WorldCell.FOOD, s_i, e_i, s_j, e_j) > 0
 
             if direction is not None:
                 obstacle_type = self.move(direction, self.antSpeed * delta_t)
@@ -231,14 +259,13 @@ class Ant(object):
                 obstacle_type = self.randomExplore(delta_t)
 
             # If we found food we start going home
-            # TODO: add functionality that removes food from a food source (if we get there)
             # TODO: fix the issue where the ant gets stuck once the home trail runs out (the fix seems to work but it can be improved)
             if can_see_food:  # or obstacle_type == int(WorldCell.FOOD):
                 self.mode = AntMode.GO_HOME
                 self.activePheromone = Pheromones.FOOD
                 self.exploreDirection += math.pi
                 self.energy = self.stamina
-                self.world.world[s_i:e_i, s_j: e_j, 0] = np.vectorize(lambda x: WorldCell.EMPTY if x == WorldCell.FOOD else x)(self.world.world[s_i:e_i, s_j: e_j, 0])
+                self.world.takeFood(s_i, e_i, s_j, e_j)
 
                 # I chose 10*stamina because that allows us to put more reward to carrying food, so we should see populations
                 # lean towards sending ants to the end
@@ -246,7 +273,8 @@ class Ant(object):
             else:
                 self.activePheromone = Pheromones.HOME
         elif self.mode == AntMode.GO_HOME:
-            direction = self.getDirectionAlongPheromone(visible_area, Pheromones.HOME)
+            home_trail = self.world.getLayerWindow(Pheromones.HOME, s_i, e_i, s_j, e_j)
+            direction = self.getDirectionAlongPheromone(home_trail, Pheromones.HOME)
 
             # This code fixes ants getting stuck if the trail disappears
             direction_to_home = self.getDirectionToNest()
@@ -286,14 +314,14 @@ class Ant(object):
 
     def randomExplore(self, delta_t):
         noise_mag = math.pi / 4
-        direction_adj = np.random.uniform(-noise_mag, noise_mag)
+        direction_adj = self._random().uniform(-noise_mag, noise_mag)
         direction = self.exploreDirection + direction_adj
 
         obstacle_type = self.move(direction, self.antSpeed * delta_t)
 
         if obstacle_type != 0:
             # if can't move, turn around and wander in a direction
-            self.exploreDirection += np.random.uniform(-1.5, 1.5)
+            self.exploreDirection += self._random().uniform(-1.5, 1.5)
 
         return obstacle_type
 
@@ -38,8 +38,13 @@ class ColonyParameters(object):
 
 
 class AntColony(object):
-    def __init__(self, x, y, params: ColonyParameters):
+    def __init__(self, x, y, params: ColonyParameters, rng: numpy.random.Generator = None):
+        """
+        :param rng: Handed to every ant this colony makes, defaults to the global numpy one
+        """
+
         self.addAnt = None
+        self.rng = rng
         self.xPosition = x
         self.yPosition = y
 
@@ -48,6 +53,9 @@ class AntColony(object):
         self.energy = 100000
         self.nextSpawnTime = 0
 
+        # Dead ants waiting to be reused by makeAnt
+        self.antPool = []
+
     def setParams(self, params: ColonyParameters):
         self.colonyParameters = params
 
@@ -75,7 +83,11 @@ class AntColony(object):
 
         # TODO: Set ant parameters
 
-        ant = Ant(self.giveFood, speed=self.colonyParameters.speed, size=self.colonyParameters.size)
+        if len(self.antPool) > 0:
+            ant = self.antPool.pop()
+            ant.reset(self.giveFood, speed=self.colonyParameters.speed, size=self.colonyParameters.size, rng=self.rng)
+        else:
+            ant = Ant(self.giveFood, speed=self.colonyParameters.speed, size=self.colonyParameters.size, rng=self.rng)
         ant.setHomePosition(self.xPosition, self.yPosition)
         ant.energy = min(ant.stamina, self.energy)
         self.addAnt(ant, self.xPosition, self.yPosition)
@@ -83,6 +95,13 @@ class AntColony(object):
         # TODO: scale (this should work now - since we spawn an ant with x stamina we are effectively feeding it that much on spawn)
         self.energy -= min(ant.stamina, self.energy)
 
+    def recycleAnt(self, ant: Ant):
+        """
+        Hand back an ant that isn't needed any more, so makeAnt can reuse it
+        """
+
+        self.antPool.append(ant)
+
     def runOnce(self, dt, clock_time):
         # TODO: Control how often ants spawn
 
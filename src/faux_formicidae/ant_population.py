@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+
+"""
+Structure-of-arrays version of the ants
+
+Keeps the state of every ant in numpy arrays and advances the whole population at once.  The rules are the same as
+Ant.pheromonePathFinding, only the sensing is still done one ant at a time (each ant looks at its own window).
+
+Differences from the per-object path:
+  * Every ant senses the world as it was at the start of the tick, instead of seeing the trails and eaten food of the
+    ants that were updated before it in the same tick
+  * Random numbers are drawn in a different order, so runs are statistically the same but not draw-for-draw identical
+
+The sensing loop in _sense is most of what's left of a step, which is why this is only about 1.2-2x quicker than the
+per-object path.  The next step for that is doing all the ants at once: away from the edges every ant's window is the
+same shape, so one fancy index can gather them into an (ants, rows, cols) array and SensingKernel.direction becomes an
+argmax over the last two axes, the food checks become four gathers from the FOOD CellIndex's summed-area table, and with
+a NavigationField the way home is one lookup in its directions array.  Ants whose windows get clipped by the edges of
+the world, and nest finding without a field, would stay in the loop.
+"""
+
+import math
+import numpy as np
+
+from faux_formicidae.world import AntWorld, Pheromones, WorldCell
+from faux_formicidae.ant import Ant, AntMode, directionAlongPheromone, directionToNest
+from faux_formicidae.profiling import NULL_PROFILER
+
+DROPOFF_DISTANCE = .5
+NO_PHEROMONE = -1
+
+EXPLORE = AntMode.EXPLORE.value
+GO_HOME = AntMode.GO_HOME.value
+
+
+class AntView(object):
+    """
+    Lightweight stand-in for an Ant that reads from a row of an AntPopulation
+
+    Views are only valid until the next time the population is updated, since dead ants get compacted out
+    """
+
+    __slots__ = ("population", "index")
+
+    def __init__(self, population, index):
+        self.population = population
+        self.index = index
+
+    @property
+    def world(self):
+        return self.population.world
+
+    @property
+    def xPosition(self):
+        return float(self.population.xPositions[self.index])
+
+    @property
+    def yPosition(self):
+        return float(self.population.yPositions[self.index])
+
+    @property
+    def homePosition(self):
+        return float(self.population.homeXPositions[self.index]), float(self.population.homeYPositions[self.index])
+
+    @property
+    def exploreDirection(self):
+        return float(self.population.headings[self.index])
+
+    @property
+    def energy(self):
+        return float(self.population.energies[self.index])
+
+    @property
+    def stamina(self):
+        return float(self.population.staminas[self.index])
+
+    @property
+    def food_carried(self):
+        return float(self.population.foodCarried[self.index])
+
+    @property
+    def mode(self):
+        return AntMode(int(self.population.modes[self.index]))
+
+    def getPosition(self):
+        return self.xPosition, self.yPosition
+
+    def getPositionPixelSpace(self):
+        return self.population.world.worldSpaceToPixelSpace(self.xPosition, self.yPosition)
+
+    def distanceToHome(self):
+        v = np.asarray(self.getPosition()) - np.asarray(self.homePosition)
+        return np.linalg.norm(v)
+
+
+class AntPopulation(object):
+    def __init__(self, world: AntWorld, capacity=64, rng: np.random.Generator = None):
+        """
+        :param rng: Random number generator for the ants, defaults to the global numpy one
+        """
+
+        self.world = world
+        self.rng = rng
+        self.count = 0
+
+        self.xPositions = np.zeros(capacity)
+        self.yPositions = np.zeros(capacity)
+        self.homeXPositions = np.zeros(capacity)
+        self.homeYPositions = np.zeros(capacity)
+        self.headings = np.zeros(capacity)
+
+        self.energies = np.zeros(capacity)
+        self.staminas = np.zeros(capacity)
+        self.foodCarried = np.zeros(capacity)
+        self.carryingCapacities = np.zeros(capacity)
+
+        self.speeds = np.zeros(capacity)
+        self.sizes = np.zeros(capacity)
+
+        self.modes = np.zeros(capacity, dtype=np.int8)
+        self.activePheromones = np.full(capacity, NO_PHEROMONE, dtype=np.int8)
+        self.currentTrails = np.full(capacity, NO_PHEROMONE, dtype=np.int8)
+
+        self.hopes = np.zeros(capacity)
+        self.tempers = np.zeros(capacity)
+        self.hopeIncs = np.zeros(capacity)
+        self.temperIncs = np.zeros(capacity)
+
+        # Callbacks can't go in an array, these are usually all the same colony
+        self.giveFoodCallbacks = []
+
+        # Set by the Simulation running this population, see faux_formicidae.profiling
+        self.profiler = NULL_PROFILER
+
+    def __len__(self):
+        return self.count
+
+    def _arrayNames(self):
+        return [name for name, value in self.__dict__.items() if isinstance(value, np.ndarray)]
+
+    def _grow(self):
+        for name in self._arrayNames():
+            array = getattr(self, name)
+            grown = np.empty(max(2 * len(array), 1), dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def addAnt(self, ant: Ant, x: float, y: float):
+        """
+        Copies the state of a freshly made Ant into the arrays
+        """
+
+        if self.count == len(self.xPositions):
+            self._grow()
+
+        k = self.count
+        self.xPositions[k] = x
+        self.yPositions[k] = y
+        self.homeXPositions[k], self.homeYPositions[k] = ant.homePosition
+        self.headings[k] = ant.exploreDirection
+
+        self.energies[k] = ant.energy
+        self.staminas[k] = ant.stamina
+        self.foodCarried[k] = ant.food_carried
+        self.carryingCapacities[k] = ant.carrying_capacity
+
+        self.speeds[k] = ant.antSpeed
+        self.sizes[k] = ant.antSize
+
+        self.modes[k] = ant.mode.value
+        self.activePheromones[k] = NO_PHEROMONE if ant.activePheromone is None else int(ant.activePheromone)
+        self.currentTrails[k] = NO_PHEROMONE if ant.currentTrail is None else int(ant.currentTrail)
+
+        self.hopes[k] = ant.hope
+        self.tempers[k] = ant.temper
+        self.hopeIncs[k] = ant.hopeInc
+        self.temperIncs[k] = ant.temperInc
+
+        self.giveFoodCallbacks.append(ant.giveFood)
+        self.count += 1
+
+    def getViews(self):
+        return [AntView(self, k) for k in range(self.count)]
+
+    def getPositions(self):
+        return self.xPositions[:self.count], self.yPositions[:self.count]
+
+    def _sense(self, delta_t):
+        """
+        Runs the per-ant sensing, in the same order of calls as Ant.pheromonePathFinding
+
+        :returns: (direction for each ant, nan where there is none; bool array of ants that can see food; the
+                  (start_i, end_i, start_j, end_j) window each ant saw it in, from before it moves)
+        """
+
+        n = self.count
+        directions = np.full(n, np.nan)
+        can_see_food = np.zeros(n, dtype=bool)
+        food_windows = np.zeros((n, 4), dtype=np.int64)
+        search_radii = self.speeds[:n] * delta_t
+        profiler = self.profiler
+
+        for k in range(n):
+            world = self._worldOf(k)
+            x = self.xPositions[k]
+            y = self.yPositions[k]
+            home = (self.homeXPositions[k], self.homeYPositions[k])
+            trail = None if self.currentTrails[k] == NO_PHEROMONE else int(self.currentTrails[k])
+
+            if self.modes[k] == EXPLORE:
+                s_i, e_i, s_j, e_j = world.sampleArea(x, y, 0.15)
+                food_trail = world.getLayerWindow(Pheromones.FOOD, s_i, e_i, s_j, e_j)
+
+                with profiler.section("ants.sense.pheromone"):
+                    direction = directionAlongPheromone(food_trail, Pheromones.FOOD, self.headings[k],
+                                                        Pheromones.FOOD != trail)
+                trail = Pheromones.FOOD if direction is not None else None
+                with profiler.section("ants.sense.nest"):
+                    direction_to_home, trail = directionToNest(world, x, y, home, search_radii[k], trail)
+
+                if not (direction is None or direction_to_home is None):
+                    difference = abs(direction % (2 * math.pi) - direction_to_home % (2 * math.pi))
+                    if difference <= math.pi / 4:
+                        direction = None
+
+                can_see_food[k] = world.countCells(WorldCell.FOOD, s_i, e_i, s_j, e_j) > 0
+                food_windows[k] = s_i, e_i, s_j, e_j
+            else:
+                # Only the last nest lookup of Ant.pheromonePathFinding decides the direction.  The earlier calls just
+                # leave the trail on layer 0, so that last lookup always steers by angle instead of taking the first
+                # free cell
+                with profiler.section("ants.sense.nest"):
+                    direction, trail = directionToNest(world, x, y, home, search_radii[k], 0)
+
+            if direction is not None:
+                directions[k] = direction
+            self.currentTrails[k] = NO_PHEROMONE if trail is None else int(trail)
+
+        return directions, can_see_food, food_windows
+
+    def _move(self, movers, angles, distances):
+        """
+        Vectorized Ant.move for the ants selected by the movers index array
+
+        :returns: bool array of which of the movers hit something
+        """
+
+        x = self.xPositions[movers]
+        y = self.yPositions[movers]
+        new_x = x + np.cos(angles) * distances
+        new_y = y + np.sin(angles) * distances
+        is_free = self._isFreePositions(movers, new_x, new_y)
+
+        pheromones = self.activePheromones[movers]
+        trails = is_free & (pheromones != NO_PHEROMONE)
+        if trails.any():
+            with self.profiler.section("ants.deposit"):
+                self._addPheromoneLines(movers[trails], x[trails], y[trails], new_x[trails], new_y[trails],
+                                        pheromones[trails])
+
+        self.xPositions[movers] = np.where(is_free, new_x, x)
+        self.yPositions[movers] = np.where(is_free, new_y, y)
+
+        blocked = movers[~is_free]
+        self.headings[blocked] += math.pi + self._uniform(blocked, -1, 1)
+
+        self.energies[movers] -= (1 + self.speeds[movers] ** 2 / 1000 * self.sizes[movers])
+        tired = movers[self.energies[movers] < self.staminas[movers] * (1 / 8)]
+        self.modes[tired] = GO_HOME
+
+        return ~is_free
+
+    def runOnce(self, delta_t):
+        """
+        Advance every ant one timestep
+
+        :returns: number of ants that died this step
+        """
+
+        n = self.count
+        if n == 0:
+            return 0
+
+        directions, can_see_food, food_windows = self._sense(delta_t)
+        has_direction = ~np.isnan(directions)
+
+        exploring = self.modes[:n] == EXPLORE
+        x = self.xPositions[:n]
+        y = self.yPositions[:n]
+        distance_to_home = np.sqrt((x - self.homeXPositions[:n]) ** 2 + (y - self.homeYPositions[:n]) ** 2)
+        dropping_off = ~exploring & (distance_to_home < DROPOFF_DISTANCE)
+
+        # Hope is used while exploring, temper while going home
+        patience = np.where(exploring, self.hopes[:n], self.tempers[:n])
+        follow_trail = has_direction & ~dropping_off
+        keep_heading = ~has_direction & ~dropping_off & (0 < patience) & (patience < 100)
+        wander = ~has_direction & ~dropping_off & ~keep_heading
+
+        self.hopes[:n] = np.where(exploring & follow_trail, self.hopes[:n] + self.hopeIncs[:n], self.hopes[:n])
+        self.hopes[:n] = np.where(exploring & wander, -1, self.hopes[:n])
+        self.tempers[:n] = np.where(~exploring & follow_trail, self.tempers[:n] + self.temperIncs[:n], self.tempers[:n])
+        self.tempers[:n] = np.where(~exploring & wander, -1, self.tempers[:n])
+
+        noise_mag = math.pi / 4
+        angles = np.where(follow_trail, directions, self.headings[:n])
+        wanderers = np.flatnonzero(wander)
+        angles[wanderers] += self._uniform(wanderers, -noise_mag, noise_mag)
+
+        movers = np.flatnonzero(~dropping_off)
+        with self.profiler.section("ants.move"):
+            hit_something = self._move(movers, angles[movers], self.speeds[movers] * delta_t)
+
+        # Following a trail overrides any bounce, wandering into something turns the ant a bit more
+        self.headings[:n] = np.where(follow_trail, directions, self.headings[:n])
+        bounced = movers[hit_something & wander[movers]]
+        self.headings[bounced] += self._uniform(bounced, -1.5, 1.5)
+
+        # Exploring ants that found food head home with a full load, taking the food they saw before they moved
+        found_food = np.flatnonzero(exploring & can_see_food)
+        for k in found_food:
+            self._worldOf(k).takeFood(*(int(index) for index in food_windows[k]))
+        self.modes[found_food] = GO_HOME
+        self.activePheromones[found_food] = Pheromones.FOOD
+        self.headings[found_food] += math.pi
+        self.energies[found_food] = self.staminas[found_food]
+        self.foodCarried[found_food] = self.carryingCapacities[found_food]
+        self.activePheromones[np.flatnonzero(exploring & ~can_see_food)] = Pheromones.HOME
+
+        # Ants that made it home hand over their food and refuel from the nest
+        for k in np.flatnonzero(dropping_off):
+            self.modes[k] = EXPLORE
+            self.headings[k] += math.pi
+            give_food = self.giveFoodCallbacks[k]
+            if give_food is not None:
+                give_food(self.foodCarried[k])
+                self.foodCarried[k] = 0
+                self.energies[k] = give_food(-1 * (self.staminas[k] - self.energies[k]))
+
+        return self._removeDead()
+
+    def _removeDead(self):
+        """
+        :returns: Number of ants removed
+        """
+
+        return self._compact(self.energies[:self.count] > 0)
+
+    def _compact(self, keep):
+        """
+        Drop every ant that isn't marked in the keep mask, in one pass over the arrays
+
+        :returns: Number of ants removed
+        """
+
+        n = self.count
+        num_removed = n - int(np.count_nonzero(keep))
+        if num_removed == 0:
+            return 0
+
+        for name in self._arrayNames():
+            array = getattr(self, name)
+            array[:n - num_removed] = array[:n][keep]
+        self.giveFoodCallbacks = [callback for callback, kept in zip(self.giveFoodCallbacks, keep) if kept]
+        self.count = n - num_removed
+
+        return num_removed
+
+    # The world facing bits, so a population can be spread over more than one world (see BatchedAntPopulation)
+    def _worldOf(self, k) -> AntWorld:
+        return self.world
+
+    def _isFreePositions(self, ants, x, y):
+        is_free, _ = self.world.isFreePositions(x, y)
+        return is_free
+
+    def _addPheromoneLines(self, ants, start_x, start_y, end_x, end_y, pheromones):
+        self.world.addPheromoneLines(start_x, start_y, end_x, end_y, pheromones)
+
+    def _uniform(self, ants, low, high):
+        """
+        One uniform random number for each of the ants
+        """
+
+        rng = self.rng if self.rng is not None else np.random
+        return rng.uniform(low, high, len(ants))
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+
+"""
+Runs a whole batch of colonies side by side in one process
+
+Every colony gets its own copy of the world, but the layers of all the worlds are stacked along a leading axis, and all
+the ants of all the colonies live in one BatchedAntPopulation.  So evaporation, movement, collisions and trail laying
+happen in one numpy step per tick for the whole batch, instead of once per colony.  Each colony still has its own
+pheromones, food and random number streams.
+"""
+
+import functools
+import numpy as np
+
+from typing import List, Union
+
+from faux_formicidae.world import AntWorld, Pheromones, NUM_PHEROMONES, rasterizeLines, evaporateLayer
+from faux_formicidae.ant import Ant
+from faux_formicidae.ant_colony import AntColony, ColonyParameters
+from faux_formicidae.ant_population import AntPopulation
+from faux_formicidae.navigation import NavigationField
+from faux_formicidae.world_template import WorldTemplate
+from faux_formicidae.simulation import makeRandomStreams
+from faux_formicidae.profiling import NULL_PROFILER, TICKS, ANT_TICKS
+
+
+class WorldStack(object):
+    def __init__(self, worlds: List[AntWorld]):
+        """
+        :param worlds: Worlds that all have the same size and storage, their layers get moved into the stack
+        """
+
+        self.worlds = worlds
+        template = worlds[0]
+        self.storage = template.storage
+        self.resolution = template.resolution
+        self.lazyEvaporation = template.lazyEvaporation
+
+        # self.layers[layer_id] is that layer of every world, shape (num_worlds, W, H)
+        num_worlds = len(worlds)
+        if template.world is not None:
+            self.cube = np.empty((num_worlds,) + template.world.shape, dtype=template.world.dtype)
+            for k, world in enumerate(worlds):
+                world.attachLayers(cube=self.cube[k])
+            self.layers = [self.cube[:, :, :, i] for i in range(NUM_PHEROMONES + 1)]
+        else:
+            self.cube = None
+            self.layers = [np.empty((num_worlds,) + layer.shape, dtype=layer.dtype) for layer in template.layers]
+            for k, world in enumerate(worlds):
+                world.attachLayers(layers=[layer[k] for layer in self.layers])
+
+        self.profiler = NULL_PROFILER
+
+        self.pheromoneTimes = [None] * (NUM_PHEROMONES + 1)
+        if self.lazyEvaporation:
+            for pheromone in Pheromones:
+                times = template.pheromoneTimes[int(pheromone)]
+                self.pheromoneTimes[int(pheromone)] = np.empty((num_worlds,) + times.shape, dtype=times.dtype)
+            for k, world in enumerate(worlds):
+                world.attachLayers(layers=world.layers,
+                                   pheromone_times=[None if times is None else times[k] for times in self.pheromoneTimes])
+
+    def __len__(self):
+        return len(self.worlds)
+
+    def _pixelSpace(self, x, y):
+        return (np.asarray(x) * self.resolution).astype(np.int64), (np.asarray(y) * self.resolution).astype(np.int64)
+
+    def isFreePositions(self, world_indices, x, y):
+        """
+        AntWorld.isFreePositions, with each position in its own world
+        """
+
+        i, j = self._pixelSpace(x, y)
+        cells = self.layers[0]
+        in_bounds = (0 <= i) & (i < cells.shape[1]) & (0 <= j) & (j < cells.shape[2])
+
+        is_free = np.zeros(i.shape, dtype=bool)
+        is_free[in_bounds] = cells[world_indices[in_bounds], i[in_bounds], j[in_bounds]] == 0
+        return is_free
+
+    def addPheromoneLines(self, world_indices, start_x, start_y, end_x, end_y, pheromones, amount: float = 1.0):
+        """
+        AntWorld.addPheromoneLines, with each segment in its own world
+        """
+
+        s_i, s_j = self._pixelSpace(start_x, start_y)
+        e_i, e_j = self._pixelSpace(end_x, end_y)
+        i, j, line_index = rasterizeLines(s_i, s_j, e_i, e_j)
+        worlds = np.asarray(world_indices)[line_index]
+        pheromones = np.asarray(pheromones, dtype=np.int64)[line_index]
+
+        value = self.worlds[0]._encodePheromone(amount)
+        clocks = np.asarray([world.clock for world in self.worlds])
+        for pheromone in Pheromones:
+            cells = pheromones == int(pheromone)
+            if not cells.any():
+                continue
+
+            self.layers[int(pheromone)][worlds[cells], i[cells], j[cells]] = value
+            if self.lazyEvaporation:
+                self.pheromoneTimes[int(pheromone)][worlds[cells], i[cells], j[cells]] = clocks[worlds[cells]]
+
+    def runOnce(self, delta_t, active=None):
+        """
+        AntWorld.runOnce for every world, with the evaporation done for all of them at once
+
+        :param active: Bool array of which worlds are still going, the rest don't get any new food
+        """
+
+        with self.profiler.section("world.food"):
+            for k, world in enumerate(self.worlds):
+                if active is None or active[k]:
+                    world.clock += delta_t
+                    world.updateFood(delta_t)
+
+        if not self.lazyEvaporation:
+            with self.profiler.section("world.evaporate"):
+                for pheromone in Pheromones:
+                    evaporateLayer(self.layers[int(pheromone)], delta_t, self.storage)
+
+
+class BatchedAntPopulation(AntPopulation):
+    """
+    AntPopulation where every ant also remembers which world of a WorldStack it is in
+    """
+
+    def __init__(self, stack: WorldStack, rngs: List[np.random.Generator], capacity=64):
+        super().__init__(stack.worlds[0], capacity)
+        self.stack = stack
+        self.rngs = rngs
+        self.worldIndices = np.zeros(capacity, dtype=np.int64)
+        # Kept as a list, every ndarray attribute is treated as one entry per ant
+        self.deadPerWorld = [0] * len(stack)
+
+    def addAnt(self, ant: Ant, x: float, y: float, world_index=0):
+        super().addAnt(ant, x, y)
+        self.worldIndices[self.count - 1] = world_index
+
+    def countPerWorld(self):
+        return np.bincount(self.worldIndices[:self.count], minlength=len(self.stack))
+
+    def removeWorld(self, world_index):
+        """
+        Drop all the ants in one of the worlds
+        """
+
+        return self._compact(self.worldIndices[:self.count] != world_index)
+
+    def _removeDead(self):
+        alive = self.energies[:self.count] > 0
+        for world_index in self.worldIndices[:self.count][~alive]:
+            self.deadPerWorld[world_index] += 1
+        return self._compact(alive)
+
+    def _worldOf(self, k) -> AntWorld:
+        return self.stack.worlds[self.worldIndices[k]]
+
+    def _isFreePositions(self, ants, x, y):
+        return self.stack.isFreePositions(self.worldIndices[ants], x, y)
+
+    def _addPheromoneLines(self, ants, start_x, start_y, end_x, end_y, pheromones):
+        self.stack.addPheromoneLines(self.worldIndices[ants], start_x, start_y, end_x, end_y, pheromones)
+
+    def _uniform(self, ants, low, high):
+        # Each colony draws from its own stream, so colonies don't change each other's luck
+        values = np.empty(len(ants))
+        worlds = self.worldIndices[ants]
+        for world_index in np.unique(worlds):
+            in_world = worlds == world_index
+            values[in_world] = self.rngs[world_index].uniform(low, high, np.count_nonzero(in_world))
+        return values
+
+
+class BatchedSimulation(object):
+    def __init__(self, template: Union[AntWorld, WorldTemplate], colony_params: List[ColonyParameters], seeds=None,
+                 nest_navigation=False, profiler=None):
+        """
+        :param template: World every colony starts from, it gets copied for each of them, or a WorldTemplate to make
+                         their worlds from
+        :param colony_params: One colony per entry
+        :param seeds: Scenario seed for each colony, see makeRandomStreams
+        :param nest_navigation: Give each colony's nest a NavigationField, like Simulation does
+        :param profiler: Profiler for the whole batch, see faux_formicidae.profiling
+        """
+
+        num_colonies = len(colony_params)
+        seeds = seeds if seeds is not None else [None] * num_colonies
+        self.streams = [makeRandomStreams(seed) for seed in seeds]
+        self.clock = 0
+
+        self.worlds = []
+        for streams in self.streams:
+            world = template.newWorld() if isinstance(template, WorldTemplate) else template.copy()
+            world.rng = streams.world
+            self.worlds.append(world)
+        self.stack = WorldStack(self.worlds)
+        self.population = BatchedAntPopulation(self.stack, [streams.ants for streams in self.streams])
+
+        self.colonies = []
+        for k, (world, params, streams) in enumerate(zip(self.worlds, colony_params, self.streams)):
+            colony = AntColony(*world.nestPosition, params, streams.ants)
+            colony.setCallback(functools.partial(self.addAnt, k))
+            self.colonies.append(colony)
+
+            if nest_navigation and world.getNavigationField((colony.xPosition, colony.yPosition)) is None:
+                world.addNavigationField(NavigationField(world, colony.xPosition, colony.yPosition))
+
+        self.active = np.ones(num_colonies, dtype=bool)
+
+        self.profiler = profiler if profiler is not None else NULL_PROFILER
+        self.stack.profiler = self.profiler
+        self.population.profiler = self.profiler
+        for world in self.worlds:
+            world.profiler = self.profiler
+
+    def __len__(self):
+        return len(self.colonies)
+
+    def addAnt(self, world_index, ant: Ant, x: float, y: float):
+        world = self.worlds[world_index]
+        isFree, objType = world.isFreePosition(x, y)
+        if isFree:
+            ant.setWorld(world)
+            ant.setPosition(x, y)
+            self.population.addAnt(ant, x, y, world_index)
+            self.colonies[world_index].recycleAnt(ant)
+        else:
+            print(f"Can't add ant at {x}, {y}")
+            # Back into the pool it came out of, like the ones that did get added
+            self.colonies[world_index].recycleAnt(ant)
+
+    def numAnts(self):
+        """
+        :returns: Array with the number of ants in each colony
+        """
+
+        return self.population.countPerWorld()
+
+    def deactivate(self, world_index):
+        """
+        Stop running one of the colonies, so the rest don't have to keep paying for it
+        """
+
+        self.active[world_index] = False
+        self.population.removeWorld(world_index)
+
+    def runOnce(self, delta_t=0.1):
+        """
+        Advance every active colony one time step
+        :param delta_t: time step length, in seconds
+        """
+
+        profiler = self.profiler
+        with profiler.section("step"):
+            self.stack.runOnce(delta_t, self.active)
+
+            with profiler.section("colony.spawn"):
+                for k in np.flatnonzero(self.active):
+                    self.colonies[k].runOnce(delta_t, self.clock)
+
+            self.population.runOnce(delta_t)
+
+        profiler.count(TICKS)
+        profiler.count(ANT_TICKS, len(self.population))
+
+        self.clock += delta_t
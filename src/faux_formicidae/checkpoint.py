@@ -0,0 +1,42 @@
+"""
+Saving and loading the genetic algorithm's state, so a long run that gets killed can pick up where it stopped
+
+Checkpoints are written to a temporary file next to the real one and then renamed over it, so there is always either the
+old or the new checkpoint on disk, never half of one.
+"""
+
+import os
+import pickle
+import tempfile
+
+CHECKPOINT_VERSION = 1
+
+
+def saveCheckpoint(path, state: dict):
+    """
+    Atomically replace the checkpoint at path with state
+    """
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    handle, temp_path = tempfile.mkstemp(dir=directory, prefix=".checkpoint_", suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as file:
+            pickle.dump(dict(state, version=CHECKPOINT_VERSION), file, protocol=pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def loadCheckpoint(path) -> dict:
+    with open(path, "rb") as file:
+        state = pickle.load(file)
+
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"{path} is a version {state.get('version')} checkpoint, expected {CHECKPOINT_VERSION}")
+    return state
@@ -0,0 +1,439 @@
+"""
+Running one colony to see how well it does
+
+This is what the genetic algorithm's worker processes run.  The workers are set up once (initWorker) and then only get
+sent (index, ColonyParameters, seed) for each colony, so nothing big has to be pickled per task.  Every colony's world
+comes from the WorldTemplate the pool was started with, which the workers all share.
+"""
+
+import os
+import numpy as np
+
+from typing import NamedTuple, Optional, Union
+
+from faux_formicidae.world import AntWorld
+from faux_formicidae.world_template import WorldTemplate
+from faux_formicidae.simulation import Simulation, makeRandomStreams
+from faux_formicidae.batched_simulation import BatchedSimulation
+from faux_formicidae.ant_colony import AntColony, ColonyParameters
+from faux_formicidae.recording import TrajectoryRecorder, recordingPath
+from faux_formicidae.profiling import Profiler
+
+DT = 0.05
+MAX_RUN_TIME = 10000
+
+
+class SimulationResult(NamedTuple):
+    """
+    Sorts by population (then index) like the old (population, index, params) tuples did
+    """
+
+    population: float  # Mean over the scenarios, when it's combined from more than one (see combineResults)
+    index: int
+    params: ColonyParameters
+    steps: int
+    seed: Optional[int]
+
+
+def combineResults(results) -> SimulationResult:
+    """
+    One result for a colony that was run on several scenarios: the mean population and the total number of steps
+    """
+
+    if len(results) == 1:
+        return results[0]
+
+    first = results[0]
+    population = float(np.mean([result.population for result in results]))
+    return SimulationResult(population, first.index, first.params, sum(result.steps for result in results), None)
+
+
+class PopulationMonitor(object):
+    """
+    Decides when a colony's population has leveled off
+    """
+
+    def __init__(self, rng=np.random):
+        """
+        :param rng: Picks how long the colony has to run at least
+        """
+
+        # I fixed the code bug in the steady-state checking and combined Vasilis' min length check together
+        #   Vasilis: To prevent this I am requiring the sim run for at least 2500 ticks. Might be overkill but
+        #   it prevents a reward for just spawning all the ants at once with a lifespan of 11 ticks, which
+        #   it liked to do
+
+        # Randomize the number of ticks, to some range around 2500
+        # it it does not bias towards one epoch length
+        min_iterations = rng.uniform(2500, 5000)
+        self.nextCheckTime = min_iterations * DT
+
+        self.population = 0
+        self.lastPopulation = 0
+        self.constantFor = 0
+
+    def check(self, clock, population):
+        """
+        Call after every step
+
+        :param clock: Simulation time
+        :param population: Number of ants right now
+        :returns: True once the population has stopped changing
+        """
+
+        # Make sure we don't get weird false positives here
+        if clock < self.nextCheckTime:
+            return False
+
+        self.population = int(population)
+
+        # Calculate percent diff
+        if self.population + self.lastPopulation == 0:
+            percent_diff = 0
+        else:
+            percent_diff = abs(self.population - self.lastPopulation) / ((self.population + self.lastPopulation) / 2)
+
+        # If it hasn't changed, start counting
+        # TODO: potentially lower this value so the colony is required to keep a steadier population
+        if abs(percent_diff) < 0.05:
+            self.constantFor += 1
+        else:
+            self.constantFor = 0
+
+        # If it hasn't changed for 10 seconds, we're done
+        if self.constantFor > 10:
+            return True
+
+        self.lastPopulation = self.population
+        self.nextCheckTime = clock + 1
+        return False
+
+
+class ColonyEvaluation(object):
+    """
+    One colony's run, which can be advanced a bit at a time, so the genetic algorithm can look at how every colony is
+    doing part way through (see GeneticAlgorithm.raceColonies)
+    """
+
+    def __init__(self, world: AntWorld, colony_params: ColonyParameters, index, seed=None, simulation_options=None,
+                 profiler=None):
+        """
+        :param world: Fresh world to run in, gets used up
+        :param seed: Scenario seed, see makeRandomStreams.  Without one everything comes from the global numpy state
+        :param profiler: Profiler for the simulation, see faux_formicidae.profiling
+        """
+
+        self.index = index
+        self.params = colony_params
+        self.seed = seed
+
+        streams = makeRandomStreams(seed) if seed is not None else None
+        if streams is not None:
+            world.rng = streams.world
+
+        self.sim = Simulation(world, rng=streams.ants if streams is not None else None, profiler=profiler,
+                              **(simulation_options or {}))
+        self.profiler = self.sim.profiler
+
+        colony = AntColony(*world.nestPosition, colony_params)
+        self.sim.addAntColony(colony)
+
+        self.monitor = PopulationMonitor(streams.schedule if streams is not None else np.random)
+        self.steps = 0
+        self.finished = False
+
+        # Population at the end of every advance
+        self.trajectory = []
+
+    def step(self):
+        """
+        Run one time step, unless the population has already leveled off (or we ran out of time)
+
+        :returns: True once finished
+        """
+
+        if self.finished:
+            return True
+
+        self.sim.runOnce(DT)
+        self.steps += 1
+
+        if self.monitor.check(self.sim.clock, self.sim.numAnts()):
+            self.finished = True
+        elif self.steps >= MAX_RUN_TIME:
+            print(f"Index {self.index} hit runtime limit before population stabilized")
+            self.finished = True
+
+        return self.finished
+
+    def advance(self, num_steps):
+        """
+        Run up to num_steps time steps
+
+        :returns: self
+        """
+
+        for i in range(num_steps):
+            if self.step():
+                break
+
+        self.trajectory.append(self.sim.numAnts())
+        return self
+
+    def score(self):
+        """
+        How well the colony has done so far, the mean of its trajectory
+        """
+
+        return float(np.mean(self.trajectory)) if len(self.trajectory) > 0 else 0.0
+
+    def result(self) -> SimulationResult:
+        """
+        Result of the run, or of the run so far if it got stopped early (with the latest population)
+        """
+
+        population = self.monitor.population
+        if not self.finished and len(self.trajectory) > 0:
+            population = int(self.trajectory[-1])
+        return SimulationResult(population, self.index, self.params, self.steps, self.seed)
+
+
+def runColonySimulation(world: AntWorld, colony_params: ColonyParameters, index, seed=None, simulation_options=None,
+                        enable_renderer=False, visualizing=False, recording_path=None, profiler=None):
+    """
+    Runs a colony until its population levels off (or it runs out of time)
+
+    :param world: Fresh world to run in, gets used up
+    :param seed: Scenario seed, see makeRandomStreams.  Without one everything comes from the global numpy state
+    :param visualizing: Just show the colony until the window is closed
+    :param recording_path: Record the run to this file with a TrajectoryRecorder, to watch later with
+                           replay_recording.py
+    :param profiler: Profiler for the simulation, see faux_formicidae.profiling
+    :returns: SimulationResult, or None if visualizing
+    """
+
+    # We do the same thing as the visualization script, just without the renderer
+
+    print(f"  Starting colony {index}")
+
+    evaluation = ColonyEvaluation(world, colony_params, index, seed, simulation_options, profiler)
+    sim = evaluation.sim
+
+    recorder = None
+    if recording_path is not None:
+        recorder = TrajectoryRecorder(recording_path, sim, DT,
+                                      metadata={"index": index, "seed": seed, "params": colony_params.floatDict()})
+
+    try:
+        if enable_renderer:
+            # Only import pygame when there's actually going to be a window
+            from faux_formicidae.renderer import Renderer
+            from faux_formicidae.snapshots import SimulationRunner
+
+            # The simulation runs in its own thread at full speed, the window just shows the latest of it
+            renderer = Renderer(sim)
+            if visualizing:
+                runner = SimulationRunner(sim, DT)
+                renderer.watch(runner, until_finished=False)
+                runner.stop()
+                renderer.quit()
+                return None
+
+            runner = SimulationRunner(sim, DT, step=evaluation.step)
+            renderer.watch(runner)
+            # Closing the window doesn't stop the run, it still needs a result
+            runner.join()
+            renderer.quit()
+            return evaluation.result()
+
+        while not evaluation.finished:
+            evaluation.step()
+
+        return evaluation.result()
+    finally:
+        if recorder is not None:
+            recorder.close()
+
+
+def runColonyBatch(template: Union[AntWorld, WorldTemplate], tasks, simulation_options=None, profiler=None):
+    """
+    Runs several colonies at once in a BatchedSimulation, each until its population levels off
+
+    :param template: World every colony starts from (doesn't get changed), or a WorldTemplate
+    :param tasks: List of (index, ColonyParameters, seed)
+    :param simulation_options: Only nest_navigation means anything here, the batch is always vectorized
+    :param profiler: Profiler for the whole batch, see faux_formicidae.profiling
+    :returns: List of SimulationResult, in the same order as tasks
+    """
+
+    simulation_options = simulation_options or {}
+    indices, colony_params, seeds = zip(*tasks)
+    print(f"  Starting colonies {', '.join(str(index) for index in indices)}")
+
+    sim = BatchedSimulation(template, list(colony_params), list(seeds),
+                            nest_navigation=simulation_options.get("nest_navigation", False), profiler=profiler)
+    monitors = [PopulationMonitor(streams.schedule) for streams in sim.streams]
+    steps = [0] * len(tasks)
+
+    for i in range(MAX_RUN_TIME):
+        sim.runOnce(DT)
+
+        populations = sim.numAnts()
+        for k in np.flatnonzero(sim.active):
+            steps[k] = i + 1
+            if monitors[k].check(sim.clock, populations[k]):
+                sim.deactivate(k)
+
+        if not sim.active.any():
+            break
+
+    for k in np.flatnonzero(sim.active):
+        print(f"Index {indices[k]} hit runtime limit before population stabilized")
+
+    return [SimulationResult(monitor.population, index, params, num_steps, seed)
+            for monitor, index, params, num_steps, seed in zip(monitors, indices, colony_params, steps, seeds)]
+
+
+# Set up once per worker process by initWorker
+_workerTemplate: Optional[WorldTemplate] = None
+_workerSimulationOptions = {}
+_workerEnableRenderer = False
+_workerRecordingDir = None
+_workerProfiling = False
+
+
+def initWorker(template: WorldTemplate, simulation_options, enable_renderer=False, recording_dir=None, profiling=False):
+    """
+    Pool initializer
+
+    :param template: What every colony's world gets made from, published (see WorldTemplate.publish) so the workers
+                     share it instead of each having their own
+
+    :param recording_dir: Record every run evaluateColony does into this directory, see recordingPath
+    :param profiling: Profile every run, the tasks then also return a profile summary (see faux_formicidae.profiling)
+    """
+
+    global _workerTemplate, _workerSimulationOptions, _workerEnableRenderer, _workerRecordingDir, _workerProfiling
+
+    _workerTemplate = template
+    _workerSimulationOptions = simulation_options
+    _workerEnableRenderer = enable_renderer
+    _workerRecordingDir = recording_dir
+    _workerProfiling = profiling
+
+
+def _newProfiler():
+    return Profiler() if _workerProfiling else None
+
+
+def _profileSummary(profiler, **labels):
+    return profiler.summary(worker=os.getpid(), **labels)
+
+
+def evaluateColony(task):
+    """
+    Pool task
+
+    :param task: (index, ColonyParameters, seed)
+    :returns: SimulationResult, or (SimulationResult, profile summary) when profiling
+    """
+
+    index, colony_params, seed = task
+    recording_path = None
+    if _workerRecordingDir is not None:
+        recording_path = recordingPath(_workerRecordingDir, colony_params, seed)
+
+    profiler = _newProfiler()
+    result = runColonySimulation(_workerTemplate.newWorld(), colony_params, index, seed, _workerSimulationOptions,
+                                 _workerEnableRenderer, recording_path=recording_path, profiler=profiler)
+    if profiler is None:
+        return result
+    return result, _profileSummary(profiler, index=index, seed=seed)
+
+
+def evaluateColonyBatch(tasks):
+    """
+    Pool task, runs a chunk of colonies together with runColonyBatch
+
+    :param tasks: List of (index, ColonyParameters, seed)
+    :returns: List of SimulationResult, or (that list, profile summary of the whole chunk) when profiling
+    """
+
+    profiler = _newProfiler()
+    results = runColonyBatch(_workerTemplate, tasks, _workerSimulationOptions, profiler)
+    if profiler is None:
+        return results
+    return results, _profileSummary(profiler, indices=[index for index, params, seed in tasks])
+
+
+class RaceProgress(NamedTuple):
+    """
+    How a colony's run in a race is going.  The run itself stays in the worker that started it (see
+    startColonyEvaluation), this is all that comes back each round
+    """
+
+    index: int
+    seed: Optional[int]
+    score: float  # See ColonyEvaluation.score
+    finished: bool
+    result: SimulationResult  # Of the run so far, see ColonyEvaluation.result
+    profile: Optional[dict]  # Profile summary, once the run is over and only when profiling
+
+
+# The races running in this worker, by (index, seed)
+_workerEvaluations = {}
+
+
+def _raceProgress(evaluation: ColonyEvaluation):
+    profile = None
+    if evaluation.finished:
+        del _workerEvaluations[(evaluation.index, evaluation.seed)]
+        profile = _evaluationProfile(evaluation)
+    return RaceProgress(evaluation.index, evaluation.seed, evaluation.score(), evaluation.finished, evaluation.result(),
+                        profile)
+
+
+def _evaluationProfile(evaluation: ColonyEvaluation):
+    if not _workerProfiling:
+        return None
+    return _profileSummary(evaluation.profiler, index=evaluation.index, seed=evaluation.seed)
+
+
+def startColonyEvaluation(task):
+    """
+    Pool task, the first round of a race.  The run stays in this worker for the next rounds, so every round of it has to
+    go to the same worker
+
+    :param task: ((index, ColonyParameters, seed), number of steps)
+    :returns: RaceProgress
+    """
+
+    (index, colony_params, seed), num_steps = task
+    print(f"  Starting colony {index}")
+    evaluation = ColonyEvaluation(_workerTemplate.newWorld(), colony_params, index, seed, _workerSimulationOptions,
+                                  _newProfiler())
+    _workerEvaluations[(index, seed)] = evaluation
+    return _raceProgress(evaluation.advance(num_steps))
+
+
+def advanceColonyEvaluation(task):
+    """
+    Pool task, one more round of a race, in the worker that started it
+
+    :param task: ((index, seed), number of steps)
+    :returns: RaceProgress
+    """
+
+    key, num_steps = task
+    return _raceProgress(_workerEvaluations[key].advance(num_steps))
+
+
+def dropColonyEvaluation(key):
+    """
+    Pool task, stops a run that got dropped from a race, in the worker that started it
+
+    :param key: (index, seed)
+    :returns: Its profile summary, None when not profiling
+    """
+
+    return _evaluationProfile(_workerEvaluations.pop(key))
@@ -0,0 +1,145 @@
+"""
+Remembers how well colonies did, so the same colony on the same seed never has to be simulated twice
+
+The results live in a SQLite file in data/, so they survive restarts of the genetic algorithm.  Each evaluation is keyed
+by a hash of everything that decides its outcome: the colony parameters, the seed, the world and simulation options, the
+contents of the map, and SIM_VERSION (bump that whenever a change to the simulation changes its results).
+"""
+
+import json
+import time
+import hashlib
+import sqlite3
+
+from enum import Enum
+from typing import List, Optional
+
+from faux_formicidae.ant_colony import ColonyParameters
+from faux_formicidae.evaluation import SimulationResult
+from faux_formicidae.world_map import DEFAULT_MAP, loadMap
+
+# 3: walls come from the map and get scaled with the resolution
+# 4: vectorized ants take the food they saw, not the food around where they moved to
+# 5: nest navigation fields get patched as food comes and goes, instead of rebuilt or left stale
+SIM_VERSION = 5
+
+
+def _canonical(value):
+    """
+    Something json.dumps gives the same string for every time, whatever types the options were in
+    """
+
+    if isinstance(value, Enum):
+        return f"{type(value).__name__}.{value.name}"
+    if isinstance(value, dict):
+        return {str(key): _canonical(value[key]) for key in sorted(value)}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if hasattr(value, "item"):
+        # numpy scalars
+        value = value.item()
+    if isinstance(value, float):
+        # repr round trips exactly, so parameters that differ in the last bit get different keys
+        return repr(value)
+    return value
+
+
+def configurationKey(world_options=None, simulation_options=None):
+    """
+    Hash of the parts of an evaluation that are the same for a whole run
+    """
+
+    world_options = world_options or {}
+    # The map's path alone isn't enough, the file could have been edited since
+    world_map = loadMap(world_options.get("map_path") or DEFAULT_MAP)
+    config = {"sim_version": SIM_VERSION, "world": world_options, "map": world_map.contentHash,
+              "simulation": simulation_options or {}}
+    return hashlib.sha256(json.dumps(_canonical(config), sort_keys=True).encode()).hexdigest()
+
+
+def evaluationKey(params: ColonyParameters, seed, config_key):
+    """
+    Hash of one colony on one seed in one configuration
+    """
+
+    data = {"params": [float(value) for value in params.getAsList()], "seed": seed, "config": config_key}
+    return hashlib.sha256(json.dumps(_canonical(data), sort_keys=True).encode()).hexdigest()
+
+
+def parametersKey(params: ColonyParameters, config_key):
+    """
+    Hash of one colony in one configuration, whatever the seed
+    """
+
+    return evaluationKey(params, None, config_key)
+
+
+class FitnessCache(object):
+    def __init__(self, path, world_options=None, simulation_options=None):
+        """
+        :param path: SQLite file, gets created if it isn't there yet
+        :param world_options: Only results from runs with the same options count as hits
+        :param simulation_options: Same
+        """
+
+        self.path = path
+        self.configKey = configurationKey(world_options, simulation_options)
+        self.hits = 0
+        self.misses = 0
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS evaluations ("
+                                "key TEXT PRIMARY KEY, "
+                                "params_key TEXT NOT NULL, "
+                                "seed INTEGER, "
+                                "population INTEGER NOT NULL, "
+                                "steps INTEGER NOT NULL, "
+                                "params TEXT NOT NULL, "
+                                "created REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS evaluations_params ON evaluations (params_key)")
+        self.connection.commit()
+
+    def get(self, params: ColonyParameters, seed, index=0) -> Optional[SimulationResult]:
+        """
+        :param index: Index to put in the returned result
+        :returns: The cached result for this colony on this seed, or None
+        """
+
+        row = self.connection.execute("SELECT population, steps FROM evaluations WHERE key = ?",
+                                      (evaluationKey(params, seed, self.configKey),)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return SimulationResult(row[0], index, params, row[1], seed)
+
+    def getReplicates(self, params: ColonyParameters, index=0) -> List[SimulationResult]:
+        """
+        Every cached result for this colony, on any seed, oldest first
+        """
+
+        rows = self.connection.execute("SELECT population, steps, seed FROM evaluations WHERE params_key = ? "
+                                       "ORDER BY created", (parametersKey(params, self.configKey),)).fetchall()
+        return [SimulationResult(population, index, params, steps, seed) for population, steps, seed in rows]
+
+    def put(self, result: SimulationResult):
+        """
+        Store a result, only results with a seed can be reproduced so the others are skipped
+        """
+
+        if result is None or result.seed is None:
+            return
+
+        self.putMany([result])
+
+    def putMany(self, results: List[SimulationResult]):
+        rows = [(evaluationKey(result.params, result.seed, self.configKey),
+                 parametersKey(result.params, self.configKey), int(result.seed), int(result.population),
+                 int(result.steps), json.dumps([float(value) for value in result.params.getAsList()]), time.time())
+                for result in results if result is not None and result.seed is not None]
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def close(self):
+        self.connection.close()
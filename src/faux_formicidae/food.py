@@ -0,0 +1,103 @@
+"""
+Bookkeeping for the patches of food in the world
+
+Each patch that gets spawned is a FoodSource that knows where it is and how much is left.  The FoodRegistry buckets them
+on a coarse grid, so finding the food near an ant means looking at a couple of buckets instead of scanning pixels.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Size of the spatial index buckets, in cells
+BUCKET_SIZE = 32
+
+
+@dataclass
+class FoodSource(object):
+    source_id: int
+    start_i: int
+    end_i: int
+    start_j: int
+    end_j: int
+    amount: int  # Food cells left
+    initial_amount: int
+    spawn_time: float
+    pickups: int = 0  # How many times an ant has taken food from here
+    depleted_time: Optional[float] = None
+
+    def overlap(self, start_i, end_i, start_j, end_j):
+        """
+        Intersection of this source with a (normalized) block, None if they don't touch
+        """
+
+        s_i, e_i = max(self.start_i, start_i), min(self.end_i, end_i)
+        s_j, e_j = max(self.start_j, start_j), min(self.end_j, end_j)
+        if e_i <= s_i or e_j <= s_j:
+            return None
+        return s_i, e_i, s_j, e_j
+
+    def statistics(self):
+        return {"source_id": self.source_id, "initial_amount": self.initial_amount, "amount": self.amount,
+                "eaten": self.initial_amount - self.amount, "pickups": self.pickups,
+                "spawn_time": self.spawn_time, "depleted_time": self.depleted_time}
+
+
+class FoodRegistry(object):
+    def __init__(self):
+        self.sources: Dict[int, FoodSource] = {}
+        self.depletedSources: List[FoodSource] = []
+        self.buckets: Dict[tuple, List[FoodSource]] = {}
+        self.nextId = 0
+
+    def __len__(self):
+        return len(self.sources)
+
+    @staticmethod
+    def _bucketKeys(start_i, end_i, start_j, end_j):
+        for b_i in range(start_i // BUCKET_SIZE, (end_i - 1) // BUCKET_SIZE + 1):
+            for b_j in range(start_j // BUCKET_SIZE, (end_j - 1) // BUCKET_SIZE + 1):
+                yield b_i, b_j
+
+    def add(self, start_i, end_i, start_j, end_j, amount, spawn_time) -> FoodSource:
+        source = FoodSource(self.nextId, start_i, end_i, start_j, end_j, amount, amount, spawn_time)
+        self.nextId += 1
+
+        self.sources[source.source_id] = source
+        for key in self._bucketKeys(start_i, end_i, start_j, end_j):
+            self.buckets.setdefault(key, []).append(source)
+        return source
+
+    def remove(self, source: FoodSource, time):
+        source.depleted_time = time
+        self.depletedSources.append(source)
+
+        del self.sources[source.source_id]
+        for key in self._bucketKeys(source.start_i, source.end_i, source.start_j, source.end_j):
+            self.buckets[key].remove(source)
+            if len(self.buckets[key]) == 0:
+                del self.buckets[key]
+
+    def query(self, start_i, end_i, start_j, end_j) -> List[FoodSource]:
+        """
+        Sources that overlap a (normalized) block
+        """
+
+        found = {}
+        for key in self._bucketKeys(start_i, end_i, start_j, end_j):
+            for source in self.buckets.get(key, []):
+                if source.overlap(start_i, end_i, start_j, end_j) is not None:
+                    found[source.source_id] = source
+        return list(found.values())
+
+    def statistics(self):
+        """
+        Per-source yields, for working out how well a colony fed itself
+        """
+
+        sources = list(self.depletedSources) + list(self.sources.values())
+        sources.sort(key=lambda source: source.source_id)
+        return {"spawned": len(sources),
+                "depleted": len(self.depletedSources),
+                "eaten": sum(source.initial_amount - source.amount for source in sources),
+                "pickups": sum(source.pickups for source in sources),
+                "sources": [source.statistics() for source in sources]}
@@ -3,10 +3,11 @@ Class to actually run the genetic algorithm
 """
 
 import os
-import time
+import math
+import uuid
+import queue
 import curses
 
-import numpy as np
 import yaml
 import numpy
 import heapq
@@ -14,12 +15,19 @@ import random
 import multiprocessing
 
 from tqdm import tqdm
-from typing import List
-
-from faux_formicidae.world import AntWorld
-from faux_formicidae.simulation import Simulation
-from faux_formicidae.renderer import Renderer
-from faux_formicidae.ant_colony import AntColony, ColonyParameters
+from typing import List, Optional
+
+from faux_formicidae.world_template import WorldTemplate
+from faux_formicidae.world_map import MAP_CACHE_DIR
+from faux_formicidae.ant_colony import ColonyParameters
+from faux_formicidae.fitness_cache import FitnessCache
+from faux_formicidae.evaluation import initWorker, evaluateColony, evaluateColonyBatch, runColonySimulation, \
+    combineResults, startColonyEvaluation, advanceColonyEvaluation, dropColonyEvaluation, SimulationResult
+from faux_formicidae.checkpoint import saveCheckpoint, loadCheckpoint
+from faux_formicidae.results_store import ResultsStore, writeResultsYaml
+from faux_formicidae.result_log import ResultLog, deriveGenerations
+from faux_formicidae.recording import recordingPath
+from faux_formicidae.profiling import combineSummaries, writeProfile
 
 # set these to control the range of ant colonies that can be generated
 MINIMUM = ColonyParameters(0, 0.1, 0)
@@ -31,14 +39,89 @@ PATH = os.path.abspath(os.path.join(os.path.abspath(__file__), "..", "..", "..")
 class GeneticAlgorithm(object):
     progress = {}
 
-    def __init__(self, enable_renderer=False, batch_size=20):
+    def __init__(self, enable_renderer=False, batch_size=20, world_options=None, simulation_options=None,
+                 num_workers=None, batched=False, cache_path=None, new_replicates=False, num_scenarios=1,
+                 racing=False, racing_round_steps=1000, racing_drop_fraction=0.5, checkpoint_path=None,
+                 recording_dir=None, profile=False):
+        """
+        :param num_workers: Size of the worker pool, defaults to the number of CPUs
+        :param batched: Each worker runs its share of the colonies together in one BatchedSimulation, instead of one
+                        colony at a time
+        :param world_options: Keyword arguments for every AntWorld, e.g. {"storage": WorldStorage.QUANTIZED}
+        :param simulation_options: Keyword arguments for every Simulation, e.g. {"vectorized": True}
+        :param cache_path: SQLite file to remember results in (see FitnessCache), defaults to data/fitness_cache.sqlite,
+                           False turns the cache off
+        :param new_replicates: Draw new scenarios every generation instead of reusing the old ones.  Colonies that were
+                               already run on earlier scenarios keep those results as well (see earlierReplicates), so
+                               the elites' fitness is the mean over every scenario they've been run on
+        :param num_scenarios: How many seeded scenarios every colony gets run on, its fitness is the mean over them
+        :param racing: Run the colonies in rounds and drop the worst ones after each round, so only the promising ones
+                       get run all the way (see raceColonies).  Colonies are run one at a time, so not with batched
+        :param racing_round_steps: Length of a racing round, in time steps
+        :param racing_drop_fraction: Fraction of the colonies still running that get dropped after each round
+        :param checkpoint_path: Where to save a checkpoint after every finished run and generation (see resume), None
+                                for no checkpoints
+        :param recording_dir: Record every colony run one at a time into this directory (see recordingPath), to watch
+                              with replay_recording.py.  Batched and racing runs don't get recorded
+        :param profile: Time the phases of every run (see faux_formicidae.profiling) and save a summary of each
+                        generation to data/profile_N.json
+        """
+
+        # Everything needed to make this object again when resuming from a checkpoint
+        self.options = {name: value for name, value in locals().items() if name != "self"}
+
+        if racing and batched:
+            raise ValueError("Racing runs every colony on its own, it can't be combined with batched")
+
         self.enableRenderer = enable_renderer
         self.batchSize = batch_size
+        self.worldOptions = world_options if world_options is not None else {}
+        self.simulationOptions = simulation_options if simulation_options is not None else {}
+
+        self.numWorkers = num_workers
+        self.batched = batched
+        self.pool = None
+        # One single-process pool per worker for racing, see getRacePools
+        self.racePools = None
+        # Built the first time a world is needed, published for the pool to share
+        self.worldTemplate = None
+
+        if cache_path is None:
+            cache_path = os.path.join(PATH, "data", "fitness_cache.sqlite")
+        self.cachePath = cache_path
+        self.cache = None
+        self.newReplicates = new_replicates
+        self.numScenarios = num_scenarios
+
+        self.racing = racing
+        self.racingRoundSteps = racing_round_steps
+        self.racingDropFraction = racing_drop_fraction
 
         self.defaultSaveFile = os.path.join(PATH, "data", "best_ants.yaml")
+        self.resultsStoreFile = os.path.join(PATH, "data", "results.sqlite")
+        self.resultLogFile = os.path.join(PATH, "data", "results.jsonl")
+        self.resultLog = None
+        # Tells this run's records in the result log apart from those of earlier runs, kept when resuming
+        self.runId = uuid.uuid4().hex
+        # Records logged for the generation in progress, what its results get saved from
+        self.generationRecords = []
+        self.recordingDir = recording_dir
+
+        self.profile = profile
+        # Profile summary of every run in the current generation
+        self.runProfiles = []
 
         self.simResults = []
         self.colonyParameters: List[ColonyParameters] = []
+        # Every colony in a generation gets run on the same scenarios (common random numbers), so differences in their
+        # results come from the colonies and not from luck.  They're kept between generations unless new_replicates is
+        # set, so colonies that survive a generation come straight out of the cache
+        self.scenarioSeeds: List[int] = []
+
+        self.checkpointPath = checkpoint_path
+        self.generation = 0
+        # Runs of the generation in progress that have already finished, so a resumed generation can skip them
+        self.finishedRuns: List[SimulationResult] = []
 
     def generateRandomColonies(self):
         """
@@ -55,6 +138,14 @@ class GeneticAlgorithm(object):
             param_object = ColonyParameters(*new_params)
             self.colonyParameters.append(param_object)
 
+    @staticmethod
+    def getNumToKeep(num_colonies):
+        """
+        How many of the best colonies make it into the next generation
+        """
+
+        return max(int(num_colonies * 0.1), 2)
+
     def generateColoniesFromSimResults(self):
         """
         The actual genetic algorithm implementation
@@ -66,7 +157,7 @@ class GeneticAlgorithm(object):
         # TODO: Define hyper-parameters better
 
         # Hyper-parameters (for now)
-        num_to_keep = max(int(len(self.simResults) * 0.1), 2)
+        num_to_keep = self.getNumToKeep(len(self.simResults))
         noise_stdev = 0.1
         alpha = 0.5  # This could use a better name
 
@@ -84,127 +175,504 @@ class GeneticAlgorithm(object):
         num_to_crossover = num_to_make - num_to_mutate
 
         # Make some mutations
-        # TODO: Enforce limits on new parameters
         for i in range(num_to_mutate):
-            base = random.choice(kept_sim_results)
-            params = base.getAsNumpy()
-            params += numpy.random.normal(0, noise_stdev, params.shape)
-            param_object = ColonyParameters(*params)
-            self.colonyParameters.append(param_object)
+            self.colonyParameters.append(self.mutate(random.choice(kept_sim_results), noise_stdev))
 
         # Make some crossovers
         for i in range(num_to_crossover):
-            parents = random.sample(kept_sim_results, 2)
-            parents = [i.getAsList() for i in parents]
-            split_point = int(len(parents[0]) / 2)
+            self.colonyParameters.append(self.crossover(random.sample(kept_sim_results, 2)))
+
+    @staticmethod
+    def mutate(base: ColonyParameters, noise_stdev=0.1) -> ColonyParameters:
+        # TODO: Enforce limits on new parameters
+        params = base.getAsNumpy()
+        params += numpy.random.normal(0, noise_stdev, params.shape)
+        return ColonyParameters(*params)
+
+    @staticmethod
+    def crossover(parents: List[ColonyParameters]) -> ColonyParameters:
+        parents = [i.getAsList() for i in parents]
+        split_point = int(len(parents[0]) / 2)
+
+        # Merge two together naively
+        child = parents[0][0:split_point] + parents[1][split_point:]
+        return ColonyParameters(*child)
+
+    def breedChild(self, elites: List[ColonyParameters], noise_stdev=0.1, alpha=0.5) -> ColonyParameters:
+        """
+        One new colony from the elites, a mutation alpha of the time and a crossover otherwise (the same mix
+        generateColoniesFromSimResults makes)
+        """
+
+        if len(elites) < 2 or random.random() < alpha:
+            return self.mutate(random.choice(elites), noise_stdev)
+        return self.crossover(random.sample(elites, 2))
+
+    def getWorldTemplate(self) -> WorldTemplate:
+        """
+        Walls, summed-area tables and nest navigation for every world, worked out once (or loaded from
+        data/map_cache, if they were worked out for this map before) and published so the workers can share them
+        """
+
+        if self.worldTemplate is None:
+            self.worldTemplate = WorldTemplate(self.worldOptions, self.simulationOptions.get("nest_navigation", False),
+                                               MAP_CACHE_DIR)
+            self.worldTemplate.publish()
+        return self.worldTemplate
+
+    def getPool(self):
+        """
+        The worker pool is started the first time it's needed and then kept for every batch after that
+        """
+
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.numWorkers, initializer=initWorker, initargs=self.getWorkerArgs())
+        return self.pool
+
+    def getRacePools(self):
+        """
+        A race keeps every colony's run in the worker that started it, so the rounds after the first have to go to that
+        worker, which a shared pool can't do.  So each racing worker is a pool of its own, started the first time
+        there's a race and kept after that
+        """
+
+        if self.racePools is None:
+            self.racePools = [multiprocessing.Pool(1, initializer=initWorker, initargs=self.getWorkerArgs())
+                              for _ in range(self.numWorkers or os.cpu_count() or 1)]
+        return self.racePools
+
+    def getWorkerArgs(self):
+        """
+        Arguments for initWorker
+        """
+
+        return self.getWorldTemplate(), self.simulationOptions, self.enableRenderer, self.recordingDir, self.profile
+
+    def getCache(self) -> Optional[FitnessCache]:
+        """
+        Opened the first time it's needed, and only in this process
+        """
+
+        if self.cache is None and self.cachePath is not False:
+            # A batch always runs vectorized, and gives the same results as a vectorized Simulation on the same seed
+            simulation_options = dict(self.simulationOptions, vectorized=True) if self.batched else self.simulationOptions
+            self.cache = FitnessCache(self.cachePath, self.worldOptions, simulation_options)
+        return self.cache
+
+    def getScenarioSeeds(self, new_scenarios=False):
+        """
+        Seeds for the scenarios every colony in this generation gets run on
+        """
+
+        if new_scenarios or len(self.scenarioSeeds) != self.numScenarios:
+            self.scenarioSeeds = [int(seed) for seed in numpy.random.randint(2 ** 31, size=self.numScenarios)]
+        return self.scenarioSeeds
+
+    def earlierReplicates(self, params: ColonyParameters, index, seeds) -> List[SimulationResult]:
+        """
+        With new_replicates, the cached results a colony already has from scenarios other than seeds, which get combined
+        with the new ones.  Nothing otherwise, the colony only counts this generation's scenarios
+        """
+
+        cache = self.getCache()
+        if not self.newReplicates or cache is None:
+            return []
+        return [result for result in cache.getReplicates(params, index) if result.seed not in seeds]
+
+    def getResultLog(self) -> ResultLog:
+        if self.resultLog is None:
+            self.resultLog = ResultLog(self.resultLogFile, self.runId)
+        return self.resultLog
+
+    def close(self):
+        """
+        Shut down the worker pool, the cache and the result log, and delete the published world template
+        """
+
+        if self.resultLog is not None:
+            self.resultLog.close()
+            self.resultLog = None
+
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+        if self.racePools is not None:
+            for pool in self.racePools:
+                pool.close()
+                pool.join()
+            self.racePools = None
+
+        if self.worldTemplate is not None:
+            self.worldTemplate.close()
+            self.worldTemplate = None
 
-            # Merge two together naively
-            child = parents[0][0:split_point] + parents[1][split_point:]
-            self.colonyParameters.append(ColonyParameters(*child))
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
 
     def runBatch(self):
         self.simResults = []
+        self.generationRecords = []
         self.progress = {}
+        self.runProfiles = []
+
+        cache = self.getCache()
+        scenario_results = {i: [] for i in range(self.batchSize)}
+        tasks = []
+
+        # Picking up a generation from a checkpoint, the scenarios were already drawn
+        resuming = len(self.finishedRuns) > 0
+        finished = {(result.index, result.seed): result for result in self.finishedRuns}
+
+        for seed in self.getScenarioSeeds(self.newReplicates and not resuming):
+            for i in range(self.batchSize):
+                cached = cache.get(self.colonyParameters[i], seed, i) if cache is not None else None
+                if cached is not None:
+                    self.logRun(cached, cached=True)
+                elif (i, seed) in finished:
+                    # Already run before a restart.  Logged again, in case the log didn't make it to disk before the
+                    # crash, reading the log ignores the duplicates
+                    cached = finished[(i, seed)]
+                    self.logRun(cached)
+                if cached is not None:
+                    scenario_results[i].append(cached)
+                else:
+                    tasks.append((i, self.colonyParameters[i], seed))
+
+        num_runs = self.batchSize * self.numScenarios
+        if len(tasks) < num_runs:
+            print(f"{num_runs - len(tasks)} of {num_runs} runs already evaluated")
 
         # Use multiprocessing to parallelize stuff
-        pool = multiprocessing.Pool()
-        for i in pool.imap_unordered(self.runSimulationOnce, range(self.batchSize)):
-            heapq.heappush(self.simResults, i)
+        new_results = []
+        dropped = set()
+        if self.racing:
+            new_results, dropped = self.raceColonies(tasks)
+            self.runsFinished(new_results, dropped)
+        elif self.batched:
+            # One chunk of colonies per worker
+            num_chunks = min(self.numWorkers or os.cpu_count() or 1, len(tasks))
+            chunks = [tasks[k::num_chunks] for k in range(num_chunks)]
+            for output in self.getPool().imap_unordered(evaluateColonyBatch, chunks):
+                chunk_results = self.withoutProfile(output)
+                new_results += chunk_results
+                self.runsFinished(chunk_results)
+        else:
+            for output in self.getPool().imap_unordered(evaluateColony, tasks):
+                i = self.withoutProfile(output)
+                new_results.append(i)
+                self.runsFinished([i])
+
+        if cache is not None:
+            # Colonies knocked out of a race didn't get a full run, so there's nothing to remember for them
+            cache.putMany([i for i in new_results if i.index not in dropped])
+        for i in new_results:
+            scenario_results[i.index].append(i)
+
+        for i in range(self.batchSize):
+            if i not in dropped:
+                earlier = self.earlierReplicates(self.colonyParameters[i], i, self.scenarioSeeds)
+                for result in earlier:
+                    self.logRun(result, cached=True)
+                heapq.heappush(self.simResults, combineResults(earlier + scenario_results[i]))
 
         # Sort list
         self.simResults = [heapq.heappop(self.simResults) for i in range(len(self.simResults))]
         self.simResults.reverse()
 
-    def runSimulationOnce(self, index, visualizing=False):
-        # We do the same thing as the visualization script, just without the renderer
-
-        print(f"  Starting colony {index}")
-
-        colony_params = self.colonyParameters[index]
-
-        world = AntWorld()
-        sim = Simulation(world)
-
-        colony = AntColony(world.width / 2, world.height / 2, colony_params)
-        sim.addAntColony(colony)
-
-        # I fixed the code bug in the steady-state checking and combined Vasilis' min length check together
-        dt = 0.05
-        min_iterations = np.random.uniform(2500, 5000)
-        next_population_check_time = min_iterations * dt
-        next_print_time = 0
-
-        population = 0
-        last_population = 0
-        population_constant_for = 0
-
-        if self.enableRenderer:
-            renderer = Renderer(sim)
-            if visualizing:
-                i = 0
-                while renderer.running():
-                    if i % 1000 == 0:
-                        print(len(sim.ants))
-                    i += 1
-                    sim.runOnce(dt)
-                    renderer.render()
-                renderer.quit()
-                return None
-
-        max_run_time = 10000
-        for i in range(max_run_time):
-            sim.runOnce(dt)
-
-            if time.time() > next_print_time:
-                # TODO: Figure out how to make a nice display output in a threadsafe way (I'm not sure its doable)
-                next_print_time = time.time() + 1
-
-            if self.enableRenderer:
-                renderer.render()
-
-            # Make sure we don't get weird false positives here
-            #   Vasilis: To prevent this I am requiring the sim run for at least 2500 ticks. Might be overkill but
-            #   it prevents a reward for just spawning all the ants at once with a lifespan of 11 ticks, which
-            #   it liked to do
-
-            # Randomize the number of ticks, to some range around 2500
-            # it it does not bias towards one epoch length
-            # print(sim.clock, next_population_check_time)
-            if sim.clock >= next_population_check_time:
-                population = int(len(sim.ants))
-                # print(population)
-
-                # Calculate percent diff
-                if population + last_population == 0:
-                    percent_diff = 0
-                else:
-                    percent_diff = abs(population - last_population) / ((population + last_population) / 2)
+        # Colonies knocked out of a race go below every colony that finished, whatever their population was when they
+        # got dropped
+        self.simResults += sorted([combineResults(scenario_results[i]) for i in dropped], reverse=True)
+        self.finishedRuns = []
 
-                # If it hasn't changed, start counting
-                # TODO: potentially lower this value so the colony is required to keep a steadier population
-                if abs(percent_diff) < 0.05:
-                    population_constant_for += 1
-                else:
-                    population_constant_for = 0
+    def withoutProfile(self, output):
+        """
+        What a worker task returned, minus the profile summary that comes with it when profiling (which goes into
+        runProfiles)
+        """
+
+        if not self.profile:
+            return output
+
+        results, summary = output
+        self.runProfiles.append(summary)
+        return results
+
+    def runsFinished(self, results: List[SimulationResult], dropped=()):
+        """
+        Log runs of the current generation as soon as they're done, and remember them so they don't have to be run
+        again after a restart
+
+        :param dropped: Indices of colonies that got knocked out of a race
+        """
+
+        for result in results:
+            self.logRun(result, dropped=result.index in dropped)
+        self.finishedRuns += results
+        self.saveCheckpoint()
+
+    def logRun(self, result: SimulationResult, cached=False, dropped=False):
+        """
+        Log a run of the current generation, and keep its record for saveColonyResults
+        """
+
+        self.generationRecords.append(self.getResultLog().logRun(self.generation, result, cached, dropped))
+
+    def run(self, last_generation):
+        """
+        Run generations until self.generation gets to last_generation, saving each one's parameters and results, and a
+        checkpoint after each of them
+        """
+
+        while self.generation < last_generation:
+            i = self.generation
+            print(f"\n\nRunning batch {i}")
+            self.saveColonyParameters(batch_id=i)
+            self.runBatch()
+            self.saveColonyResults(i)
+            if self.profile:
+                self.saveProfile(i)
+            self.generateColoniesFromSimResults()
+
+            self.generation += 1
+            self.saveCheckpoint()
+
+    def getState(self):
+        """
+        Everything needed to carry on from exactly where the run is now
+        """
 
-                # If it hasn't changed for 10 seconds, we're done
-                if population_constant_for > 10:
-                    # print(f"Population leveled off after {sim.clock} seconds")
-                    # print(f'Population leveled off after {i} iterations')
+        return {"options": self.options,
+                "run_id": self.runId,
+                "generation": self.generation,
+                "batch_size": self.batchSize,
+                "colony_parameters": self.colonyParameters,
+                "scenario_seeds": self.scenarioSeeds,
+                "sim_results": self.simResults,
+                "finished_runs": self.finishedRuns,
+                "numpy_random_state": numpy.random.get_state(),
+                "random_state": random.getstate()}
+
+    def setState(self, state):
+        # Checkpoints from before runs had ids keep the new one
+        self.runId = state.get("run_id", self.runId)
+        self.generation = state["generation"]
+        self.batchSize = state["batch_size"]
+        self.colonyParameters = state["colony_parameters"]
+        self.scenarioSeeds = state["scenario_seeds"]
+        self.simResults = state["sim_results"]
+        self.finishedRuns = state["finished_runs"]
+        numpy.random.set_state(state["numpy_random_state"])
+        random.setstate(state["random_state"])
+
+    def saveCheckpoint(self):
+        if self.checkpointPath is not None:
+            saveCheckpoint(self.checkpointPath, self.getState())
+
+    @classmethod
+    def resume(cls, checkpoint_path, **options):
+        """
+        Make a GeneticAlgorithm that carries on from a checkpoint, with the same options it was started with
+
+        :param options: Options to change, e.g. num_workers on a different machine
+        """
+
+        state = loadCheckpoint(checkpoint_path)
+        options = dict(state["options"], checkpoint_path=checkpoint_path, **options)
+        genetic_algorithm = cls(**options)
+        genetic_algorithm.setState(state)
+        return genetic_algorithm
+
+    def raceColonies(self, tasks):
+        """
+        Successive halving: runs every task for a round, then drops the worst racingDropFraction of the colonies that
+        are still going (by their mean population so far, over all of their scenarios), and so on until everything
+        left has finished
+
+        :param tasks: List of (index, ColonyParameters, seed)
+        :returns: (SimulationResult for every task, set of the indices of the colonies that got dropped)
+        """
+
+        # Every run stays in the worker that started it, only RaceProgress comes back each round
+        pools = self.getRacePools()
+        owners = {}
+        started = []
+        for k, task in enumerate(tasks):
+            index, params, seed = task
+            owners[(index, seed)] = pools[k % len(pools)]
+            started.append(owners[(index, seed)].apply_async(startColonyEvaluation, ((task, self.racingRoundSteps),)))
+        running = [output.get() for output in started]
+        done = []
+        dropped = set()
+        dropping = []
+
+        while True:
+            done += [progress for progress in running if progress.finished]
+            running = [progress for progress in running if not progress.finished]
+            if len(running) == 0:
+                break
+
+            scores = {}
+            for progress in running + done:
+                scores.setdefault(progress.index, []).append(progress.score)
+            contenders = sorted({progress.index for progress in running},
+                                key=lambda index: numpy.mean(scores[index]), reverse=True)
+
+            num_to_keep = max(int(math.ceil(len(contenders) * (1 - self.racingDropFraction))),
+                              self.getNumToKeep(self.batchSize))
+            losers = set(contenders[num_to_keep:])
+            if len(losers) > 0:
+                print(f"Dropping {len(losers)} of {len(contenders)} colonies still racing")
+            dropped |= losers
+
+            for progress in running:
+                if progress.index in losers:
+                    key = (progress.index, progress.seed)
+                    dropping.append((progress, owners[key].apply_async(dropColonyEvaluation, (key,))))
+            running = [progress for progress in running if progress.index not in losers]
+
+            advancing = [owners[(progress.index, progress.seed)].apply_async(
+                advanceColonyEvaluation, (((progress.index, progress.seed), self.racingRoundSteps),))
+                for progress in running]
+            running = [output.get() for output in advancing]
+
+        # Dropped runs only send their profile once they're stopped
+        done += [progress._replace(profile=output.get()) for progress, output in dropping]
+        if self.profile:
+            self.runProfiles += [progress.profile for progress in done]
+
+        return [progress.result for progress in done], dropped
+
+    def runSteadyState(self, num_children, archive_size=None):
+        """
+        Asynchronous steady-state evolution: there are no generations to wait on, every time a colony's results come in
+        it goes into a ranked archive and a new child of the current elites gets sent off straight away, so the workers
+        never sit around waiting for the slowest colony of a batch.  Starts from self.colonyParameters
+
+        Colonies are run one at a time on every scenario (not batched or raced).  Afterwards simResults and
+        colonyParameters hold the archive, best first, so they can be saved like a batch
+
+        :param num_children: How many new colonies to breed and evaluate
+        :param archive_size: How many of the best colonies to keep around, defaults to the batch size
+        """
+
+        archive_size = archive_size if archive_size is not None else self.batchSize
+        max_pending = (self.numWorkers or os.cpu_count() or 1) + 1
+        pool = self.getPool()
+        cache = self.getCache()
+        scenario_seeds = self.getScenarioSeeds(self.newReplicates)
+
+        # (result, whether it still needs to go in the cache), or an exception from a worker
+        finished = queue.Queue()
+        archive = []  # Best first
+        pending = {}  # index -> results still to come in
+        scenario_results = {}
+        waiting = list(self.colonyParameters)  # Colonies that still need to be sent off
+        next_index = 0
+        num_bred = 0
+
+        def submit(params):
+            nonlocal next_index
+            index = next_index
+            next_index += 1
+
+            scenario_results[index] = []
+            pending[index] = 0
+            for seed in scenario_seeds:
+                cached = cache.get(params, seed, index) if cache is not None else None
+                if cached is not None:
+                    finished.put((cached, False))
+                else:
+                    pool.apply_async(evaluateColony, ((index, params, seed),),
+                                     callback=lambda output: finished.put((self.withoutProfile(output), True)),
+                                     error_callback=finished.put)
+                pending[index] += 1
+
+        progress = tqdm(total=len(waiting) + num_children)
+        while True:
+            # Keep every worker busy
+            while len(pending) < max_pending:
+                if len(waiting) > 0:
+                    submit(waiting.pop(0))
+                elif num_bred < num_children and len(archive) > 0:
+                    elites = [result.params for result in archive[:self.getNumToKeep(len(archive))]]
+                    submit(self.breedChild(elites))
+                    num_bred += 1
+                else:
                     break
 
-                last_population = population
+            if len(pending) == 0:
+                break
+
+            item = finished.get()
+            if isinstance(item, BaseException):
+                raise item
+            result, is_new = item
+            if cache is not None and is_new:
+                cache.put(result)
+            self.getResultLog().logRun(self.generation, result, cached=not is_new)
+
+            scenario_results[result.index].append(result)
+            pending[result.index] -= 1
+            if pending[result.index] > 0:
+                continue
+
+            del pending[result.index]
+            earlier = self.earlierReplicates(result.params, result.index, scenario_seeds)
+            for replicate in earlier:
+                self.getResultLog().logRun(self.generation, replicate, cached=True)
+            combined = combineResults(earlier + scenario_results.pop(result.index))
+            progress.update(1)
+
+            # Ranked insert, ties go to the colony that got there first
+            position = 0
+            while position < len(archive) and archive[position].population >= combined.population:
+                position += 1
+            archive.insert(position, combined)
+            del archive[archive_size:]
+
+        progress.close()
+
+        self.colonyParameters = [result.params for result in archive]
+        self.simResults = [result._replace(index=k) for k, result in enumerate(archive)]
+        self.batchSize = len(self.colonyParameters)
+
+    def runSimulationOnce(self, index, visualizing=False):
+        """
+        Run one of the colonies in this process on this generation's scenarios, mostly useful for watching it with the
+        renderer.  Unless visualizing, earlier results from the cache get used where there are some (and, with a
+        recording_dir, a recording of them)
+        """
 
-                next_population_check_time = sim.clock + 1
+        params = self.colonyParameters[index]
+        if visualizing:
+            world = self.getWorldTemplate().newWorld()
+            return runColonySimulation(world, params, index, None, self.simulationOptions, self.enableRenderer,
+                                       visualizing)
 
-            if i == max_run_time - 1:
-                print(f"Index {index} hit runtime limit before population stabilized")
+        cache = self.getCache()
+        results = []
+        for seed in self.getScenarioSeeds():
+            result = cache.get(params, seed, index) if cache is not None else None
+            recording_path = None
+            if self.recordingDir is not None:
+                recording_path = recordingPath(self.recordingDir, params, seed)
+                if os.path.exists(recording_path):
+                    recording_path = None
+                else:
+                    result = None
 
-        if self.enableRenderer:
-            renderer.quit()
+            if result is None:
+                world = self.getWorldTemplate().newWorld()
+                result = runColonySimulation(world, params, index, seed, self.simulationOptions, self.enableRenderer,
+                                             recording_path=recording_path)
+                if cache is not None:
+                    cache.put(result)
+            results.append(result)
 
-        return population, index, colony_params
-        # heapq.heappush(self.simResults, (population, index, colony_params))  # Use index to break ties
+        return combineResults(results)
 
     def saveColonyParameters(self, path=None, batch_id=None):
         if batch_id is not None:
@@ -215,6 +683,9 @@ class GeneticAlgorithm(object):
         # TODO: Add hyperparameters
         data_dict = {"ants": [i.floatDict() for i in self.colonyParameters],
                      }
+        if len(self.scenarioSeeds) > 0:
+            # So colonies that were already evaluated can come out of the cache after a restart
+            data_dict["scenarios"] = [int(seed) for seed in self.scenarioSeeds]
 
         file = open(path, 'w')
         yaml.dump(data_dict, file)
@@ -223,23 +694,33 @@ class GeneticAlgorithm(object):
     def saveColonyResults(self, batch_id):
         path = os.path.join(PATH, "data", f"results_{batch_id}.yaml")
 
-        results = []
+        # Every run is already in the result log, this is the tidied up per-generation view of it
+        results = deriveGenerations(self.generationRecords).get(batch_id, [])
+        writeResultsYaml(path, results)
 
-        for result in self.simResults:
-            population, index, params = result
-            data_dict = {"population": population}
-            data_dict.update(params.floatDict())
+        # The whole history in one place, which is what plotting.py reads
+        store = ResultsStore(self.resultsStoreFile)
+        store.appendGeneration(batch_id, results)
+        store.close()
 
-            while len(results) <= index:
-                results.append({})
+    def saveProfile(self, batch_id):
+        """
+        data/profile_N.json, with the profile of every run of the generation, of each worker and of all of them
+        together
+        """
 
-            results[index] = data_dict
+        workers = {}
+        for summary in self.runProfiles:
+            workers.setdefault(summary.get("worker"), []).append(summary)
 
-        full_data = {"ants": results}
+        total = combineSummaries(self.runProfiles)
+        writeProfile(os.path.join(PATH, "data", f"profile_{batch_id}.json"),
+                     {"generation": batch_id, "total": total,
+                      "workers": {str(worker): combineSummaries(summaries) for worker, summaries in workers.items()},
+                      "runs": self.runProfiles})
 
-        file = open(path, 'w')
-        yaml.dump(full_data, file)
-        file.close()
+        if total["steps_per_second"] is not None:
+            print(f"{total['steps_per_second']:.1f} steps/s per worker, {total['ants_per_tick']:.1f} ants per step")
 
     def loadColonyParameters(self, path=None):
         if path is None:
@@ -255,4 +736,5 @@ class GeneticAlgorithm(object):
         for ant in ants:
             parameter_object = ColonyParameters(**ant)
             self.colonyParameters.append(parameter_object)
+        self.scenarioSeeds = data.get("scenarios", [])
         self.batchSize = len(self.colonyParameters)
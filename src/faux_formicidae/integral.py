@@ -0,0 +1,93 @@
+"""
+Summed-area tables, so "is there any food / wall in this box" doesn't need to look at every cell in the box
+"""
+
+import numpy as np
+
+
+def normalizeBlock(start_i, end_i, start_j, end_j, shape):
+    """
+    Turns block indices into the ones numpy slicing would actually use (clipped, negative starts wrap around)
+
+    :returns: (start_i, end_i, start_j, end_j), or None if the block is empty
+    """
+
+    start_i, end_i, _ = slice(start_i, end_i).indices(shape[0])
+    start_j, end_j, _ = slice(start_j, end_j).indices(shape[1])
+    if end_i <= start_i or end_j <= start_j:
+        return None
+    return start_i, end_i, start_j, end_j
+
+
+class IntegralImage(object):
+    def __init__(self, mask: np.ndarray = None, table: np.ndarray = None):
+        """
+        :param mask: Bool (or 0/1) array to count
+        :param table: Or the table for the mask, already worked out (see WorldTemplate), which gets used as it is
+        """
+
+        if table is None:
+            # table[i, j] is the number of set cells in mask[:i, :j]
+            table = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=np.int32)
+            np.cumsum(np.cumsum(mask, axis=0, dtype=np.int32), axis=1, out=table[1:, 1:])
+
+        self.table = table
+        self.shape = (table.shape[0] - 1, table.shape[1] - 1)
+
+    def count(self, start_i, end_i, start_j, end_j):
+        """
+        Number of set cells in mask[start_i:end_i, start_j:end_j], in O(1)
+        """
+
+        block = normalizeBlock(start_i, end_i, start_j, end_j, self.shape)
+        if block is None:
+            return 0
+
+        s_i, e_i, s_j, e_j = block
+        t = self.table
+        return int(t[e_i, e_j] - t[s_i, e_j] - t[e_i, s_j] + t[s_i, s_j])
+
+    def getBlock(self, start_i, end_i, start_j, end_j):
+        """
+        The mask values of a (normalized) block, recovered from the table
+        """
+
+        t = self.table
+        return (t[start_i + 1:end_i + 1, start_j + 1:end_j + 1] - t[start_i:end_i, start_j + 1:end_j + 1]
+                - t[start_i + 1:end_i + 1, start_j:end_j] + t[start_i:end_i, start_j:end_j])
+
+    def update(self, start_i, end_i, start_j, end_j, block: np.ndarray):
+        """
+        Replace a (normalized) block of the mask.  Only the part of the table below and to the right of the block has
+        to change
+        """
+
+        delta = block.astype(np.int32) - self.getBlock(start_i, end_i, start_j, end_j)
+        if not delta.any():
+            return
+
+        cumulative = np.cumsum(np.cumsum(delta, axis=0), axis=1)
+        t = self.table
+        t[start_i + 1:end_i + 1, start_j + 1:end_j + 1] += cumulative
+        t[end_i + 1:, start_j + 1:end_j + 1] += cumulative[-1, :]
+        t[start_i + 1:end_i + 1, end_j + 1:] += cumulative[:, -1:]
+        t[end_i + 1:, end_j + 1:] += cumulative[-1, -1]
+
+
+class CellIndex(IntegralImage):
+    """
+    IntegralImage of where one cell type is in a world's layer 0, kept up to date as the world changes
+    """
+
+    def __init__(self, world, cell_type, table: np.ndarray = None):
+        """
+        :param table: Summed-area table of the world as it is now, if there already is one (see WorldTemplate)
+        """
+
+        self.world = world
+        self.cellType = cell_type
+        super().__init__(world.cells == cell_type if table is None else None, table)
+        world.addCellListener(self.cellsChanged)
+
+    def cellsChanged(self, start_i, end_i, start_j, end_j, blocked):
+        self.update(start_i, end_i, start_j, end_j, self.world.cells[start_i:end_i, start_j:end_j] == self.cellType)
@@ -0,0 +1,274 @@
+"""
+Obstacle-aware "which way is home" field
+
+Works out the walking distance from the nest to every cell of the world once (fast marching over the free space), then
+the way home from any cell is just a lookup of which neighbour is closest to the nest.  Food coming and going only gets
+patched in around where it changed things, see NavigationField._updateRegion.
+"""
+
+import math
+import heapq
+import numpy as np
+import scipy
+
+from skimage.graph import MCP_Geometric
+
+from faux_formicidae.world import AntWorld, WorldCell
+
+# Cells this close to a wall (the same two erosions the ants use) cost more to walk through, so paths keep some distance
+NEAR_WALL_COST = 4.0
+EROSION_ITERATIONS = 2
+
+# Patching in a change that touches more cells than this is slower than rebuilding the whole field
+MAX_PATCHED_CELLS = 8000
+# Relative slack when checking whether a cell's distance came along a particular edge
+TIGHT_TOLERANCE = 1e-9
+
+NEIGHBOURS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+class _CellValues(dict):
+    """
+    Values of a flat array by index, read from the array the first time they're asked for.  The cell by cell work goes
+    through these, reading numpy scalars one at a time is several times slower, and converting the whole array up front
+    costs more than a small patch does
+    """
+
+    def __init__(self, array):
+        super().__init__()
+        self.array = array
+
+    def __missing__(self, index):
+        value = self[index] = self.array.item(index)
+        return value
+
+
+class NavigationField(object):
+    def __init__(self, world: AntWorld, nest_x, nest_y, arrays=None):
+        """
+        :param nest_x: Nest position in cm
+        :param nest_y: Nest position in cm
+        :param arrays: The field for the world as it is now, if it's already been worked out (see getArrays and
+                       WorldTemplate).  They get used as they are, and written to when the world changes
+        """
+
+        self.world = world
+        self.nestCell = world.worldSpaceToPixelSpace(nest_x, nest_y)
+        self.element = scipy.ndimage.generate_binary_structure(2, 2)
+
+        shape = world.cells.shape
+        if arrays is None:
+            arrays = {"eroded": np.zeros(shape, dtype=bool),
+                      # Padded with inf so every cell has 8 neighbours to look at
+                      "paddedCosts": np.full((shape[0] + 2, shape[1] + 2), np.inf),
+                      "paddedDistances": np.full((shape[0] + 2, shape[1] + 2), np.inf),
+                      "directions": np.full(shape, np.nan)}
+            self.needsRebuild = True
+        else:
+            self.needsRebuild = False
+
+        self.eroded = arrays["eroded"]
+        self.paddedCosts = arrays["paddedCosts"]
+        self.costs = self.paddedCosts[1:-1, 1:-1]
+        self.paddedDistances = arrays["paddedDistances"]
+        self.distances = self.paddedDistances[1:-1, 1:-1]
+        self.directions = arrays["directions"]
+
+        # Blocks of layer 0 that changed since the last update, patched in by _updateRegion
+        self.changedRegions = []
+        world.addCellListener(self.cellsChanged)
+
+    def cellsChanged(self, start_i, end_i, start_j, end_j, blocked):
+        self.changedRegions.append((start_i, end_i, start_j, end_j))
+
+    def getArrays(self):
+        """
+        Everything the field is made of, to build the same field again with (see WorldTemplate)
+        """
+
+        self.update()
+        return {"eroded": self.eroded, "paddedCosts": self.paddedCosts, "paddedDistances": self.paddedDistances,
+                "directions": self.directions}
+
+    def update(self):
+        """
+        Bring the field up to date with layer 0, if it has changed since the last time
+        """
+
+        if self.needsRebuild:
+            self.rebuild()
+        else:
+            for region in self.changedRegions:
+                if not self._updateRegion(*region):
+                    break
+        self.changedRegions = []
+
+    def rebuild(self):
+        free = self.world.cells == WorldCell.EMPTY
+        self.eroded[:, :] = scipy.ndimage.binary_erosion(free, structure=self.element, iterations=EROSION_ITERATIONS)
+        self.costs[:, :] = np.where(self.eroded, 1.0, np.where(free, NEAR_WALL_COST, np.inf))
+
+        distances, _ = MCP_Geometric(self.costs, fully_connected=True).find_costs([self.nestCell])
+        self.distances[:, :] = distances
+        self._updateDirections(0, self.costs.shape[0], 0, self.costs.shape[1])
+        self.needsRebuild = False
+
+    def _updateRegion(self, start_i, end_i, start_j, end_j):
+        """
+        Patch in a block of layer 0 that changed, food spawning or getting eaten.  Only the costs near the block change,
+        but the distances of anywhere downstream of it can, so they get repaired like a dynamic shortest path: first
+        every cell whose way home went through a cell that got dearer is forgotten, then a Dijkstra wavefront goes out
+        from those and from the cells that got cheaper until nothing gets any shorter.  If that touches more than
+        MAX_PATCHED_CELLS, the whole field gets rebuilt instead, which is quicker by then
+
+        :returns: False if the field got rebuilt, so the other changed regions don't need patching in
+        """
+
+        width, height = self.costs.shape
+        margin = EROSION_ITERATIONS
+
+        # Erosion near the block can change, and that depends on cells up to one more margin away
+        o_i, o_j = max(start_i - 2 * margin, 0), max(start_j - 2 * margin, 0)
+        outer = np.s_[o_i:min(end_i + 2 * margin, width), o_j:min(end_j + 2 * margin, height)]
+        free = self.world.cells[outer] == WorldCell.EMPTY
+        eroded = scipy.ndimage.binary_erosion(free, structure=self.element, iterations=EROSION_ITERATIONS)
+
+        s_i, e_i = max(start_i - margin, 0), min(end_i + margin, width)
+        s_j, e_j = max(start_j - margin, 0), min(end_j + margin, height)
+        inner = np.s_[s_i - o_i:e_i - o_i, s_j - o_j:e_j - o_j]
+        costs = np.where(eroded[inner], 1.0, np.where(free[inner], NEAR_WALL_COST, np.inf))
+        self.eroded[s_i:e_i, s_j:e_j] = eroded[inner]
+
+        old_costs = self.costs[s_i:e_i, s_j:e_j].copy()
+        if np.array_equal(costs, old_costs):
+            return True
+        if s_i <= self.nestCell[0] < e_i and s_j <= self.nestCell[1] < e_j:
+            # Everything is measured from the nest, so there's nothing to keep
+            self.costs[s_i:e_i, s_j:e_j] = costs
+            self.rebuild()
+            return False
+
+        # Flat indices into the padded arrays, the padding is inf so nothing ever gets relaxed into it.  Only the cells
+        # the wavefronts get to are read, and only the ones they changed are written back
+        stride = height + 2
+        costs_list = _CellValues(self.paddedCosts.reshape(-1))
+        distances = _CellValues(self.paddedDistances.reshape(-1))
+        offsets = [(d_i * stride + d_j, math.hypot(d_i, d_j)) for d_i, d_j in NEIGHBOURS]
+        lengths = dict(offsets)
+
+        def flatIndices(mask):
+            c_i, c_j = np.nonzero(mask)
+            return ((c_i + s_i + 1) * stride + c_j + s_j + 1).tolist()
+
+        def tight(p, q, d_q):
+            # Whether q's distance came along the edge from p (with the old costs)
+            return abs(distances[p] + lengths[q - p] * (costs_list[p] + costs_list[q]) / 2 - d_q) <= TIGHT_TOLERANCE * d_q
+
+        # Cells whose way home went through a dearer cell lose their distance.  Going out in order of distance, a cell
+        # only gets forgotten if every neighbour its distance could have come from has been, most cells just beyond a
+        # new obstacle have another way round that's just as short
+        dearer = set(flatIndices(costs > old_costs))
+        forgotten = set()
+        queued = set(dearer)
+        heap = [(distances[p], p) for p in dearer]
+        heapq.heapify(heap)
+        while len(heap) > 0:
+            d_q, q = heapq.heappop(heap)
+            if d_q != math.inf and q not in dearer and \
+                    any(p not in forgotten and distances[p] < d_q and tight(p, q, d_q) for p in (q - o for o in lengths)):
+                continue
+
+            forgotten.add(q)
+            if len(forgotten) > MAX_PATCHED_CELLS:
+                self.costs[s_i:e_i, s_j:e_j] = costs
+                self.rebuild()
+                return False
+            if d_q == math.inf:
+                continue
+            for offset in lengths:
+                p = q + offset
+                if p not in queued and distances[p] != math.inf and tight(q, p, distances[p]):
+                    queued.add(p)
+                    heapq.heappush(heap, (distances[p], p))
+
+        self.costs[s_i:e_i, s_j:e_j] = costs
+        for p, cost in zip(flatIndices(np.ones(costs.shape, dtype=bool)), costs.ravel().tolist()):
+            costs_list[p] = cost
+        forgotten = list(forgotten)
+        for p in forgotten:
+            distances[p] = math.inf
+
+        # Everything forgotten or cheaper gets the best it can from its neighbours, then passes it on
+        heap = []
+        touched = set(forgotten)
+        for p in forgotten + flatIndices(costs < old_costs):
+            c_p = costs_list[p]
+            best = distances[p]
+            for offset, length in offsets:
+                candidate = distances[p + offset] + length * (c_p + costs_list[p + offset]) / 2
+                if candidate < best:
+                    best = candidate
+            if best < distances[p]:
+                distances[p] = best
+                touched.add(p)
+            if best != math.inf:
+                heap.append((best, p))
+        heapq.heapify(heap)
+
+        while len(heap) > 0:
+            d_p, p = heapq.heappop(heap)
+            if d_p > distances[p]:
+                continue
+            c_p = costs_list[p]
+            for offset, length in offsets:
+                q = p + offset
+                candidate = d_p + length * (c_p + costs_list[q]) / 2
+                if candidate < distances[q]:
+                    distances[q] = candidate
+                    heapq.heappush(heap, (candidate, q))
+                    touched.add(q)
+            if len(touched) > MAX_PATCHED_CELLS:
+                self.rebuild()
+                return False
+
+        touched = list(touched)
+        self.paddedDistances.reshape(-1)[touched] = [distances[p] for p in touched]
+
+        # Directions can change wherever a distance or a cost did, and next to it
+        touched_i, touched_j = np.divmod(np.array(touched, dtype=np.int64), stride)
+        box_i = [s_i, e_i - 1] + (touched_i - 1).tolist()
+        box_j = [s_j, e_j - 1] + (touched_j - 1).tolist()
+        self._updateDirections(max(min(box_i) - 1, 0), min(max(box_i) + 2, width),
+                               max(min(box_j) - 1, 0), min(max(box_j) + 2, height))
+        return True
+
+    def _updateDirections(self, start_i, end_i, start_j, end_j):
+        """
+        For each cell in the block, the heading (radians) to its neighbour closest to the nest, nan if there isn't a
+        closer one
+        """
+
+        best = self.paddedDistances[start_i + 1:end_i + 1, start_j + 1:end_j + 1].copy()
+        directions = np.full(best.shape, np.nan)
+        for d_i, d_j in NEIGHBOURS:
+            neighbour = self.paddedDistances[start_i + 1 + d_i:end_i + 1 + d_i, start_j + 1 + d_j:end_j + 1 + d_j]
+            closer = neighbour < best
+            best[closer] = neighbour[closer]
+            directions[closer] = math.atan2(d_j, d_i)
+
+        self.directions[start_i:end_i, start_j:end_j] = directions
+
+    def getDirection(self, x, y):
+        """
+        Heading (radians) towards the nest from the position (x, y) in cm, None if there is no way home from there or
+        we're already there
+        """
+
+        self.update()
+
+        i, j = self.world.worldSpaceToPixelSpace(x, y)
+        if not self.world.isWithinBounds(i, j):
+            return None
+
+        direction = self.directions[i, j]
+        return None if math.isnan(direction) else float(direction)
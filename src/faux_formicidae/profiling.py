@@ -0,0 +1,159 @@
+"""
+Where the time in a simulation step goes
+
+The hot paths wrap their phases in profiler.section(name) and bump counters with profiler.count(name).  Everything gets
+NULL_PROFILER unless a Profiler is handed in, and its sections don't do anything, so leaving profiling off costs a couple
+of no-op calls per phase.
+
+Sections can be nested, the time of a section includes the sections run inside it (e.g. ants.deposit runs inside
+ants.move for a vectorized population).  The sections used are:
+
+    step                    one whole Simulation.runOnce
+    world.evaporate         pheromone evaporation
+    world.food              food spawning
+    colony.spawn            the colony making new ants
+    ants.sense.pheromone    following a pheromone trail (getDirectionAlongPheromone)
+    ants.sense.nest         finding the way home (getDirectionToNest)
+    ants.move               moving the ants
+    ants.deposit            drawing the pheromone trails into the world
+"""
+
+import json
+import time
+
+# Counters every simulation keeps, the per-second and per-tick numbers in a summary come from these
+TICKS = "ticks"
+ANT_TICKS = "ant_ticks"
+
+
+class _Section(object):
+    __slots__ = ["profiler", "name", "start"]
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.times[self.name] += time.perf_counter() - self.start
+        self.profiler.calls[self.name] += 1
+        return False
+
+
+class _NullSection(object):
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class Profiler(object):
+    enabled = True
+
+    def __init__(self):
+        self.times = {}
+        self.calls = {}
+        self.counters = {}
+        # One reusable section per name, sections with the same name mustn't be nested in each other
+        self.sections = {}
+
+    def section(self, name):
+        """
+        Context manager that adds the time spent in it to name
+        """
+
+        section = self.sections.get(name)
+        if section is None:
+            section = self.sections[name] = _Section(self, name)
+            self.times[name] = 0.0
+            self.calls[name] = 0
+        return section
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset(self):
+        for name in self.times:
+            self.times[name] = 0.0
+            self.calls[name] = 0
+        self.counters = {}
+
+    def summary(self, **labels):
+        """
+        Everything measured so far, as something json.dump can write
+
+        :param labels: Extra entries for the summary, e.g. index and seed of the run
+        """
+
+        summary = {"sections": {name: {"time": self.times[name], "calls": self.calls[name]} for name in self.times},
+                   "counters": dict(self.counters)}
+        summary.update(labels)
+        return _addRates(summary)
+
+
+class NullProfiler(object):
+    """
+    Stand-in for Profiler that doesn't measure anything
+    """
+
+    enabled = False
+
+    def section(self, name):
+        return _NULL_SECTION
+
+    def count(self, name, amount=1):
+        pass
+
+    def reset(self):
+        pass
+
+    def summary(self, **labels):
+        return {}
+
+    def __reduce__(self):
+        # Copies (and unpickled worlds) get the same shared instance
+        return "NULL_PROFILER"
+
+
+_NULL_SECTION = _NullSection()
+NULL_PROFILER = NullProfiler()
+
+
+def _addRates(summary):
+    counters = summary["counters"]
+    step = summary["sections"].get("step", {}).get("time", 0.0)
+    ticks = counters.get(TICKS, 0)
+
+    summary["steps_per_second"] = ticks / step if step > 0 else None
+    summary["ants_per_tick"] = counters.get(ANT_TICKS, 0) / ticks if ticks > 0 else None
+    return summary
+
+
+def combineSummaries(summaries, **labels):
+    """
+    One summary with the times, calls and counters of several added up
+    """
+
+    combined = {"sections": {}, "counters": {}}
+    for summary in summaries:
+        for name, section in summary.get("sections", {}).items():
+            total = combined["sections"].setdefault(name, {"time": 0.0, "calls": 0})
+            total["time"] += section["time"]
+            total["calls"] += section["calls"]
+        for name, value in summary.get("counters", {}).items():
+            combined["counters"][name] = combined["counters"].get(name, 0) + value
+
+    combined.update(labels)
+    return _addRates(combined)
+
+
+def writeProfile(path, data):
+    with open(path, "w") as file:
+        json.dump(data, file, indent=1)
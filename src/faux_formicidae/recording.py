@@ -0,0 +1,317 @@
+"""
+Recording a simulation to a file as it runs, so it can be watched afterwards without running it again
+
+Every step the recorder keeps the ants' positions (to a quarter of a cell) and modes, and every so often the cell types
+and pheromones (quantized to 0-255).  They get written in zlib compressed chunks:
+
+    header:  MAGIC, uint32 length, JSON (world size, resolution, time step, ...)
+    chunks:  CHUNK_HEADER (tag, kind, first step, last step, raw size, stored size), compressed payload
+    index:   an INDEX chunk with the offset of every other chunk, then FOOTER (offset of the index, FOOTER_MAGIC)
+
+The index only gets written on close, if the run dies before that the chunks are still there and Recording finds them
+by scanning the file.
+"""
+
+import os
+import json
+import zlib
+import struct
+import hashlib
+import numpy as np
+
+from faux_formicidae.ant_colony import ColonyParameters
+from faux_formicidae.world import Pheromones
+from faux_formicidae.snapshots import Snapshot
+
+MAGIC = b"FFREC\x00\x00\x01"
+FOOTER_MAGIC = b"FFRECIDX"
+
+CHUNK_TAG = b"CHNK"
+CHUNK_HEADER = struct.Struct("<4sBIIII")
+FOOTER = struct.Struct("<Q8s")
+
+# Chunk kinds
+ANTS = 0
+LAYERS = 1
+INDEX = 2
+
+# Every ants frame starts with the step, the clock and the number of ants
+FRAME_HEADER = struct.Struct("<Idi")
+
+# Steps per ants chunk, and steps between layer keyframes
+CHUNK_STEPS = 250
+LAYER_INTERVAL = 40
+
+# Positions are stored as uint16 in units of a quarter of a cell
+POSITION_STEPS_PER_CELL = 4
+
+COMPRESSION_LEVEL = 1
+
+
+def recordingPath(directory, params: ColonyParameters, seed):
+    """
+    Where the recording of a colony on a seed goes.  Runs are deterministic given both, so the same colony on the same
+    seed always gets the same file, in whichever generation or worker it was run
+    """
+
+    params_hash = hashlib.sha256(json.dumps([float(value) for value in params.getAsList()]).encode()).hexdigest()
+    return os.path.join(directory, f"colony_{params_hash[:12]}_seed_{seed}.rec")
+
+
+class TrajectoryRecorder(object):
+    def __init__(self, path, sim, delta_t, layer_interval=LAYER_INTERVAL, chunk_steps=CHUNK_STEPS, metadata=None):
+        """
+        Starts recording straight away, with the state sim is in now as step 0
+
+        :param path: File to write, gets replaced if it's there
+        :param sim: Simulation to record, the recorder adds itself as a step listener
+        :param delta_t: Time step sim is run with, for playing it back at the right speed
+        :param layer_interval: Steps between recordings of the cells and pheromones
+        :param chunk_steps: Steps of ants per chunk
+        :param metadata: Anything else worth knowing about the run, needs to be JSON-able
+        """
+
+        world = sim.getWorld()
+        self.path = path
+        self.layerInterval = layer_interval
+        self.chunkSteps = chunk_steps
+        self.positionScale = world.resolution * POSITION_STEPS_PER_CELL
+        self.maxPosition = np.iinfo(np.uint16).max
+
+        self.steps = 0
+        self.frames = []
+        self.framesStart = 0
+        self.index = []
+
+        header = {"width_cells": world.widthCells, "height_cells": world.heightCells, "resolution": world.resolution,
+                  "delta_t": delta_t, "position_scale": self.positionScale, "layer_interval": layer_interval,
+                  "pheromones": [int(pheromone) for pheromone in Pheromones],
+                  "nest": sim.antColony.position() if sim.antColony is not None else None,
+                  "metadata": metadata or {}}
+        header = json.dumps(header).encode()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, "wb")
+        self.file.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+        self.record(sim)
+        sim.addStepListener(self.record)
+
+    def record(self, sim):
+        """
+        Step listener, records the state sim is in now
+        """
+
+        if self.file is None:
+            return
+
+        x, y = sim.getAntPositions()
+        positions = np.clip(np.rint(np.stack([x, y]) * self.positionScale), 0, self.maxPosition).astype(np.uint16)
+        modes = np.asarray(sim.getAntModes(), dtype=np.int8)
+        self.frames.append(FRAME_HEADER.pack(self.steps, sim.clock, len(x)) + positions.tobytes() + modes.tobytes())
+
+        if self.steps % self.layerInterval == 0:
+            self._writeLayers(sim)
+
+        self.steps += 1
+        if len(self.frames) >= self.chunkSteps:
+            self._writeFrames()
+
+    def _writeLayers(self, sim):
+        world = sim.getWorld()
+        layers = [np.asarray(world.getLayer(0), dtype=np.uint8)]
+        for pheromone in Pheromones:
+            alpha = np.empty(layers[0].shape, dtype=np.uint8)
+            np.multiply(world.getLayer(pheromone), 255, out=alpha, casting="unsafe")
+            layers.append(alpha)
+
+        payload = FRAME_HEADER.pack(self.steps, sim.clock, 0) + b"".join(layer.tobytes() for layer in layers)
+        self._writeChunk(LAYERS, self.steps, self.steps, payload)
+
+    def _writeFrames(self):
+        if len(self.frames) == 0:
+            return
+
+        self._writeChunk(ANTS, self.framesStart, self.steps - 1, b"".join(self.frames))
+        self.frames = []
+        self.framesStart = self.steps
+
+    def _writeChunk(self, kind, first_step, last_step, payload):
+        stored = zlib.compress(payload, COMPRESSION_LEVEL)
+        offset = self.file.tell()
+        self.file.write(CHUNK_HEADER.pack(CHUNK_TAG, kind, first_step, last_step, len(payload), len(stored)) + stored)
+        self.index.append([kind, first_step, last_step, offset])
+        return offset
+
+    def close(self):
+        """
+        Write what's left and the index, safe to call more than once
+        """
+
+        if self.file is None:
+            return
+
+        self._writeFrames()
+        index = json.dumps(self.index).encode()
+        offset = self._writeChunk(INDEX, 0, 0, index)
+        self.file.write(FOOTER.pack(offset, FOOTER_MAGIC))
+        self.file.close()
+        self.file = None
+
+
+class Recording(object):
+    def __init__(self, path):
+        """
+        :param path: File written by a TrajectoryRecorder, it doesn't need to have been closed properly
+        """
+
+        self.path = path
+        self.file = open(path, "rb")
+
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} isn't a recording")
+        header_length, = struct.unpack("<I", self.file.read(4))
+        self.header = json.loads(self.file.read(header_length))
+        self.dataStart = self.file.tell()
+
+        self.width = self.header["width_cells"]
+        self.height = self.header["height_cells"]
+        self.resolution = self.header["resolution"]
+        self.deltaT = self.header["delta_t"]
+        self.nest = self.header["nest"]
+        self.metadata = self.header["metadata"]
+        self.pheromones = [Pheromones(pheromone) for pheromone in self.header["pheromones"]]
+
+        index = self._readIndex()
+        if index is None:
+            index = self._scanChunks()
+        self.antChunks = sorted(entry for entry in index if entry[0] == ANTS)
+        self.layerChunks = sorted(entry for entry in index if entry[0] == LAYERS)
+        self.layerSteps = [entry[1] for entry in self.layerChunks]
+        self.numSteps = self.antChunks[-1][2] + 1 if len(self.antChunks) > 0 else 0
+
+        # Last chunks decoded, playback mostly wants the same ones again
+        self.cachedAnts = (None, None)
+        self.cachedLayers = (None, None)
+
+    def __len__(self):
+        return self.numSteps
+
+    def duration(self):
+        return self.numSteps * self.deltaT
+
+    def close(self):
+        self.file.close()
+
+    def _readIndex(self):
+        self.file.seek(0, os.SEEK_END)
+        if self.file.tell() < self.dataStart + FOOTER.size:
+            return None
+
+        self.file.seek(-FOOTER.size, os.SEEK_END)
+        offset, magic = FOOTER.unpack(self.file.read(FOOTER.size))
+        if magic != FOOTER_MAGIC:
+            return None
+        return json.loads(self._readChunk(offset))
+
+    def _scanChunks(self):
+        """
+        Index of every complete chunk, for recordings that never got closed
+        """
+
+        index = []
+        offset = self.dataStart
+        self.file.seek(0, os.SEEK_END)
+        end = self.file.tell()
+
+        while offset + CHUNK_HEADER.size <= end:
+            self.file.seek(offset)
+            tag, kind, first_step, last_step, raw_size, stored_size = CHUNK_HEADER.unpack(
+                self.file.read(CHUNK_HEADER.size))
+            if tag != CHUNK_TAG or offset + CHUNK_HEADER.size + stored_size > end:
+                break
+            if kind != INDEX:
+                index.append([kind, first_step, last_step, offset])
+            offset += CHUNK_HEADER.size + stored_size
+
+        return index
+
+    def _readChunk(self, offset):
+        self.file.seek(offset)
+        tag, kind, first_step, last_step, raw_size, stored_size = CHUNK_HEADER.unpack(self.file.read(CHUNK_HEADER.size))
+        if tag != CHUNK_TAG:
+            raise ValueError(f"{self.path} has no chunk at {offset}")
+        return zlib.decompress(self.file.read(stored_size))
+
+    def _antFrames(self, chunk):
+        """
+        {step: (clock, x, y, modes)} for every step in an ants chunk
+        """
+
+        if self.cachedAnts[0] == chunk[3]:
+            return self.cachedAnts[1]
+
+        payload = self._readChunk(chunk[3])
+        frames = {}
+        position = 0
+        while position < len(payload):
+            step, clock, count = FRAME_HEADER.unpack_from(payload, position)
+            position += FRAME_HEADER.size
+            positions = np.frombuffer(payload, dtype=np.uint16, count=2 * count, offset=position).reshape(2, count)
+            position += positions.nbytes
+            modes = np.frombuffer(payload, dtype=np.int8, count=count, offset=position)
+            position += modes.nbytes
+            x, y = positions / self.header["position_scale"]
+            frames[step] = (clock, x, y, modes)
+
+        self.cachedAnts = (chunk[3], frames)
+        return frames
+
+    def _layers(self, chunk):
+        """
+        (cells, {pheromone: alpha}) from a layers chunk
+        """
+
+        if self.cachedLayers[0] == chunk[3]:
+            return self.cachedLayers[1]
+
+        payload = self._readChunk(chunk[3])
+        size = self.width * self.height
+        layers = [np.frombuffer(payload, dtype=np.uint8, count=size, offset=FRAME_HEADER.size + k * size)
+                  .reshape(self.width, self.height) for k in range(len(self.pheromones) + 1)]
+        layers = (layers[0], dict(zip(self.pheromones, layers[1:])))
+
+        self.cachedLayers = (chunk[3], layers)
+        return layers
+
+    def stepAt(self, clock):
+        """
+        The step closest to a time (in seconds), clamped to the recording
+        """
+
+        return int(min(max(round(clock / self.deltaT), 0), max(self.numSteps - 1, 0)))
+
+    def snapshot(self, step) -> Snapshot:
+        """
+        The recording at a step, as a Snapshot for Renderer.renderSnapshot.  The layers are the last ones recorded at or
+        before the step
+        """
+
+        step = int(min(max(step, 0), self.numSteps - 1))
+        ant_chunk = self.antChunks[np.searchsorted([entry[1] for entry in self.antChunks], step, side="right") - 1]
+        clock, x, y, modes = self._antFrames(ant_chunk)[step]
+
+        layer_chunk = np.searchsorted(self.layerSteps, step, side="right") - 1
+        cells, pheromones = self._layers(self.layerChunks[layer_chunk])
+
+        snapshot = Snapshot((self.width, self.height))
+        snapshot.sequence = step + 1
+        snapshot.clock = clock
+        snapshot.steps = step
+        snapshot.cells = cells
+        snapshot.cellsVersion = layer_chunk
+        snapshot.pheromones = pheromones
+        snapshot.antX = x
+        snapshot.antY = y
+        snapshot.antModes = modes
+        return snapshot
@@ -1,22 +1,53 @@
 import numpy as np
-import cv2
 import pygame
 
 from faux_formicidae.simulation import Simulation
-from faux_formicidae.world import WorldCell, Pheromones
+from faux_formicidae.world import WorldCell, Pheromones, RESOLUTION
+
+# Colour of each cell type on the cell surface, white is the colour key so empty cells stay see-through
+CELL_COLORS = {WorldCell.EMPTY: (255, 255, 255), WorldCell.WALL: (0, 0, 0), WorldCell.FOOD: (127, 127, 127)}
+
+PHEROMONE_COLORS = {Pheromones.HOME: (0, 0, 255), Pheromones.FOOD: (0, 100, 0)}
+
+ANT_RADIUS = 2
+
+
+def _discOffsets(radius):
+    """
+    Pixel offsets covered by a filled circle, for stamping every ant at once
+    """
+
+    d_i, d_j = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    inside = d_i ** 2 + d_j ** 2 <= radius ** 2
+    return d_i[inside], d_j[inside]
 
 
 class Renderer(object):
-    def __init__(self, sim: Simulation):
+    def __init__(self, sim: Simulation = None, size=None, resolution=RESOLUTION, nest=None):
+        """
+        :param sim: Simulation to draw, can be left out when only drawing snapshots (e.g. of a Recording)
+        :param size: (width, height) in cells, only used without a sim
+        :param resolution: Cells per centimeter, only used without a sim
+        :param nest: Nest position in cm, defaults to the sim's colony
+        """
+
         self.sim = sim
 
-        if sim.antColony is not None:
+        if nest is not None:
+            self.nestLoc = nest
+        elif sim is not None and sim.antColony is not None:
             self.nestLoc = sim.antColony.position()
         else:
             self.nestLoc = [0, 0]
 
-        self.width = self.sim.getWorld().widthCells
-        self.height = self.sim.getWorld().heightCells
+        if sim is not None:
+            world = self.sim.getWorld()
+            self.width = world.widthCells
+            self.height = world.heightCells
+            self.resolution = world.resolution
+        else:
+            self.width, self.height = size
+            self.resolution = resolution
 
         # pygame setup
         pygame.init()
@@ -27,23 +58,53 @@ class Renderer(object):
         # fill the screen with a color to wipe away anything from last frame
         self.screen.fill(pygame.Color('white'))
 
-    def render(self):
+        # Surfaces that live as long as the renderer and get written in place through surfarray, which indexes them
+        # [x][y] just like the world layers, so nothing has to be transposed or copied into a new image every frame
+        self.cellSurface = pygame.Surface((self.width, self.height), depth=24)
+        self.cellSurface.set_colorkey(CELL_COLORS[WorldCell.EMPTY])
+        self.cellColors = np.zeros((256, 3), dtype=np.uint8)
+        for cell_type, color in CELL_COLORS.items():
+            self.cellColors[int(cell_type)] = color
+
+        self.pheromoneSurfaces = {}
+
+        self.antColor = np.array(pygame.Color('brown')[:3], dtype=np.uint8)
+        self.antOffsets = _discOffsets(ANT_RADIUS)
+
+        # Blocks of layer 0 that changed since they were last drawn, the whole layer to start with.  The listener only
+        # goes on once render gets used, snapshots say when the cells changed themselves
+        self.dirtyCells = [(0, self.width, 0, self.height)]
+        self.listeningForCells = False
+        self.cellsVersion = None
+
+        # pygame key: function to call when it gets pressed
+        self.keyHandlers = {}
+
+    def _cellsChanged(self, start_i, end_i, start_j, end_j, blocked):
+        self.dirtyCells.append((start_i, end_i, start_j, end_j))
+
+    def pollEvents(self):
         # poll for events
         # pygame.QUIT event means the user clicked X to close your window
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self.isRunning = False
+            elif event.type == pygame.KEYDOWN and event.key in self.keyHandlers:
+                self.keyHandlers[event.key]()
+
+    def onKey(self, key, callback):
+        self.keyHandlers[key] = callback
+
+    def render(self):
+        self.pollEvents()
 
         # fill the screen with a color to wipe away anything from last frame
         self.screen.fill(pygame.Color('white'))
 
-        import time
-
-        a = time.time()
         self.renderWorld()
 
-        self.renderPheromoneFast(Pheromones.HOME, (0, 0, 255))
-        self.renderPheromoneFast(Pheromones.FOOD, (0, 100, 0))
+        self.renderPheromoneFast(Pheromones.HOME, PHEROMONE_COLORS[Pheromones.HOME])
+        self.renderPheromoneFast(Pheromones.FOOD, PHEROMONE_COLORS[Pheromones.FOOD])
 
         self.renderAnts()
 
@@ -52,6 +113,55 @@ class Renderer(object):
         # flip() the display to put your work on screen
         pygame.display.flip()
 
+    def renderSnapshot(self, snapshot):
+        """
+        Same as render, but of a Snapshot instead of the live simulation
+        """
+
+        self.pollEvents()
+
+        self.screen.fill(pygame.Color('white'))
+
+        if snapshot.cellsVersion != self.cellsVersion:
+            self._drawCells(snapshot.cells, [(0, self.width, 0, self.height)])
+            self.cellsVersion = snapshot.cellsVersion
+        self.screen.blit(self.cellSurface, (0, 0))
+
+        for pheromone, color in PHEROMONE_COLORS.items():
+            surface = self._pheromoneSurface(pheromone, color)
+            alpha = pygame.surfarray.pixels_alpha(surface)
+            alpha[:] = snapshot.pheromones[pheromone]
+            del alpha
+            self.screen.blit(surface, (0, 0))
+
+        self._drawAnts(snapshot.antX, snapshot.antY)
+
+        self.renderNest()
+
+        pygame.display.flip()
+
+    def watch(self, runner, fps=30, until_finished=True):
+        """
+        Show a SimulationRunner's latest snapshot at up to fps frames per second, while it runs in its own thread.
+        Frames where nothing new was published are skipped
+
+        :param until_finished: Also stop once the runner is done, otherwise keep showing the last frame until the
+                               window gets closed
+        """
+
+        clock = pygame.time.Clock()
+        shown = None
+        runner.start()
+
+        while self.running() and not (until_finished and runner.finished.is_set()):
+            with runner.snapshots.latest() as snapshot:
+                if snapshot.sequence != shown:
+                    self.renderSnapshot(snapshot)
+                    shown = snapshot.sequence
+                else:
+                    self.pollEvents()
+            clock.tick(fps)
+
     def running(self):
         return self.isRunning
 
@@ -59,30 +169,66 @@ class Renderer(object):
         pygame.quit()
 
     def renderWorld(self):
-        obstacles = self.sim.getWorld().getLayer(0).astype(np.uint8).T
-        obstacles = (WorldCell.WALL - obstacles) * 255
-
-        obstacles_img = cv2.cvtColor(obstacles, cv2.COLOR_GRAY2BGR)
-
-        pygame_img = pygame.image.frombuffer(obstacles_img.tostring(), obstacles_img.shape[1::-1], "BGR")
-        pygame_img.set_colorkey((255, 255, 255))
-        self.screen.blit(pygame_img, (0, 0))
+        """
+        Walls and food, only the blocks that changed since the last frame get redrawn
+        """
+
+        if not self.listeningForCells:
+            self.sim.getWorld().addCellListener(self._cellsChanged)
+            self.listeningForCells = True
+
+        if len(self.dirtyCells) > 0:
+            self._drawCells(self.sim.getWorld().getLayer(0), self.dirtyCells)
+            self.dirtyCells = []
+
+        self.screen.blit(self.cellSurface, (0, 0))
+
+    def _drawCells(self, cells, blocks):
+        pixels = pygame.surfarray.pixels3d(self.cellSurface)
+        for start_i, end_i, start_j, end_j in blocks:
+            pixels[start_i:end_i, start_j:end_j] = self.cellColors[cells[start_i:end_i, start_j:end_j].astype(np.uint8)]
+        # The view keeps the surface locked, it has to go before blitting
+        del pixels
+
+    def _pheromoneSurface(self, layer, color):
+        surface = self.pheromoneSurfaces.get(layer)
+        if surface is None:
+            surface = pygame.Surface((self.width, self.height), pygame.SRCALPHA, 32)
+            surface.fill(tuple(color) + (0,))
+            self.pheromoneSurfaces[layer] = surface
+        return surface
 
     def renderPheromoneFast(self, layer, color):
-        pheromones = self.sim.getWorld().getLayer(layer).astype(np.float64).T
+        """
+        One pheromone layer as the alpha of a surface that is already filled with its colour
+        """
 
-        pheromones_img = np.zeros((pheromones.shape[0], pheromones.shape[1], 4), dtype=np.uint8)
-        pheromones_img[:, :, 0:3] = color
-        pheromones_img[:, :, 3] = (pheromones * 255).astype(np.uint8)
+        surface = self._pheromoneSurface(layer, color)
+        alpha = pygame.surfarray.pixels_alpha(surface)
+        np.multiply(self.sim.getWorld().getLayer(layer), 255, out=alpha, casting="unsafe")
+        del alpha
 
-        pygame_img = pygame.image.frombuffer(pheromones_img.tostring(), pheromones_img.shape[1::-1], "RGBA")
-        pygame_img.set_colorkey((255, 255, 255))
-        # return pygame_img
-        self.screen.blit(pygame_img, (0, 0))
+        self.screen.blit(surface, (0, 0))
 
     def renderAnts(self):
-        for ant in self.sim.getAnts():
-            pygame.draw.circle(self.screen, pygame.Color('brown'), ant.getPositionPixelSpace(), 2)
+        """
+        Every ant in one write to the screen pixels, instead of a draw call each
+        """
+
+        self._drawAnts(*self.sim.getAntPositions())
+
+    def _drawAnts(self, x, y):
+        if len(x) == 0:
+            return
+
+        i = (x * self.resolution).astype(np.int64)[:, None] + self.antOffsets[0]
+        j = (y * self.resolution).astype(np.int64)[:, None] + self.antOffsets[1]
+        on_screen = (0 <= i) & (i < self.width) & (0 <= j) & (j < self.height)
+
+        pixels = pygame.surfarray.pixels3d(self.screen)
+        pixels[i[on_screen], j[on_screen]] = self.antColor
+        del pixels
 
     def renderNest(self):
-        pygame.draw.circle(self.screen, pygame.Color('orange'), (self.nestLoc[0] * 40, self.nestLoc[1] * 40), 2)
+        pygame.draw.circle(self.screen, pygame.Color('orange'),
+                           (self.nestLoc[0] * self.resolution, self.nestLoc[1] * self.resolution), 2)
@@ -0,0 +1,183 @@
+"""
+Line-delimited log of every run, written as the runs finish
+
+Records go onto a queue and a writer thread appends them to the file, syncing to disk every so often, so the genetic
+algorithm never waits on the disk and a crash only loses the last few runs.  The per-generation results (results_N.yaml
+and the ResultsStore) are worked out from the records by deriveGenerations.  The genetic algorithm keeps each
+generation's records as it logs them and saves the generation from those, the log only gets read back (see
+rebuildGenerations) for generations that never got saved.
+
+Every record has the id of the GeneticAlgorithm run that logged it (which a run resumed from a checkpoint keeps), so
+when a generation got run again from scratch, say by starting over with the same --first, the new run's records replace
+the old ones instead of getting mixed in with them.
+"""
+
+import os
+import json
+import time
+import queue
+import threading
+
+from typing import Dict, List
+
+from faux_formicidae.ant_colony import ColonyParameters
+from faux_formicidae.evaluation import SimulationResult, combineResults
+from faux_formicidae.results_store import ResultsStore, writeResultsYaml
+
+# Sync after this many records, or this many seconds, whichever comes first
+FSYNC_RECORDS = 32
+FSYNC_INTERVAL = 2.0
+
+# Markers for the writer thread
+_SYNC = object()
+_CLOSE = object()
+
+
+class ResultLog(object):
+    def __init__(self, path, run_id=None, fsync_records=FSYNC_RECORDS, fsync_interval=FSYNC_INTERVAL):
+        """
+        :param path: JSONL file to append to, gets created if it isn't there yet
+        :param run_id: Goes into every record, see deriveGenerations
+        """
+
+        self.path = path
+        self.runId = run_id
+        self.fsyncRecords = fsync_records
+        self.fsyncInterval = fsync_interval
+
+        self.records = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self._write, name="ResultLog", daemon=True)
+        self.thread.start()
+
+    def logRun(self, generation, result: SimulationResult, cached=False, dropped=False):
+        """
+        Queue one run for writing, returns straight away
+
+        :param cached: The result came from the FitnessCache instead of being run
+        :param dropped: The colony got knocked out of a race, so this is only part of a run
+        :returns: The record, as it goes into the log
+        """
+
+        record = {"run": self.runId, "generation": generation, "index": result.index, "seed": result.seed,
+                  "population": result.population, "steps": result.steps,
+                  "params": {key: float(value) for key, value in vars(result.params).items()},
+                  "cached": cached, "dropped": dropped, "time": time.time()}
+        self.records.put(record)
+        return record
+
+    def flush(self):
+        """
+        Wait until everything queued so far is on disk
+        """
+
+        self.records.put(_SYNC)
+        self.records.join()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        self.records.put(_CLOSE)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _write(self):
+        unsynced = 0
+        last_sync = time.monotonic()
+
+        with open(self.path, "a") as file:
+            while True:
+                # Don't sit on unsynced records for longer than the interval while waiting for more
+                try:
+                    record = self.records.get(timeout=self.fsyncInterval if unsynced > 0 else None)
+                except queue.Empty:
+                    record = None
+
+                try:
+                    if isinstance(record, dict):
+                        file.write(json.dumps(record) + "\n")
+                        unsynced += 1
+
+                    due = unsynced >= self.fsyncRecords or time.monotonic() - last_sync >= self.fsyncInterval
+                    if unsynced > 0 and (due or not isinstance(record, dict)):
+                        file.flush()
+                        os.fsync(file.fileno())
+                        unsynced = 0
+                        last_sync = time.monotonic()
+                except Exception as error:
+                    self.error = error
+
+                if record is not None:
+                    self.records.task_done()
+                if record is _CLOSE:
+                    break
+
+
+def readResultLog(path) -> List[dict]:
+    """
+    Every record in the log, skipping a torn last line if the writer got killed part way through it
+    """
+
+    records = []
+    with open(path) as file:
+        for line in file:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def deriveGenerations(records) -> Dict[int, List[SimulationResult]]:
+    """
+    Each generation's results, one per colony combined over its scenarios (like GeneticAlgorithm.runBatch does).  A
+    generation comes from the records of the last run that logged it, earlier runs of it are ignored.  Colonies that got
+    knocked out of a race only got part of a run, so they're left out (like a colony that never reported anything)
+
+    :returns: {generation: [SimulationResult, ...] best first, the order GeneticAlgorithm.simResults has them in}
+    """
+
+    records = list(records)
+    # Logs from before records had a run id are one run as far as this is concerned
+    latest_runs = {record["generation"]: record.get("run") for record in records}
+
+    # A run can show up twice if it was redone after a restart, it's deterministic so either copy will do
+    runs = {}
+    for record in records:
+        if record.get("run") == latest_runs[record["generation"]]:
+            runs[(record["generation"], record["index"], record["seed"])] = record
+
+    colonies = {}
+    dropped = set()
+    for (generation, index, seed), record in runs.items():
+        if record.get("dropped"):
+            dropped.add((generation, index))
+        result = SimulationResult(record["population"], index, ColonyParameters(**record["params"]), record["steps"],
+                                  seed)
+        colonies.setdefault(generation, {}).setdefault(index, []).append(result)
+
+    return {generation: sorted([combineResults(results) for index, results in colonies[generation].items()
+                                if (generation, index) not in dropped], reverse=True)
+            for generation in sorted(colonies)}
+
+
+def rebuildGenerations(log_path, store: ResultsStore, data_dir=None, missing_only=False):
+    """
+    Write the per-generation results from the log into the store (and results_N.yaml files, if given a data_dir)
+
+    :param missing_only: Leave the generations that are already in the store alone
+    :returns: The generations that were rebuilt
+    """
+
+    derived = deriveGenerations(readResultLog(log_path))
+    if missing_only:
+        stored = set(store.getGenerations())
+        derived = {generation: results for generation, results in derived.items() if generation not in stored}
+
+    for generation, results in derived.items():
+        store.appendGeneration(generation, results)
+        if data_dir is not None:
+            writeResultsYaml(os.path.join(data_dir, f"results_{generation}.yaml"), results)
+
+    return list(derived)
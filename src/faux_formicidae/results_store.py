@@ -0,0 +1,143 @@
+"""
+Every generation's results in one table, for plotting
+
+One row per colony per generation (population, run length and the ColonyParameters fields), so loading the whole
+history is a single query instead of parsing a YAML file per generation.
+"""
+
+import os
+import re
+import yaml
+import numpy
+import sqlite3
+import dataclasses
+
+from typing import List
+
+from faux_formicidae.ant_colony import ColonyParameters
+from faux_formicidae.evaluation import SimulationResult
+
+PARAMETER_FIELDS = [field.name for field in dataclasses.fields(ColonyParameters)]
+FIELDS = ["population", "steps"] + PARAMETER_FIELDS
+
+RESULTS_FILE_PATTERN = re.compile(r"^results_(\d+)\.yaml$")
+
+
+def writeResultsYaml(path, results: List[SimulationResult]):
+    """
+    The results_N.yaml file for one generation, colonies in index order
+    """
+
+    colonies = []
+
+    for result in results:
+        population, index, params = result.population, result.index, result.params
+        data_dict = {"population": population}
+        data_dict.update(params.floatDict())
+
+        while len(colonies) <= index:
+            colonies.append({})
+
+        colonies[index] = data_dict
+
+    full_data = {"ants": colonies}
+
+    file = open(path, 'w')
+    yaml.dump(full_data, file)
+    file.close()
+
+
+class ResultsStore(object):
+    def __init__(self, path):
+        """
+        :param path: SQLite file, gets created if it isn't there yet
+        """
+
+        self.path = path
+        self.connection = sqlite3.connect(path)
+
+        columns = ", ".join(f"{field} REAL" for field in FIELDS)
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS results (generation INTEGER NOT NULL, "
+                                f"colony INTEGER NOT NULL, {columns}, PRIMARY KEY (generation, colony))")
+        self.connection.commit()
+
+    def __len__(self):
+        """
+        Number of generations stored
+        """
+
+        return self.connection.execute("SELECT COUNT(DISTINCT generation) FROM results").fetchone()[0]
+
+    def appendGeneration(self, generation, results: List[SimulationResult]):
+        """
+        Store one generation's results, replacing anything already stored for that generation
+        """
+
+        self.appendRows(generation, [[result.index, result.population, result.steps]
+                                     + [float(value) for value in result.params.getAsList()]
+                                     for result in results])
+
+    def appendRows(self, generation, rows):
+        """
+        :param rows: [colony, population, steps, *parameters] for each colony, steps can be None
+        """
+
+        placeholders = ", ".join("?" for _ in range(len(FIELDS) + 2))
+        with self.connection:
+            self.connection.execute("DELETE FROM results WHERE generation = ?", (generation,))
+            self.connection.executemany(f"INSERT INTO results VALUES ({placeholders})",
+                                        [[generation] + list(row) for row in rows])
+
+    def loadResults(self):
+        """
+        :returns: {field_name: array[generation][colony_id], ...}, nan for colonies missing from a generation, and for
+                  steps from before they were recorded
+        """
+
+        rows = self.connection.execute(f"SELECT generation, colony, {', '.join(FIELDS)} FROM results "
+                                       f"ORDER BY generation, colony").fetchall()
+        if len(rows) == 0:
+            return {}
+
+        table = numpy.array(rows, dtype=float)
+        generations, generation_rows = numpy.unique(table[:, 0], return_inverse=True)
+        colonies = table[:, 1].astype(int)
+
+        data = {}
+        for k, field in enumerate(FIELDS):
+            values = numpy.full((len(generations), colonies.max() + 1), numpy.nan)
+            values[generation_rows, colonies] = table[:, k + 2]
+            data[field] = values
+        return data
+
+    def importYaml(self, data_dir, missing_only=False):
+        """
+        Import the results_N.yaml files the genetic algorithm used to write
+
+        :param missing_only: Leave the generations that are already in the store alone
+        :returns: Number of generations imported
+        """
+
+        stored = set(self.getGenerations()) if missing_only else set()
+        generations = {}
+        for file_name in os.listdir(data_dir):
+            match = RESULTS_FILE_PATTERN.match(file_name)
+            if match is not None and int(match.group(1)) not in stored:
+                generations[int(match.group(1))] = file_name
+
+        for generation, file_name in generations.items():
+            with open(os.path.join(data_dir, file_name)) as file:
+                colonies = yaml.load(file, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))["ants"]
+
+            # Colonies that didn't report anything were written as empty dicts
+            rows = [[index, colony["population"], None] + [colony[field] for field in PARAMETER_FIELDS]
+                    for index, colony in enumerate(colonies) if len(colony) > 0]
+            self.appendRows(generation, rows)
+
+        return len(generations)
+
+    def getGenerations(self):
+        return [row[0] for row in self.connection.execute("SELECT DISTINCT generation FROM results ORDER BY generation")]
+
+    def close(self):
+        self.connection.close()
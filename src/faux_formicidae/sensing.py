@@ -0,0 +1,77 @@
+"""
+Precomputed lookup tables for the ants' sensing
+
+The angle from the ant to every cell of its field of view only depends on the size of the field of view, which only
+depends on the sample radius and the world resolution.  So there are only a handful of different ones, and they get
+worked out once and cached here instead of for every ant on every step.
+"""
+
+import numpy as np
+
+
+class SensingKernel(object):
+    def __init__(self, shape):
+        """
+        :param shape: Shape of the (transposed) field of view this kernel is for
+        """
+
+        self.shape = shape
+
+        rows, cols = np.indices(shape)
+        ant_location = np.asarray(shape) / 2.0
+
+        # Same maths as the old per-call version, so the angles come out bit for bit the same
+        self.theta = np.arctan2(ant_location[0] - rows, ant_location[1] - cols) - np.pi
+        self.sinTheta = np.sin(self.theta)
+        self.cosTheta = np.cos(self.theta)
+
+    def angleDifference(self, target_direction):
+        """
+        abs(angle_diff_radians(theta, target_direction - pi)) for every cell
+        """
+
+        b = target_direction - np.pi
+        dot = self.sinTheta * np.sin(b) + self.cosTheta * np.cos(b)
+        cross = self.cosTheta * np.sin(b) - self.sinTheta * np.cos(b)
+        return abs(np.arctan2(cross, dot))
+
+    def direction(self, visible_area: np.ndarray, target_direction, use_gradient=True):
+        """
+        Heading towards the best non-zero cell of the field of view
+
+        :param visible_area: Transposed field of view, either pheromone strengths or a bool mask
+        :param use_gradient: Go for the weakest cell instead of weighting the cells by how close they are to the target
+        :returns: direction in radians, or None if every cell is zero
+        """
+
+        non_zero = visible_area != 0
+        if not non_zero.any():
+            return None
+
+        inverse = np.zeros(self.shape, dtype=np.result_type(1.0, visible_area.dtype))
+        np.divide(1.0, visible_area, out=inverse, where=non_zero)
+
+        if use_gradient:
+            weights = inverse
+        else:
+            weights = self.angleDifference(target_direction) * inverse
+
+        # argmax takes the first of any ties in row-major order, which is the order np.nonzero used to give
+        weights = np.where(non_zero, weights, -np.inf)
+        return self.theta.flat[np.argmax(weights)]
+
+
+_kernels = {}
+
+
+def getSensingKernel(shape) -> SensingKernel:
+    """
+    Cached SensingKernel for a field of view shape
+    """
+
+    shape = tuple(shape)
+    kernel = _kernels.get(shape)
+    if kernel is None:
+        kernel = SensingKernel(shape)
+        _kernels[shape] = kernel
+    return kernel
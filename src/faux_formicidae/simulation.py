@@ -7,40 +7,125 @@ Contains a world and a list of ant colony classes, manages the updates of each
 """
 
 import typing
+import numpy as np
 
 from faux_formicidae.world import AntWorld
 from faux_formicidae.ant_colony import AntColony
 from faux_formicidae.ant import Ant
+from faux_formicidae.ant_population import AntPopulation
+from faux_formicidae.navigation import NavigationField
+from faux_formicidae.profiling import NULL_PROFILER, TICKS, ANT_TICKS
+
+
+class RandomStreams(typing.NamedTuple):
+    world: np.random.Generator  # Where and when food shows up
+    ants: np.random.Generator  # How the ants wander
+    schedule: np.random.Generator  # How long the run has to go at least, see PopulationMonitor
+
+
+def makeRandomStreams(seed) -> RandomStreams:
+    """
+    Independent random streams for one run, all from one seed.  With the world on its own stream, two colonies run on
+    the same seed get the same food in the same places however differently their ants behave
+    """
+
+    return RandomStreams(*[np.random.default_rng(sequence) for sequence in np.random.SeedSequence(seed).spawn(3)])
 
 
 class Simulation(object):
-    def __init__(self, world: AntWorld):
+    def __init__(self, world: AntWorld, vectorized=False, nest_navigation=False, rng: np.random.Generator = None,
+                 profiler=None):
+        """
+        :param world: World to run the ants in
+        :param vectorized: Keep the ants in an AntPopulation and update them all at once, instead of one Ant at a time
+        :param nest_navigation: Give each colony's nest a NavigationField, so ants find their way home around walls
+        :param rng: Random number generator for the ants, defaults to the global numpy one
+        :param profiler: Profiler to time the phases of every step with, see faux_formicidae.profiling
+        """
+
         self.world = world
         self.clock = 0
+        self.rng = rng
 
         self.antColony = None
         self.ants: typing.List[Ant] = []
+        self.population = AntPopulation(world, rng=rng) if vectorized else None
+        self.nestNavigation = nest_navigation
         self.deadAnts = 0
 
+        # The world, the population and the ants all time themselves with the same profiler
+        self.profiler = profiler if profiler is not None else NULL_PROFILER
+        self.world.profiler = self.profiler
+        if self.population is not None:
+            self.population.profiler = self.profiler
+
+        # Called with the simulation at the end of every step, see TrajectoryRecorder
+        self.stepListeners = []
+
     def addAntColony(self, colony: AntColony):
         self.antColony = colony
         self.antColony.setCallback(self.addAnt)
+        if colony.rng is None:
+            colony.rng = self.rng
+
+        # Worlds made from a WorldTemplate can come with the field already
+        if self.nestNavigation and self.world.getNavigationField((colony.xPosition, colony.yPosition)) is None:
+            self.world.addNavigationField(NavigationField(self.world, colony.xPosition, colony.yPosition))
 
     def addAnt(self, ant: Ant, x: float, y: float):
         isFree, objType = self.world.isFreePosition(x, y)
         if isFree:
-            self.ants.append(ant)
             ant.setWorld(self.world)
             ant.setPosition(x, y)
+            if self.population is not None:
+                # The population copies what it needs, so the Ant object can go straight back to the colony
+                self.population.addAnt(ant, x, y)
+                if self.antColony is not None:
+                    self.antColony.recycleAnt(ant)
+            else:
+                self.ants.append(ant)
         else:
             print(f"Can't add ant at {x}, {y}")
+            # The colony took it out of its pool for this, so it has to go back or it's gone for good
+            if self.antColony is not None:
+                self.antColony.recycleAnt(ant)
 
     def getWorld(self):
         return self.world
 
     def getAnts(self):
+        if self.population is not None:
+            return self.population.getViews()
         return self.ants
 
+    def getAntPositions(self):
+        """
+        :returns: x and y arrays (in cm) of every ant's position
+        """
+
+        if self.population is not None:
+            return self.population.getPositions()
+        x = np.fromiter((ant.xPosition for ant in self.ants), dtype=float, count=len(self.ants))
+        y = np.fromiter((ant.yPosition for ant in self.ants), dtype=float, count=len(self.ants))
+        return x, y
+
+    def getAntModes(self):
+        """
+        :returns: int8 array of every ant's AntMode value, in the same order as getAntPositions
+        """
+
+        if self.population is not None:
+            return self.population.modes[:self.population.count]
+        return np.fromiter((ant.mode.value for ant in self.ants), dtype=np.int8, count=len(self.ants))
+
+    def addStepListener(self, callback):
+        self.stepListeners.append(callback)
+
+    def numAnts(self):
+        if self.population is not None:
+            return len(self.population)
+        return len(self.ants)
+
     def runOnce(self, delta_t=0.1):
         """
         Function to advance the simulation one time step
@@ -48,22 +133,43 @@ class Simulation(object):
         :return:
         """
 
-        # Update the world
-        self.world.runOnce(delta_t)
+        profiler = self.profiler
+        with profiler.section("step"):
+            # Update the world
+            self.world.runOnce(delta_t)
+
+            # Update the colony
+            if self.antColony is not None:
+                with profiler.section("colony.spawn"):
+                    self.antColony.runOnce(delta_t, self.clock)
 
-        # Update the colony
-        if self.antColony is not None:
-            self.antColony.runOnce(delta_t, self.clock)
+            # Update the ants
+            if self.population is not None:
+                self.deadAnts += self.population.runOnce(delta_t)
 
-        # Update the ants
-        for ant in self.ants:
-            ant.runOnce(delta_t)
+            # Dead ants get swept out in one go afterwards, removing them mid-loop is slow and skips the next ant
+            alive_ants = []
+            for ant in self.ants:
+                ant.runOnce(delta_t)
 
-            if ant.energy <= 0:
-                self.ants.remove(ant)
-                self.deadAnts += 1
+                if ant.energy > 0:
+                    alive_ants.append(ant)
+                else:
+                    self.deadAnts += 1
+                    if self.antColony is not None:
+                        self.antColony.recycleAnt(ant)
+            self.ants = alive_ants
+
+            # Draw all of this step's trails in one go
+            self.world.flushPheromoneLines()
+
+        profiler.count(TICKS)
+        profiler.count(ANT_TICKS, self.numAnts())
 
         # print(len(self.ants), self.deadAnts)
 
         # Update the clock
         self.clock += delta_t
+
+        for callback in self.stepListeners:
+            callback(self)
@@ -0,0 +1,191 @@
+"""
+Running a simulation in its own thread and handing copies of it to whoever wants to draw it
+
+The runner steps the simulation as fast as it can (or at a fixed multiple of real time) and every so often copies what
+there is to see into a SnapshotBuffer.  The buffer holds two snapshots: the runner fills the back one while the renderer
+reads the front one, and they get swapped when the renderer isn't looking.  So the renderer never sees half a step and
+the simulation never waits for the display.
+"""
+
+import time
+import contextlib
+import threading
+import numpy as np
+
+from faux_formicidae.world import Pheromones
+
+# Snapshots per second the runner publishes at most, anything the renderer wouldn't show anyway is skipped
+PUBLISH_RATE = 60.0
+
+
+class Snapshot(object):
+    def __init__(self, shape):
+        """
+        Empty snapshot with room for layers of shape (width, height) in cells
+        """
+
+        self.sequence = 0
+        self.clock = 0.0
+        self.steps = 0
+
+        # Layer 0 only gets copied when it changed, see SnapshotBuffer.cellsVersion
+        self.cells = np.zeros(shape, dtype=np.uint8)
+        self.cellsVersion = -1
+
+        # Pheromone strengths as 0-255, ready to be used as alpha
+        self.pheromones = {pheromone: np.zeros(shape, dtype=np.uint8) for pheromone in Pheromones}
+
+        self.antX = np.zeros(0)
+        self.antY = np.zeros(0)
+        self.antModes = np.zeros(0, dtype=np.int8)
+
+    def numAnts(self):
+        return len(self.antX)
+
+    def capture(self, sim, sequence, cells_version, steps):
+        """
+        Copy the current state of sim into this snapshot
+        """
+
+        world = sim.getWorld()
+        self.sequence = sequence
+        self.clock = sim.clock
+        self.steps = steps
+
+        if self.cellsVersion != cells_version:
+            np.copyto(self.cells, world.getLayer(0), casting="unsafe")
+            self.cellsVersion = cells_version
+
+        for pheromone, alpha in self.pheromones.items():
+            np.multiply(world.getLayer(pheromone), 255, out=alpha, casting="unsafe")
+
+        x, y = sim.getAntPositions()
+        self.antX = np.array(x)
+        self.antY = np.array(y)
+        self.antModes = np.array(sim.getAntModes())
+
+
+class SnapshotBuffer(object):
+    def __init__(self, sim):
+        """
+        :param sim: Simulation (or anything with getWorld, clock, getAntPositions and getAntModes) to take snapshots of
+        """
+
+        self.sim = sim
+        world = sim.getWorld()
+        shape = (world.widthCells, world.heightCells)
+        self.front = Snapshot(shape)
+        self.back = Snapshot(shape)
+        self.lock = threading.Lock()
+        self.sequence = 0
+
+        # Bumped whenever layer 0 changes, the listener gets called from whichever thread is stepping the world
+        self.cellsVersion = 0
+        world.addCellListener(self._cellsChanged)
+
+    def _cellsChanged(self, start_i, end_i, start_j, end_j, blocked):
+        self.cellsVersion += 1
+
+    def publish(self, steps=0, wait=False):
+        """
+        Take a snapshot of the simulation and make it the latest one.  Only call this from the thread stepping the
+        simulation
+
+        :param wait: Wait for the reader to be done with the front snapshot, instead of dropping this one if it isn't
+        :returns: Whether the snapshot got published
+        """
+
+        self.sequence += 1
+        self.back.capture(self.sim, self.sequence, self.cellsVersion, steps)
+
+        if not self.lock.acquire(blocking=wait):
+            return False
+        self.front, self.back = self.back, self.front
+        self.lock.release()
+        return True
+
+    @contextlib.contextmanager
+    def latest(self):
+        """
+        The latest snapshot, it doesn't change until the with block is done
+        """
+
+        with self.lock:
+            yield self.front
+
+
+class SimulationRunner(object):
+    def __init__(self, sim, delta_t=0.05, speed=None, publish_rate=PUBLISH_RATE, step=None):
+        """
+        :param sim: Simulation to run
+        :param delta_t: Time step, in seconds
+        :param speed: Simulated seconds per real second, None to run as fast as possible
+        :param publish_rate: Snapshots per real second, at most
+        :param step: Function that advances sim one step and returns True once it's done, defaults to sim.runOnce, which
+                     never is
+        """
+
+        self.sim = sim
+        self.deltaT = delta_t
+        self.speed = speed
+        self.publishInterval = 1.0 / publish_rate
+        self.step = step if step is not None else self._step
+        self.steps = 0
+
+        self.snapshots = SnapshotBuffer(sim)
+        self.stopping = threading.Event()
+        self.finished = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="SimulationRunner", daemon=True)
+
+    def _step(self):
+        self.sim.runOnce(self.deltaT)
+        return False
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop stepping the simulation and wait for the thread to finish
+        """
+
+        self.stopping.set()
+        self.join()
+
+    def join(self):
+        """
+        Wait until the simulation is done (or stopped)
+        """
+
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        try:
+            self.snapshots.publish(self.steps, wait=True)
+            start_time = time.monotonic()
+            next_publish = start_time
+
+            while not self.stopping.is_set():
+                if self.speed is not None:
+                    # Hold back until real time catches up with the simulation
+                    ahead = self.steps * self.deltaT / self.speed - (time.monotonic() - start_time)
+                    if ahead > 0 and self.stopping.wait(ahead):
+                        break
+
+                done = self.step()
+                self.steps += 1
+
+                now = time.monotonic()
+                if done or now >= next_publish:
+                    self.snapshots.publish(self.steps, wait=done)
+                    next_publish = now + self.publishInterval
+                if done:
+                    break
+        except Exception as error:
+            self.error = error
+        finally:
+            self.finished.set()
@@ -4,11 +4,16 @@
 Class to represent the world
 """
 
+import copy
 import numpy as np
-from enum import IntEnum
-from skimage.draw import line
+from enum import Enum, IntEnum
 import cv2
 
+from faux_formicidae.integral import CellIndex, normalizeBlock
+from faux_formicidae.food import FoodRegistry
+from faux_formicidae.profiling import NULL_PROFILER
+from faux_formicidae.world_map import DEFAULT_MAP, loadMap
+
 
 # Possible states for world cells
 class WorldCell(IntEnum):
@@ -23,42 +28,209 @@ class Pheromones(IntEnum):
     FOOD = 2
 
 
+# How the cell types and pheromones are stored
+#   DENSE: one float64 (W, H, NUM_PHEROMONES + 1) array, cell types in channel 0
+#   COMPACT: uint8 cell type grid and one float32 grid per pheromone, about 2.7x smaller than DENSE
+#   QUANTIZED: uint8 cell type grid and one uint16 grid per pheromone (strength * 65535), about 4.8x smaller than DENSE.
+#              The one to use when memory matters, steps take about as long as with DENSE (see the
+#              runOnce[...,QUANTIZED] benchmarks)
+class WorldStorage(Enum):
+    DENSE = 0
+    COMPACT = 1
+    QUANTIZED = 2
+
+
 NUM_PHEROMONES = Pheromones.__len__()
+# Size of the default map (data/maps/default.yaml) in cm
 WIDTH_SCALE = 16
 HEIGHT_SCALE = 9
 RESOLUTION = 40
 
+QUANTIZED_SCALE = np.iinfo(np.uint16).max
+
+# Pheromone strength lost per second
+EVAPORATION_RATE = 0.05
+
+
+def rasterizeLines(start_i, start_j, end_i, end_j):
+    """
+    Vectorized skimage.draw.line for a bunch of lines at once, gives exactly the same cells (Bresenham)
+
+    :returns: (i, j, line_index) arrays with the cells of every line concatenated together
+    """
+
+    start_i = np.asarray(start_i, dtype=np.int64)
+    start_j = np.asarray(start_j, dtype=np.int64)
+    d_i = np.asarray(end_i, dtype=np.int64) - start_i
+    d_j = np.asarray(end_j, dtype=np.int64) - start_j
+
+    # Steep lines step along i and occasionally in j, the rest the other way around
+    steep = np.abs(d_i) > np.abs(d_j)
+    major = np.where(steep, np.abs(d_i), np.abs(d_j))
+    minor = np.where(steep, np.abs(d_j), np.abs(d_i))
+
+    lengths = major + 1
+    line_index = np.repeat(np.arange(len(lengths)), lengths)
+    step = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+    # Closed form of how many times Bresenham has stepped along the minor axis by this step
+    major = major[line_index]
+    minor_step = (2 * minor[line_index] * step + major) // np.maximum(2 * major, 1)
+
+    steep = steep[line_index]
+    i = start_i[line_index] + np.where(d_i[line_index] > 0, 1, -1) * np.where(steep, step, minor_step)
+    j = start_j[line_index] + np.where(d_j[line_index] > 0, 1, -1) * np.where(steep, minor_step, step)
+    return i, j, line_index
+
+
+def evaporateLayer(layer: np.ndarray, delta_t, storage: WorldStorage):
+    """
+    Evaporate a pheromone layer (or a stack of them) in place
+    """
+
+    evaporate_step = EVAPORATION_RATE * delta_t
+    if storage == WorldStorage.QUANTIZED:
+        # Saturating subtract, so nothing wraps around below zero
+        step = round(evaporate_step * QUANTIZED_SCALE)
+        np.maximum(layer, step, out=layer)
+        layer -= step
+    else:
+        np.clip(layer - evaporate_step, 0.0, 1.0, layer)
+
 
 class AntWorld(object):
-    def __init__(self, width_cm: int = WIDTH_SCALE, height_cm: int = HEIGHT_SCALE, resolution: int = RESOLUTION):
+    def __init__(self, width_cm: int = None, height_cm: int = None, resolution: int = RESOLUTION,
+                 storage: WorldStorage = WorldStorage.DENSE, lazy_evaporation=False, rng: np.random.Generator = None,
+                 static: dict = None, map_path: str = None):
         """
-        :param width_cm:  World width in centimeters
-        :param height_cm:  World height in centimeters
+        :param width_cm:  World width in centimeters, has to be the map's if it's given
+        :param height_cm:  World height in centimeters, same
         :param resolution: World resolution (cells per centimeter)
+        :param storage: How to store the layers, see WorldStorage
+        :param lazy_evaporation: Instead of evaporating the whole grid every step, remember when each cell was last
+                                 written and work out how much has evaporated when it gets read.  Off by default, it
+                                 pays off when the grid is big next to how much the ants read of it (the
+                                 runOnce[...,lazy] benchmarks: about 4x faster steps with 10 ants at resolution 80,
+                                 1.4-2.3x with 100, about even or slower at resolution 20).  Every pheromone layer
+                                 gets a timestamp array the size of the layer to go with it
+        :param rng: Random number generator for food spawning, defaults to the global numpy one
+        :param static: Layer 0 and its summed-area tables already worked out, instead of building them here (see
+                       WorldTemplate).  The tables get used as they are
+        :param map_path: Manifest of the map with the walls, nest and food regions (see faux_formicidae.world_map),
+                         data/maps/default.yaml if not given
         """
 
+        self.mapPath = map_path if map_path is not None else DEFAULT_MAP
+        world_map = loadMap(self.mapPath)
+        width_cm = width_cm if width_cm is not None else world_map.width
+        height_cm = height_cm if height_cm is not None else world_map.height
+        if (width_cm, height_cm) != (world_map.width, world_map.height):
+            raise ValueError(f"{self.mapPath} is {world_map.width} by {world_map.height} cm, not {width_cm} by "
+                             f"{height_cm} cm")
+
         self.width = width_cm
         self.height = height_cm
+        self.rng = rng
+
+        # Where the colony goes, and where food can spawn (x_start, y_start, x_end, y_end), all in cm
+        self.nestPosition = world_map.nest
+        self.foodRegions = world_map.foodRegions
 
-        self.widthCells = width_cm * resolution
-        self.heightCells = height_cm * resolution
+        self.widthCells = round(width_cm * resolution)
+        self.heightCells = round(height_cm * resolution)
         self.resolution = resolution
 
         # Currently 0s in this array are free, 1s are occupied, probably need to work on this some eventually
         # Question, how to implement pheromones.  Do we make a new array, or do we add more values to this one?
         # If multiple types of pheromones can occupy the same cell we'll probably need multiple arrays
-        self.world = np.zeros((self.widthCells, self.heightCells, NUM_PHEROMONES + 1))
-        self.world[:, :, 0] = WorldCell.EMPTY
-
-        # Hard-code a few obstacles for now
-        # 640, 380 for now 
-        self.world[400:500, 100:150, 0] = WorldCell.WALL
-        self.world[100:300, 200:300, 0] = WorldCell.WALL
-        self.world[100:300, 0:100, 0] = WorldCell.WALL
-        # self.world[0:50, 0:50, 0] = WorldCell.FOOD
-        # self.world[590:640, 330:380, 0] = WorldCell.FOOD
+        self.storage = storage
+        shape = (self.widthCells, self.heightCells)
+
+        # self.layers[0] is the cell types, self.layers[pheromone] is that pheromone
+        # Pheromones are stored as strength * self.pheromoneScale
+        if storage == WorldStorage.DENSE:
+            self.world = np.zeros((self.widthCells, self.heightCells, NUM_PHEROMONES + 1))
+            self.layers = [self.world[:, :, i] for i in range(NUM_PHEROMONES + 1)]
+            self.pheromoneScale = 1.0
+        else:
+            pheromone_type = np.float32 if storage == WorldStorage.COMPACT else np.uint16
+            self.world = None
+            self.layers = [np.zeros(shape, dtype=np.uint8)]
+            self.layers += [np.zeros(shape, dtype=pheromone_type) for _ in range(NUM_PHEROMONES)]
+            self.pheromoneScale = 1.0 if storage == WorldStorage.COMPACT else float(QUANTIZED_SCALE)
+
+        self.cells = self.layers[0]
+        self.cells[:, :] = WorldCell.EMPTY
+
+        # Called with (start_i, end_i, start_j, end_j, blocked) whenever a block of layer 0 changes
+        self.cellListeners = []
+
+        # Way home from anywhere, for each nest cell, see NavigationField
+        self.navigationFields = {}
+
+        # With lazy evaporation the pheromone layers hold the strength at the time in self.pheromoneTimes
+        self.lazyEvaporation = lazy_evaporation
+        self.pheromoneTimes = [None] * (NUM_PHEROMONES + 1)
+        if lazy_evaporation:
+            time_type = np.float64 if storage == WorldStorage.DENSE else np.float32
+            for pheromone in Pheromones:
+                self.pheromoneTimes[int(pheromone)] = np.zeros(shape, dtype=time_type)
+
+        if static is None:
+            # Nothing is listening for changes yet, so the walls can go straight in
+            self.cells[world_map.wallMask(self.widthCells, self.heightCells)] = WorldCell.WALL
+            static = {}
+        else:
+            self.cells[:, :] = static["cells"]
+
+        # Summed-area tables so food and wall checks don't have to scan the cells
+        self.cellIndices = {cell_type: CellIndex(self, cell_type, static.get(f"index.{cell_type.name}"))
+                            for cell_type in [WorldCell.WALL, WorldCell.FOOD]}
+
+        # Every patch of food that gets spawned, and how much of it is left
+        self.foodSources = FoodRegistry()
 
         self.timeSince = 0
+        self.clock = 0.0
+
+        # Trails queued up by the ants this step, see queuePheromoneLine
+        self.queuedLines = []
+
+        # Shared with the ants in this world, see Simulation
+        self.profiler = NULL_PROFILER
+
+    def copy(self):
+        """
+        Independent copy of the world, including its food sources, indices and navigation fields
+        """
+
+        return copy.deepcopy(self)
+
+    def attachLayers(self, cube: np.ndarray = None, layers=None, pheromone_times=None):
+        """
+        Move the layers into arrays owned by someone else (see WorldStack), keeping what is in them
+
+        :param cube: (W, H, NUM_PHEROMONES + 1) array to use for DENSE storage
+        :param layers: List of arrays to use instead of self.layers for the other storage types
+        :param pheromone_times: List of arrays to use instead of self.pheromoneTimes, for lazy evaporation
+        """
+
+        if cube is not None:
+            cube[:, :, :] = self.world
+            self.world = cube
+            layers = [cube[:, :, i] for i in range(NUM_PHEROMONES + 1)]
+        else:
+            for new_layer, layer in zip(layers, self.layers):
+                new_layer[:, :] = layer
+
+        self.layers = list(layers)
+        self.cells = self.layers[0]
+
+        if pheromone_times is not None:
+            for new_times, times in zip(pheromone_times, self.pheromoneTimes):
+                if times is not None:
+                    new_times[:, :] = times
+            self.pheromoneTimes = list(pheromone_times)
 
     def getWidth(self):
         return self.widthCells
@@ -66,6 +238,14 @@ class AntWorld(object):
     def getHeight(self):
         return self.heightCells
 
+    def nbytes(self):
+        """
+        Memory used by the layers, in bytes
+        """
+
+        layers = [self.world] if self.world is not None else self.layers
+        return sum(array.nbytes for array in layers + self.pheromoneTimes if array is not None)
+
     def worldSpaceToPixelSpace(self, x, y):
         """
         Function to convert coordinates in cm to array indices
@@ -81,7 +261,7 @@ class AntWorld(object):
         return float(i) / self.resolution, float(j) / self.resolution
 
     def isWithinBounds(self, i, j):
-        return 0 <= i < self.world.shape[0] and 0 <= j < self.world.shape[1]
+        return 0 <= i < self.cells.shape[0] and 0 <= j < self.cells.shape[1]
 
     def isFreePosition(self, x: float, y: float):
         """
@@ -89,14 +269,30 @@ class AntWorld(object):
         """
 
         i, j = self.worldSpaceToPixelSpace(x, y)
-        return self.isWithinBounds(i, j) and self.world[i][j][0] == WorldCell.EMPTY, int(self.world[i][j][0]) if self.isWithinBounds(i, j) else None
+        return self.isWithinBounds(i, j) and self.cells[i, j] == WorldCell.EMPTY, int(self.cells[i, j]) if self.isWithinBounds(i, j) else None
+
+    def isFreePositions(self, x: np.ndarray, y: np.ndarray):
+        """
+        Vectorized isFreePosition for arrays of coordinates (in cm)
+
+        :returns: (bool array of free positions, int array of cell types with -1 for out of bounds)
+        """
+
+        i, j = self._worldSpaceToPixelSpaceArrays(x, y)
+        in_bounds = (0 <= i) & (i < self.cells.shape[0]) & (0 <= j) & (j < self.cells.shape[1])
+
+        cell_types = np.full(i.shape, -1, dtype=np.int64)
+        cell_types[in_bounds] = self.cells[i[in_bounds], j[in_bounds]]
+        return cell_types == WorldCell.EMPTY, cell_types
 
     # Pheromone as a float
     # whole numbers is amount of time since epoch the last pheromone was updated
     # decimal number is the strength of the pheromone [0,1)
     def changePheromone(self, x: float, y: float, pheromone: int, amnt: float = 1.0):
         i, j = self.worldSpaceToPixelSpace(x, y)
-        self.world[i, j, int(pheromone)] = amnt
+        self.layers[int(pheromone)][i, j] = self._encodePheromone(amnt)
+        if self.lazyEvaporation:
+            self.pheromoneTimes[int(pheromone)][i, j] = self.clock
         return
 
     def addPheromone(self, x: int, y: int, pheromone: int, amnt: float = 1.0):
@@ -106,15 +302,161 @@ class AntWorld(object):
         return self.changePheromone(x, y, pheromone, amnt)
 
     def addPheromoneLine(self, start, end, pheromone, amount: float = 1.0):
-        s_i, s_j = self.worldSpaceToPixelSpace(start[0], start[1])
-        e_i, e_j = self.worldSpaceToPixelSpace(end[0], end[1])
+        self.addPheromoneLines([start[0]], [start[1]], [end[0]], [end[1]], [pheromone], amount)
+
+    def addPheromoneLines(self, start_x, start_y, end_x, end_y, pheromones, amount: float = 1.0):
+        """
+        Lay down a trail along every segment (in cm) at once, with one scatter per pheromone layer
+
+        :param pheromones: Which pheromone each segment lays down
+        """
 
-        discrete_line = list(zip(*line(s_i, s_j, e_i, e_j)))
+        s_i, s_j = self._worldSpaceToPixelSpaceArrays(start_x, start_y)
+        e_i, e_j = self._worldSpaceToPixelSpaceArrays(end_x, end_y)
+        i, j, line_index = rasterizeLines(s_i, s_j, e_i, e_j)
+        pheromones = np.asarray(pheromones, dtype=np.int64)[line_index]
 
-        for point in discrete_line:
-            self.world[point[0], point[1], int(pheromone)] = amount
+        value = self._encodePheromone(amount)
+        for pheromone in Pheromones:
+            cells = pheromones == int(pheromone)
+            if not cells.any():
+                continue
+
+            self.layers[int(pheromone)][i[cells], j[cells]] = value
+            if self.lazyEvaporation:
+                self.pheromoneTimes[int(pheromone)][i[cells], j[cells]] = self.clock
+
+    def queuePheromoneLine(self, start, end, pheromone):
+        """
+        Same as addPheromoneLine, but the trail only shows up once flushPheromoneLines is called (once per step by the
+        simulation), so all the ants' trails get drawn together
+        """
+
+        self.queuedLines.append((start[0], start[1], end[0], end[1], int(pheromone)))
+
+    def flushPheromoneLines(self):
+        if len(self.queuedLines) == 0:
+            return
+
+        with self.profiler.section("ants.deposit"):
+            start_x, start_y, end_x, end_y, pheromones = zip(*self.queuedLines)
+            self.addPheromoneLines(start_x, start_y, end_x, end_y, pheromones)
+            self.queuedLines = []
+
+    def _worldSpaceToPixelSpaceArrays(self, x, y):
+        """
+        worldSpaceToPixelSpace for arrays, astype truncates towards zero just like int()
+        """
+
+        return (np.asarray(x) * self.resolution).astype(np.int64), (np.asarray(y) * self.resolution).astype(np.int64)
+
+    def _encodePheromone(self, amount):
+        if self.storage == WorldStorage.QUANTIZED:
+            return round(amount * self.pheromoneScale)
+        return amount
+
+    def setCells(self, start_i, end_i, start_j, end_j, cell_type: WorldCell):
+        """
+        Sets a block of layer 0 to the given cell type
+        """
 
-        pass
+        self.cells[start_i:end_i, start_j:end_j] = cell_type
+        self._cellsChanged(start_i, end_i, start_j, end_j, cell_type != WorldCell.EMPTY)
+
+    def clearFood(self, start_i, end_i, start_j, end_j):
+        """
+        Removes any food in a block of layer 0
+        """
+
+        if self.countCells(WorldCell.FOOD, start_i, end_i, start_j, end_j) == 0:
+            return
+
+        area = self.cells[start_i:end_i, start_j:end_j]
+        area[area == WorldCell.FOOD] = WorldCell.EMPTY
+        self._cellsChanged(start_i, end_i, start_j, end_j, False)
+
+    def spawnFood(self, start_i, end_i, start_j, end_j):
+        """
+        Fill a block of layer 0 with food and register it as a food source
+
+        :returns: The new FoodSource, or None if the block is empty
+        """
+
+        block = normalizeBlock(start_i, end_i, start_j, end_j, self.cells.shape)
+        if block is None:
+            return None
+
+        self.setCells(*block, WorldCell.FOOD)
+        s_i, e_i, s_j, e_j = block
+        return self.foodSources.add(s_i, e_i, s_j, e_j, (e_i - s_i) * (e_j - s_j), self.clock)
+
+    def takeFood(self, start_i, end_i, start_j, end_j):
+        """
+        An ant picking up the food in a block of layer 0.  Only the parts of the food sources under the block get
+        cleared, and sources that run out are dropped from the registry
+
+        :returns: Number of food cells taken
+        """
+
+        block = normalizeBlock(start_i, end_i, start_j, end_j, self.cells.shape)
+        if block is None:
+            return 0
+
+        taken = 0
+        for source in self.foodSources.query(*block):
+            overlap = source.overlap(*block)
+            amount = self.countCells(WorldCell.FOOD, *overlap)
+            if amount == 0:
+                continue
+
+            self.clearFood(*overlap)
+            taken += amount
+            source.pickups += 1
+            source.amount = self.countCells(WorldCell.FOOD, source.start_i, source.end_i, source.start_j, source.end_j)
+            if source.amount == 0:
+                self.foodSources.remove(source, self.clock)
+
+        # Food that was put down by hand instead of spawned doesn't have a source
+        leftover = self.countCells(WorldCell.FOOD, *block)
+        if leftover > 0:
+            self.clearFood(*block)
+            taken += leftover
+
+        return taken
+
+    def getFoodStatistics(self):
+        return self.foodSources.statistics()
+
+    def countCells(self, cell_type: WorldCell, start_i, end_i, start_j, end_j):
+        """
+        How many cells of a type (WALL or FOOD) are in a block of layer 0, in O(1)
+        """
+
+        return self.cellIndices[cell_type].count(start_i, end_i, start_j, end_j)
+
+    def addCellListener(self, callback):
+        self.cellListeners.append(callback)
+
+    def _cellsChanged(self, start_i, end_i, start_j, end_j, blocked):
+        # Same indices the slicing used, negative starts wrap around just like they do there
+        block = normalizeBlock(start_i, end_i, start_j, end_j, self.cells.shape)
+        if block is None:
+            return
+
+        for callback in self.cellListeners:
+            callback(*block, blocked)
+
+    def addNavigationField(self, field):
+        self.navigationFields[field.nestCell] = field
+
+    def getNavigationField(self, home_position):
+        """
+        NavigationField for the nest at home_position (in cm), None if there isn't one
+        """
+
+        if len(self.navigationFields) == 0:
+            return None
+        return self.navigationFields.get(self.worldSpaceToPixelSpace(home_position[0], home_position[1]))
 
     def sampleArea(self, x, y, radius):
         start_x = x - radius
@@ -128,32 +470,97 @@ class AntWorld(object):
         return start_i, end_i, start_j, end_j  # self.getLayerSection(start_i, end_i, start_j, end_j)
 
     def getLayerSection(self, start_i, end_i, start_j, end_j):
-        return self.world[start_i:end_i, start_j:end_j, :]
+        """
+        All the layers of a block of the world, stacked along the last axis like the DENSE layout.  Only a view for DENSE
+        without lazy evaporation, anything else decodes and copies every layer, so use getLayerWindow for the layers that
+        are actually needed
+        """
+
+        if self.world is not None and not self.lazyEvaporation:
+            return self.world[start_i:end_i, start_j:end_j, :]
+
+        return np.stack([self.getLayerWindow(layer_id, start_i, end_i, start_j, end_j)
+                         for layer_id in range(NUM_PHEROMONES + 1)], axis=-1)
+
+    def getLayerWindow(self, layer_id: int, start_i, end_i, start_j, end_j):
+        """
+        A block of a single layer, cheaper than getLayerSection when only one layer is needed
+        """
+
+        if layer_id == 0:
+            return self.cells[start_i:end_i, start_j:end_j]
+        return self._readPheromone(layer_id, np.s_[start_i:end_i, start_j:end_j])
 
     def getLayer(self, layer_id: int):
-        return self.world[:, :, layer_id]
+        """
+        Cell types for layer 0, pheromone strengths in [0, 1] otherwise
+        """
+
+        if layer_id == 0:
+            return self.cells
+        return self._readPheromone(layer_id, np.s_[:, :])
+
+    def _readPheromone(self, layer_id, section):
+        """
+        Pheromone strengths in [0, 1] for a section (tuple of slices) of a layer
+        """
+
+        values = self.layers[layer_id][section]
+        if self.storage == WorldStorage.QUANTIZED:
+            values = values.astype(np.float32) / np.float32(self.pheromoneScale)
+
+        if self.lazyEvaporation:
+            age = self.clock - self.pheromoneTimes[layer_id][section]
+            values = np.clip(values - EVAPORATION_RATE * age, 0.0, 1.0)
+
+        return values
 
     def runOnce(self, delta_t):
         """
-        Advance the simulation one timestep.  Since the world doesn't change yet, this function does nothing
-        If the world ever changes that code should go in here
+        Advance the simulation one timestep: evaporate the pheromones and maybe spawn some food
 
         :param delta_t: timestep in seconds
         """
 
-        evaporate_step = 0.05 * delta_t
-        self.timeSince += delta_t
+        self.clock += delta_t
+        with self.profiler.section("world.evaporate"):
+            self.evaporate(delta_t)
+        with self.profiler.section("world.food"):
+            self.updateFood(delta_t)
+
+    def evaporate(self, delta_t):
+        """
+        Weaken every pheromone by one timestep's worth of evaporation.  Nothing to do with lazy evaporation, since that
+        happens when the layers are read
+        """
+
+        if self.lazyEvaporation:
+            return
+
         for pheromone in Pheromones:
-            np.clip(self.world[:, :, int(pheromone)] - evaporate_step, 0.0, 1.0, self.world[:, :, int(pheromone)])
+            evaporateLayer(self.layers[int(pheromone)], delta_t, self.storage)
+
+    def updateFood(self, delta_t):
+        """
+        Every so often, try to drop a new patch of food somewhere empty
+        """
+
+        self.timeSince += delta_t
         # Note: we can stop food spawning and see interesting results, the colony spawns ants expecting food to be found
         if self.timeSince > 40:  # and False:
-            rand_pnt_x = np.random.uniform(WIDTH_SCALE)
-            rand_pnt_y = np.random.uniform(HEIGHT_SCALE)
+            rng = self.rng if self.rng is not None else np.random
+            # Bigger regions get more of the food.  With only one there's nothing to pick, and no random number used up
+            region = self.foodRegions[0]
+            if len(self.foodRegions) > 1:
+                areas = np.array([(e_x - s_x) * (e_y - s_y) for s_x, s_y, e_x, e_y in self.foodRegions])
+                region = self.foodRegions[rng.choice(len(areas), p=areas / areas.sum())]
+            rand_pnt_x = rng.uniform(region[0], region[2])
+            rand_pnt_y = rng.uniform(region[1], region[3])
             s_i, e_i, s_j, e_j = self.sampleArea(rand_pnt_x, rand_pnt_y, 0.2)
             # print("Point", rand_pnt_x, rand_pnt_y)
             # print("Area", s_i, e_i, s_j, e_j)
-            if self.world[s_i: e_i, s_j: e_j, 0].sum() == WorldCell.EMPTY:
-                self.world[s_i: e_i, s_j: e_j, 0] = WorldCell.FOOD
+            if self.countCells(WorldCell.WALL, s_i, e_i, s_j, e_j) + self.countCells(WorldCell.FOOD, s_i, e_i, s_j, e_j) == 0:
+                self.spawnFood(s_i, e_i, s_j, e_j)
                 # print("Success")
             # print("Fail")
             self.timeSince = 0
@@ -0,0 +1,103 @@
+"""
+Maps: a world's walls, where its nest is and where food can turn up, loaded from files
+
+A map is a small YAML manifest next to an image (or .npy file) of the walls, e.g. data/maps/default.yaml:
+
+    walls: default.png      # Relative to the manifest
+    width_cm: 16
+    height_cm: 9
+    nest: [8.0, 4.5]        # In cm, the middle of the world if left out
+    food_regions:           # [x_start, y_start, x_end, y_end] in cm, the whole world if left out
+      - [1.0, 1.0, 16.0, 9.0]
+
+Dark pixels of an image are walls, and so is anything non-zero in a .npy file.  Both are laid out like an image (rows are
+y, columns are x), and get scaled to the world's cells (nearest neighbour), so one map works at any resolution.
+"""
+
+import os
+import hashlib
+import yaml
+import cv2
+import numpy as np
+
+from typing import List, NamedTuple, Tuple
+
+PATH = os.path.abspath(os.path.join(os.path.abspath(__file__), "..", "..", ".."))
+MAPS_DIR = os.path.join(PATH, "data", "maps")
+DEFAULT_MAP = os.path.join(MAPS_DIR, "default.yaml")
+# Derived data for maps, see WorldTemplate
+MAP_CACHE_DIR = os.path.join(PATH, "data", "map_cache")
+
+# Image pixels darker than this are walls
+WALL_THRESHOLD = 128
+
+
+class WorldMap(NamedTuple):
+    path: str  # The manifest
+    width: float  # cm
+    height: float  # cm
+    nest: Tuple[float, float]
+    foodRegions: List[Tuple[float, float, float, float]]
+    walls: np.ndarray  # Bool, laid out like the image
+    contentHash: str  # Of the manifest and the walls file, changes whenever the map does
+
+    def wallMask(self, width_cells, height_cells) -> np.ndarray:
+        """
+        Where the walls are in a world of this many cells, (width_cells, height_cells) like the world's layers
+        """
+
+        walls = self.walls.astype(np.uint8)
+        if walls.shape != (height_cells, width_cells):
+            walls = cv2.resize(walls, (width_cells, height_cells), interpolation=cv2.INTER_NEAREST)
+        return walls.T > 0
+
+
+# Loaded maps by manifest path, with the modification times of their files when they were loaded
+_loadedMaps = {}
+
+
+def _modificationTimes(*paths):
+    return tuple(os.stat(path).st_mtime_ns for path in paths)
+
+
+def loadMap(path=DEFAULT_MAP) -> WorldMap:
+    """
+    Every world loads its map, so maps get loaded once and only read again if their files change
+
+    :param path: The map's manifest
+    """
+
+    path = os.path.abspath(path)
+    loaded = _loadedMaps.get(path)
+    if loaded is not None and loaded[0] == _modificationTimes(path, loaded[1]):
+        return loaded[2]
+
+    with open(path, "rb") as file:
+        manifest_bytes = file.read()
+    manifest = yaml.safe_load(manifest_bytes)
+
+    walls_path = os.path.join(os.path.dirname(path), manifest["walls"])
+    with open(walls_path, "rb") as file:
+        walls_bytes = file.read()
+
+    if walls_path.endswith(".npy"):
+        walls = np.load(walls_path) != 0
+    else:
+        image = cv2.imdecode(np.frombuffer(walls_bytes, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise ValueError(f"Can't read the walls of {path} from {walls_path}")
+        walls = image < WALL_THRESHOLD
+
+    width, height = manifest["width_cm"], manifest["height_cm"]
+    nest = manifest.get("nest", [width / 2, height / 2])
+    food_regions = manifest.get("food_regions", [[0.0, 0.0, width, height]])
+
+    content_hash = hashlib.sha256()
+    content_hash.update(manifest_bytes)
+    content_hash.update(walls_bytes)
+
+    world_map = WorldMap(path, width, height, (float(nest[0]), float(nest[1])),
+                         [tuple(float(value) for value in region) for region in food_regions], walls,
+                         content_hash.hexdigest())
+    _loadedMaps[path] = (_modificationTimes(path, walls_path), walls_path, world_map)
+    return world_map
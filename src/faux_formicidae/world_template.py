@@ -0,0 +1,180 @@
+"""
+The parts of a world that are the same for every run, worked out once and shared
+
+A world starts out as its walls, the summed-area tables of its walls and food, and (with nest navigation) the
+NavigationField for the map's nest, and working those out again for every colony costs more than setting up the
+rest of the world does.  A WorldTemplate builds them once.  Published, they're .npy files that every world made from the
+template maps copy-on-write (np.load with mmap_mode="c"), so all the worlds in all the worker processes read the same
+pages, and a world only gets its own copy of a page when it writes to it (food spawning, a navigation field patching
+itself up around the food).  What a new world does allocate for itself is its layers.
+
+Pickling a published template only sends the directory, which is how the worker pool gets it (see initWorker).
+
+With a cache_dir the published files stay around, in a directory named after a hash of the map's contents and everything
+else that goes into the arrays, so the next template for the same map and resolution just maps them again.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+
+from faux_formicidae.world import AntWorld, RESOLUTION
+from faux_formicidae.world_map import DEFAULT_MAP, loadMap
+from faux_formicidae.navigation import NavigationField, NEAR_WALL_COST, EROSION_ITERATIONS
+
+NAVIGATION_PREFIX = "navigation."
+# Bump this whenever a change to how the arrays get worked out would make the cached ones wrong
+CACHE_VERSION = 1
+
+
+class WorldTemplate(object):
+    def __init__(self, world_options=None, nest_navigation=False, cache_dir=None):
+        """
+        :param world_options: Keyword arguments for AntWorld
+        :param nest_navigation: Also work out the NavigationField for the map's nest, which is where every colony's nest
+                                goes
+        :param cache_dir: Keep the arrays in here (see MAP_CACHE_DIR), and use the ones already in it if they're for the
+                          same map
+        """
+
+        self.worldOptions = dict(world_options or {})
+        self.nestNavigation = nest_navigation
+        self.nestPosition = loadMap(self.worldOptions.get("map_path") or DEFAULT_MAP).nest
+
+        # Set by publish, only the process that published the template deletes the files
+        self.directory = None
+        self.owner = False
+
+        cached = os.path.join(cache_dir, self.cacheKey()) if cache_dir is not None else None
+        if cached is not None and os.path.isdir(cached):
+            self.directory = cached
+            self.names = [name[:-len(".npy")] for name in sorted(os.listdir(cached)) if name.endswith(".npy")]
+            self.arrays = self._load("r")
+            return
+
+        self.arrays = self._build()
+        self.names = list(self.arrays)
+        if cached is not None:
+            self._saveToCache(cached)
+
+    def _build(self):
+        world = AntWorld(**self.worldOptions)
+
+        # Layer 0 as uint8 whatever the storage is, so it's the same size in every template
+        arrays = {"cells": world.cells.astype(np.uint8)}
+        for cell_type, index in world.cellIndices.items():
+            arrays[f"index.{cell_type.name}"] = index.table
+        if self.nestNavigation:
+            field = NavigationField(world, *self.nestPosition)
+            for name, array in field.getArrays().items():
+                arrays[NAVIGATION_PREFIX + name] = array
+        return arrays
+
+    def cacheKey(self):
+        """
+        Hash of everything the arrays depend on.  Storage and lazy evaporation don't change them, so they're left out
+        """
+
+        world_map = loadMap(self.worldOptions.get("map_path") or DEFAULT_MAP)
+        data = {"version": CACHE_VERSION, "map": world_map.contentHash,
+                "resolution": self.worldOptions.get("resolution", RESOLUTION), "nest_navigation": self.nestNavigation}
+        if self.nestNavigation:
+            data["navigation"] = [NEAR_WALL_COST, EROSION_ITERATIONS]
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()[:16]
+
+    def _saveToCache(self, cached):
+        """
+        Publish into the cache, through a temporary directory that gets renamed into place, so another process never
+        finds half the files.  If one got there first, its arrays are the same, and they get used instead
+        """
+
+        parent = os.path.dirname(cached)
+        os.makedirs(parent, exist_ok=True)
+        temporary = tempfile.mkdtemp(prefix=".building_", dir=parent)
+        for name, array in self.arrays.items():
+            np.save(os.path.join(temporary, f"{name}.npy"), array)
+
+        try:
+            os.rename(temporary, cached)
+        except OSError:
+            shutil.rmtree(temporary, ignore_errors=True)
+
+        self.directory = cached
+        self.arrays = self._load("r")
+
+    def publish(self, directory=None):
+        """
+        Write the arrays out so they can be shared, every world made from the template after this maps them instead of
+        copying them.  Templates that came out of (or went into) a cache are already published
+
+        :param directory: Where to put them, a new temporary directory by default.  It gets deleted by close
+        """
+
+        if self.directory is not None:
+            return self.directory
+
+        self.directory = directory if directory is not None else tempfile.mkdtemp(prefix="faux_formicidae_world_")
+        os.makedirs(self.directory, exist_ok=True)
+        for name, array in self.arrays.items():
+            np.save(self._path(name), array)
+
+        self.owner = True
+        self.arrays = self._load("r")
+        return self.directory
+
+    def close(self):
+        """
+        Delete the published files, if this is the process that published them.  Worlds that already map them keep
+        working (on Linux and macOS anyway)
+        """
+
+        if self.owner:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.owner = False
+
+    def newWorld(self):
+        """
+        Fresh world, with everything in the template already in it
+        """
+
+        arrays = self._load("c") if self.directory is not None else {name: array.copy()
+                                                                      for name, array in self.arrays.items()}
+        world = AntWorld(**self.worldOptions, static=arrays)
+
+        if self.nestNavigation:
+            field_arrays = {name[len(NAVIGATION_PREFIX):]: array for name, array in arrays.items()
+                            if name.startswith(NAVIGATION_PREFIX)}
+            world.addNavigationField(NavigationField(world, *self.nestPosition, field_arrays))
+
+        return world
+
+    def nbytes(self):
+        """
+        Size of the template's arrays, which is what every world made from it doesn't have to build (or, once
+        published, hold) on its own
+        """
+
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.npy")
+
+    def _load(self, mode):
+        # np.asarray so the worlds get plain arrays (still mapped, the memmap stays alive as their base)
+        return {name: np.asarray(np.load(self._path(name), mmap_mode=mode)) for name in self.names}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.directory is not None:
+            # The files are the arrays, the other end maps them again
+            state["arrays"] = None
+        state["owner"] = False
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.directory is not None:
+            self.arrays = self._load("r")
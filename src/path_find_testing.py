@@ -1,14 +1,10 @@
 #!/usr/bin/env python3
 
 from faux_formicidae.simulation import Simulation
-from faux_formicidae.world import AntWorld, Pheromones
+from faux_formicidae.world import AntWorld, Pheromones, WIDTH_SCALE, HEIGHT_SCALE, RESOLUTION
 from faux_formicidae.ant import Ant, AntMode
 from faux_formicidae.renderer import Renderer
 
-WIDTH_SCALE = 16
-HEIGHT_SCALE = 9
-RESOLUTION = 40
-
 COLONY_START_SIZE = 40
 
 X_Start = 1
@@ -4,8 +4,13 @@ import yaml
 import numpy
 import matplotlib.pyplot as plt
 
+from faux_formicidae.results_store import ResultsStore
+from faux_formicidae.result_log import rebuildGenerations
+
 PATH = os.path.abspath(os.path.join(os.path.abspath(__file__), "..", ".."))
 DATA_DIR = os.path.join(PATH, "data")
+RESULTS_FILE = os.path.join(DATA_DIR, "results.sqlite")
+RESULT_LOG_FILE = os.path.join(DATA_DIR, "results.jsonl")
 
 
 def atof(text):
@@ -49,29 +54,19 @@ def loadResults():
     :returns {field_name: array[generation][colony_id], ...}
     """
 
-    files = getDataFiles()
-    fields = getDataTypes()
-
-    data = {}
-
-    for file_name in files:
-        single_file_data_dict = {}
-
-        file_data = loadFile(file_name)["ants"]
-        for colony in file_data:
-            for field in fields:
-                if field not in single_file_data_dict:
-                    single_file_data_dict[field] = []
-
-                single_file_data_dict[field].append(colony[field])
+    store = ResultsStore(RESULTS_FILE)
+    # Bring in the history from before there was a results store.  The genetic algorithm may well have stored newer
+    # generations already, so this goes by generation and not by whether the store is empty
+    imported = store.importYaml(DATA_DIR, missing_only=True)
+    if imported > 0:
+        print(f"Imported {imported} generations of results")
 
-        for field in single_file_data_dict:
-            data_arr = numpy.expand_dims(numpy.asarray(single_file_data_dict[field]), 0)
-            if field not in data:
-                data[field] = data_arr
-            else:
-                data[field] = numpy.append(data[field], data_arr, 0)
+    # Generations the genetic algorithm didn't get to save (it got killed part way through) are still in the log
+    if os.path.exists(RESULT_LOG_FILE):
+        rebuildGenerations(RESULT_LOG_FILE, store, missing_only=True)
 
+    data = store.loadResults()
+    store.close()
     return data
 
 
@@ -81,13 +76,14 @@ def singleVariableAxis(data_mat, ax, color=None, show_error_bars=False):
     min_val = []
     max_val = []
     for generation in range(data_mat.shape[0]):
+        # Colonies missing from a generation are nan
         gen_data = data_mat[generation]
-        mean = numpy.mean(gen_data)
+        mean = numpy.nanmean(gen_data)
 
         x.append(generation)
         y.append(mean)
-        min_val.append(abs(mean - min(gen_data)))
-        max_val.append(abs(mean - max(gen_data)))
+        min_val.append(abs(mean - numpy.nanmin(gen_data)))
+        max_val.append(abs(mean - numpy.nanmax(gen_data)))
 
     error_bars = [min_val, max_val]
 
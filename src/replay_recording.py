@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+"""
+Plays back a run recorded with TrajectoryRecorder, in the pygame window or to a video file
+
+In the window: space pauses, left/right jump 10 seconds back/forward, up/down double/halve the speed, home goes back to
+the start
+"""
+
+import os
+import argparse
+
+from faux_formicidae.recording import Recording
+
+SEEK_SECONDS = 10
+
+
+def replayRecording(path, speed=1.0, fps=30, start=0.0, video_path=None):
+    """
+    :param speed: Simulated seconds per real second
+    :param fps: Frames per second, of the window or the video
+    :param start: Time (in seconds of the run) to start at
+    :param video_path: Write the frames to this video file (as fast as possible, no window) instead of showing them
+    """
+
+    if video_path is not None:
+        # No need for a real window when nobody is going to look at it
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+    # Only import pygame once the video driver is settled
+    import cv2
+    import pygame
+    from faux_formicidae.renderer import Renderer
+
+    recording = Recording(path)
+    print(f"{path}: {recording.duration():.1f} s, {len(recording)} steps, {recording.metadata}")
+
+    renderer = Renderer(size=(recording.width, recording.height), resolution=recording.resolution,
+                        nest=recording.nest)
+
+    # Everything the key handlers change
+    state = {"clock": start, "speed": speed, "paused": False}
+
+    def seek(seconds):
+        state["clock"] = min(max(state["clock"] + seconds, 0.0), recording.duration())
+
+    renderer.onKey(pygame.K_SPACE, lambda: state.update(paused=not state["paused"]))
+    renderer.onKey(pygame.K_LEFT, lambda: seek(-SEEK_SECONDS))
+    renderer.onKey(pygame.K_RIGHT, lambda: seek(SEEK_SECONDS))
+    renderer.onKey(pygame.K_UP, lambda: state.update(speed=state["speed"] * 2))
+    renderer.onKey(pygame.K_DOWN, lambda: state.update(speed=state["speed"] / 2))
+    renderer.onKey(pygame.K_HOME, lambda: state.update(clock=0.0))
+
+    writer = None
+    if video_path is not None:
+        writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (recording.width, recording.height))
+
+    clock = pygame.time.Clock()
+    shown = None
+    while renderer.running():
+        step = recording.stepAt(state["clock"])
+        if step != shown:
+            renderer.renderSnapshot(recording.snapshot(step))
+            shown = step
+        else:
+            renderer.pollEvents()
+
+        if writer is not None:
+            frame = pygame.surfarray.array3d(renderer.screen).transpose(1, 0, 2)
+            writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+        else:
+            clock.tick(fps)
+
+        if not state["paused"]:
+            if state["clock"] >= recording.duration() - recording.deltaT:
+                if writer is not None:
+                    break
+            else:
+                seek(state["speed"] / fps)
+
+    if writer is not None:
+        writer.release()
+    renderer.quit()
+    recording.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Plays back a recorded run")
+    parser.add_argument("path", help="Recording to play")
+    parser.add_argument("--speed", type=float, default=1.0, help="Simulated seconds per real second")
+    parser.add_argument("--fps", type=float, default=30, help="Frames per second")
+    parser.add_argument("--start", type=float, default=0.0, help="Time to start at, in seconds of the run")
+    parser.add_argument("--video", default=None, help="Write a video file instead of opening a window")
+    args = parser.parse_args()
+
+    replayRecording(args.path, args.speed, args.fps, args.start, args.video)
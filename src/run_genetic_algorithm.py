@@ -2,26 +2,42 @@
 Test code to run the genetic algorithm
 """
 import os
+import argparse
 
 os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = '1'
 
-from faux_formicidae.genetic_algorithm import GeneticAlgorithm
+from faux_formicidae.genetic_algorithm import GeneticAlgorithm, PATH
 from run_visualization import visualizeColony
 
+CHECKPOINT_FILE = os.path.join(PATH, "data", "checkpoint.pkl")
+
 
 def run():
-    # Runs and saves one iteration
-    g = GeneticAlgorithm(batch_size=5)
-
-    g.loadColonyParameters()
-    # Added this to retrain:
-    # g.generateRandomColonies()
-    for i in range(47, 100):
-        print(f"\n\nRunning batch {i}")
-        g.saveColonyParameters(batch_id=i)
-        g.runBatch()
-        g.saveColonyResults(i)
-        g.generateColoniesFromSimResults()
+    parser = argparse.ArgumentParser(description="Runs the genetic algorithm, one batch at a time")
+    parser.add_argument("--first", type=int, default=47, help="Batch to start at, when not resuming")
+    parser.add_argument("--last", type=int, default=100, help="Batch to stop before")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE, help="Checkpoint file to keep up to date")
+    parser.add_argument("--resume", action="store_true", help="Carry on from the checkpoint instead of starting over")
+    parser.add_argument("--map", default=None, help="Map manifest to evolve on, data/maps/default.yaml if not given")
+    args = parser.parse_args()
+
+    if args.resume:
+        g = GeneticAlgorithm.resume(args.checkpoint)
+        print(f"Resuming at batch {g.generation}")
+    else:
+        # Runs and saves one iteration
+        world_options = {"map_path": os.path.abspath(args.map)} if args.map is not None else None
+        g = GeneticAlgorithm(batch_size=5, world_options=world_options, checkpoint_path=args.checkpoint)
+
+        g.loadColonyParameters()
+        # Added this to retrain:
+        # g.generateRandomColonies()
+        g.generation = args.first
+
+    try:
+        g.run(args.last)
+    finally:
+        g.close()
 
     # So we can see it work based on the best results from the last run:
     # g.enableRenderer = False
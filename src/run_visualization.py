@@ -1,13 +1,12 @@
 #!/usr/bin/env python3
 
+import argparse
+
 from faux_formicidae.simulation import Simulation
-from faux_formicidae.world import AntWorld
+from faux_formicidae.world import AntWorld, RESOLUTION
 from faux_formicidae.ant_colony import AntColony, ColonyParameters
 from faux_formicidae.renderer import Renderer
-
-WIDTH_SCALE = 16
-HEIGHT_SCALE = 9
-RESOLUTION = 40
+from faux_formicidae.snapshots import SimulationRunner
 
 COLONY_START_SIZE = 40
 
@@ -15,21 +14,41 @@ X_Start = 320
 Y_Start = 180
 
 
-def visualizeColony():
-    world = AntWorld(WIDTH_SCALE, HEIGHT_SCALE, RESOLUTION)
-    colony = AntColony(WIDTH_SCALE / 2, HEIGHT_SCALE / 2, ColonyParameters(1, 1, 1))
+def visualizeColony(fps=30, speed=None, lockstep=False, map_path=None):
+    """
+    :param fps: Frames per second to draw at most
+    :param speed: Simulated seconds per real second, None to run the simulation as fast as it goes
+    :param lockstep: Step and draw in turn on one thread, like it used to, instead of running the simulation on its own
+    :param map_path: Map manifest to run on (see faux_formicidae.world_map), the default map if not given
+    """
+
+    world = AntWorld(resolution=RESOLUTION, map_path=map_path)
+    colony = AntColony(*world.nestPosition, ColonyParameters(1, 1, 1))
 
     sim = Simulation(world)
     sim.addAntColony(colony)
     renderer = Renderer(sim)
 
     dt = 0.05
-    while renderer.running():
-        sim.runOnce(dt)
-        renderer.render()
+    if lockstep:
+        while renderer.running():
+            sim.runOnce(dt)
+            renderer.render()
+    else:
+        runner = SimulationRunner(sim, dt, speed)
+        renderer.watch(runner, fps, until_finished=False)
+        runner.stop()
 
     renderer.quit()
 
 
 if __name__ == '__main__':
-    visualizeColony()
+    parser = argparse.ArgumentParser(description="Shows a colony running")
+    parser.add_argument("--fps", type=float, default=30, help="Frames per second to draw at most")
+    parser.add_argument("--speed", type=float, default=None,
+                        help="Simulated seconds per real second, as fast as possible if not given")
+    parser.add_argument("--lockstep", action="store_true", help="Draw after every step instead of in parallel")
+    parser.add_argument("--map", default=None, help="Map manifest to run on, data/maps/default.yaml if not given")
+    args = parser.parse_args()
+
+    visualizeColony(args.fps, args.speed, args.lockstep, args.map)